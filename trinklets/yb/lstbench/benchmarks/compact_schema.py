@@ -0,0 +1,109 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Size and query time of the default and the compact (ddl_compact.sql) layouts.
+
+Builds a database with the default layout, migrates a copy in place with lstbench.migrate and runs the same
+queries against both. Run with ``python -m main.lstbench.benchmarks.compact_schema --sessions 200 --tasks 100``.
+"""
+
+import argparse
+import json
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from main.lstbench.migrate import migrate_to_compact
+from main.lstbench.models import Handler, Status, TaskType
+from main.lstbench.writer import WriteBehindConfig
+
+
+def populate(handler: Handler, sessions: int, tasks: int):
+    handler.create_tables_if_not_exists()
+    task_types = list(TaskType)
+    workload = handler.create_new_workload("bench")
+    handler.start_workload(workload)
+    phase = handler.create_new_phase("bench_phase")
+    handler.start_phase(phase, workload, {})
+    for session_index in range(sessions):
+        session = handler.create_new_session(f"session_{session_index}")
+        handler.start_session(session, phase, {})
+        for task_index in range(tasks):
+            task = handler.create_new_task(f"task_{task_index}", task_types[task_index % len(task_types)])
+            handler.start_task(task, session, {"task_index": task_index})
+            status = Status.ERROR if task_index % 50 == 0 else Status.FINISHED
+            handler.end_task(task, status)
+        handler.end_session(session, Status.FINISHED)
+    handler.end_phase(phase, Status.FINISHED)
+    handler.end_workload(workload, Status.FINISHED)
+    handler.close()
+
+
+def timed(func: Callable[[], Any], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def measure(handler: Handler) -> Dict[str, Any]:
+    db_file = handler.get_db_file_path()
+    conn = sqlite3.connect(str(db_file))
+    conn.execute("VACUUM")
+    conn.close()
+
+    session_uuid = handler.query("SELECT uuid FROM session LIMIT 1 OFFSET 7")[0]["uuid"]
+    task_uuid = handler.query("SELECT uuid FROM base_task LIMIT 1 OFFSET 77")[0]["uuid"]
+    result = {
+        "compact": handler.compact,
+        "file_bytes": db_file.stat().st_size,
+        "query_ms": {
+            "task_duration_stats": timed(handler.task_duration_stats),
+            "find_error_tasks": timed(lambda: handler.find_tasks(Status.ERROR)),
+            "tasks_of_session": timed(lambda: handler.find_tasks(session_uuid=session_uuid)),
+            "task_by_uuid": timed(lambda: handler.find_tasks(task_uuid=task_uuid)),
+        }
+    }
+    handler.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        default_handler = Handler(database="default.db", db_path=Path(tmp_dir), write_behind=WriteBehindConfig())
+        populate(default_handler, args.sessions, args.tasks)
+        shutil.copy(Path(tmp_dir, "default.db"), Path(tmp_dir, "compact.db"))
+        migrate_to_compact(Path(tmp_dir, "compact.db"))
+
+        default = measure(Handler(database="default.db", db_path=Path(tmp_dir)))
+        compact = measure(Handler(database="compact.db", db_path=Path(tmp_dir), compact=True))
+
+    print(json.dumps({
+        "rows": args.sessions * args.tasks,
+        "default": default,
+        "compact": compact,
+        "size_ratio": round(compact["file_bytes"] / default["file_bytes"], 3)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
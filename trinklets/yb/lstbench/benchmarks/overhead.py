@@ -0,0 +1,168 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Bookkeeping overhead of ExperimentRunner: SQLite writes, Step reporting and the context managers around
+tasks that do nothing.
+
+Every shape (phases x sessions x tasks per session) runs in a fresh process against a stub config and a stub
+reporter, once per handler mode. The time of the run minus the time of calling the tasks directly is the
+overhead. Output is JSON, to compare commits:
+
+    python -m main.lstbench.benchmarks.overhead --shapes 1x1x10000 10x100x10 --output overhead.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+from main.lstbench.models import Handler, RuntimeConfig, TaskType
+from main.lstbench.runner import ExperimentRunner, LstTask
+from main.lstbench.writer import WriteBehindConfig
+
+SHAPES = ["1x1x10000", "10x100x10", "1x100x100", "100x10x10"]
+MODES = ["sync", "write_behind", "async_write_behind"]
+
+
+class NoOpTask(LstTask):
+    """Task1 of tasks/example.py without the sleeps."""
+
+    def run(self, run_on_host):
+        pass
+
+    def wait(self, timeout=0):
+        pass
+
+
+class StubReporter:
+    """Takes every call a Step makes on the reporter and only counts it."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls[name] += 1
+
+        return call
+
+
+def stub_config(reporter: StubReporter) -> SimpleNamespace:
+    """The parts of Config the runner reads, without hosts so tasks run locally."""
+    return SimpleNamespace(meta=SimpleNamespace(reporter=reporter), client_hosts=[])
+
+
+def parse_shape(shape: str) -> Tuple[int, int, int]:
+    phases, sessions, tasks = (int(part) for part in shape.lower().split("x"))
+    return phases, sessions, tasks
+
+
+def workload(phases: int, sessions: int, tasks: int) -> Dict[str, Any]:
+    return {"name": "overhead", "phases": [
+        {"name": f"phase_{phase}", "sessions": [
+            {"name": f"session_{session}", "tasks": [{"factory": lambda: NoOpTask(TaskType.SINGLE_USER)}] * tasks}
+            for session in range(sessions)
+        ]}
+        for phase in range(phases)
+    ]}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return round(peak / (1e6 if sys.platform == "darwin" else 1e3), 1)
+
+
+def run_case(shape: str, mode: str, concurrency: int) -> Dict[str, Any]:
+    phases, sessions, tasks = parse_shape(shape)
+    total = phases * sessions * tasks
+
+    # the same calls the runner makes on the tasks, without any bookkeeping
+    start = time.perf_counter()
+    for _ in range(total):
+        task = NoOpTask(TaskType.SINGLE_USER)
+        task.run(run_on_host=None)
+        task.wait()
+    task_secs = time.perf_counter() - start
+
+    reporter = StubReporter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_behind = WriteBehindConfig() if mode != "sync" else None
+        handler = Handler(database="overhead.db", db_path=Path(tmp_dir), write_behind=write_behind)
+        runner = ExperimentRunner(stub_config(reporter), handler=handler,
+                                  runtime_config=RuntimeConfig(with_concurrency=concurrency))
+        start = time.perf_counter()
+        if mode.startswith("async"):
+            asyncio.run(runner.run_async(workload(phases, sessions, tasks)))
+        else:
+            runner.run(workload(phases, sessions, tasks))
+        handler.flush()
+        elapsed = time.perf_counter() - start
+        handler.close()
+
+    return {
+        "shape": shape,
+        "mode": mode,
+        "concurrency": concurrency,
+        "tasks": total,
+        "elapsed_secs": round(elapsed, 4),
+        "tasks_per_sec": round(total / elapsed, 1),
+        "overhead_us_per_task": round((elapsed - task_secs) / total * 1e6, 1),
+        "peak_rss_mb": peak_rss_mb(),
+        "reporter_calls": sum(reporter.calls.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", nargs="+", default=SHAPES, help="phases x sessions x tasks, e.g. 10x100x10")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="also write the JSON to this file")
+    args = parser.parse_args()
+
+    cases: List[Dict[str, Any]] = []
+    for shape in args.shapes:
+        parse_shape(shape)
+        for mode in args.modes:
+            # a process per case, peak RSS is that of the case alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                cases.append(pool.submit(run_case, shape, mode, args.concurrency).result())
+
+    report = json.dumps({
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }, indent=2)
+    print(report)
+    if args.output is not None:
+        args.output.write_text(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
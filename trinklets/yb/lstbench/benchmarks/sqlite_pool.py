@@ -0,0 +1,85 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Lifecycle ops/sec of the Handler with and without pooled connections and write-behind recording.
+
+Run with ``python -m main.lstbench.benchmarks.sqlite_pool --tasks 2000``.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from main.lstbench.models import Handler, Status, TaskType
+from main.lstbench.writer import WriteBehindConfig
+
+
+def run_lifecycle(handler: Handler, tasks: int) -> Dict[str, Any]:
+    handler.create_tables_if_not_exists()
+    workload = handler.create_new_workload("bench")
+    handler.start_workload(workload)
+    phase = handler.create_new_phase("bench_phase")
+    handler.start_phase(phase, workload, {})
+    session = handler.create_new_session("bench_session")
+    handler.start_session(session, phase, {})
+
+    start = time.perf_counter()
+    for index in range(tasks):
+        task = handler.create_new_task(f"task_{index}", TaskType.LOAD)
+        handler.start_task(task, session, {})
+        handler.end_task(task, Status.FINISHED)
+    handler.flush()
+    elapsed = time.perf_counter() - start
+
+    handler.end_session(session, Status.FINISHED)
+    handler.end_phase(phase, Status.FINISHED)
+    handler.end_workload(workload, Status.FINISHED)
+    handler.close()
+
+    # create, start and end are one lifecycle op each
+    ops = tasks * 3
+    return {
+        "pooled": handler.pooled,
+        "write_behind": handler.write_behind is not None,
+        "tasks": tasks,
+        "elapsed_secs": round(elapsed, 4),
+        "ops_per_sec": round(ops / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index, (pooled, write_behind) in enumerate([(False, None), (True, None), (True, WriteBehindConfig())]):
+            handler = Handler(database=f"bench_{index}.db", db_path=Path(tmp_dir), pooled=pooled,
+                              write_behind=write_behind)
+            results.append(run_lifecycle(handler, args.tasks))
+
+    before, after, write_behind = results
+    print(json.dumps({
+        "before": before,
+        "after": after,
+        "write_behind": write_behind,
+        "speedup": round(after["ops_per_sec"] / before["ops_per_sec"], 2),
+        "write_behind_speedup": round(write_behind["ops_per_sec"] / before["ops_per_sec"], 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
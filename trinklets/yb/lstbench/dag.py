@@ -0,0 +1,179 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Dependency aware execution plans.
+
+The workload compiler turns a workload definition into a DAG of sessions. By default a session depends on
+every session of the previous phase, the same barrier the phase by phase run has. A session listing
+``depends_on`` only waits for what it lists instead: other sessions by ``id`` or single tasks as
+``"<session id>:<task id>"``.
+
+    {"name": "sf10", "phases": [
+        {"name": "load", "sessions": [
+            {"name": "load_yb1", "tasks": [{"id": "load", "task": ...}, {"id": "analyze", "task": ...}]},
+            {"name": "load_yb2", "tasks": [...]}]},
+        {"name": "queries", "sessions": [
+            {"name": "su_yb1", "depends_on": ["load_yb1:load"], "tasks": [...]},
+            {"name": "su_yb2", "depends_on": ["load_yb2"], "tasks": [...]}]}]}
+
+Session ids default to the session name and task ids to the task index within the session.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WorkloadCompileError(ValueError):
+    """The workload definition does not describe a valid DAG."""
+
+
+@dataclass(frozen=True)
+class Dependency:
+
+    node_id: str
+    # only this task of the node has to be finished, the whole node when None
+    task_id: Optional[str] = None
+
+
+@dataclass
+class DagNode:
+
+    node_id: str
+    phase_index: int
+    phase_name: str
+    session_index: int
+    session_def: Dict[str, Any]
+    task_ids: List[str]
+    depends_on: List[Dependency] = field(default_factory=list)
+
+
+@dataclass
+class ExecutionPlan:
+
+    name: str
+    nodes: Dict[str, DagNode]
+    # node ids in a valid execution order
+    order: List[str]
+
+    def edges(self) -> List[Tuple[Dependency, str]]:
+        return [(dependency, node_id) for node_id in self.order for dependency in self.nodes[node_id].depends_on]
+
+    def dependents(self) -> Dict[str, List[str]]:
+        result: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for dependency, node_id in self.edges():
+            result[dependency.node_id].append(node_id)
+        return result
+
+    def critical_path(self, durations: Dict[str, float]) -> Tuple[List[str], float]:
+        """Longest path through the DAG weighted by node durations, and its length.
+
+        A dependency on a single task is counted as one on the whole session, an upper bound of the real path.
+        """
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for node_id in self.order:
+            before, start = None, 0.0
+            for dependency in self.nodes[node_id].depends_on:
+                if finish[dependency.node_id] > start:
+                    before, start = dependency.node_id, finish[dependency.node_id]
+            finish[node_id] = start + durations.get(node_id, 0.0)
+            previous[node_id] = before
+        if not finish:
+            return [], 0.0
+
+        node_id = max(finish, key=finish.get)
+        length = finish[node_id]
+        path = []
+        while node_id is not None:
+            path.append(node_id)
+            node_id = previous[node_id]
+        return list(reversed(path)), length
+
+
+def _parse_ref(ref: str) -> Dependency:
+    node_id, _, task_id = ref.partition(":")
+    return Dependency(node_id=node_id, task_id=task_id or None)
+
+
+def compile_workload(workload_definition: Dict[str, Any]) -> ExecutionPlan:
+    """Validate the dependencies of the workload and build its execution plan."""
+    nodes: Dict[str, DagNode] = {}
+    previous_phase: List[str] = []
+    for phase_index, phase_def in enumerate(workload_definition["phases"]):
+        current_phase = []
+        for session_index, session_def in enumerate(phase_def["sessions"]):
+            node_id = str(session_def.get("id", session_def["name"]))
+            if node_id in nodes:
+                raise WorkloadCompileError(f"Duplicate session id {node_id}, set an explicit 'id' on the session")
+            session_def = dict(session_def, tasks=list(session_def["tasks"]))
+            task_ids = [str(task_def.get("id", index)) for index, task_def in enumerate(session_def["tasks"])]
+            if len(set(task_ids)) != len(task_ids):
+                raise WorkloadCompileError(f"Duplicate task ids in session {node_id}: {task_ids}")
+
+            if "depends_on" in session_def:
+                depends_on = [_parse_ref(str(ref)) for ref in session_def["depends_on"]]
+            else:
+                depends_on = [Dependency(node_id=prev) for prev in previous_phase]
+            nodes[node_id] = DagNode(
+                node_id=node_id,
+                phase_index=phase_index,
+                phase_name=phase_def["name"],
+                session_index=session_index,
+                session_def=session_def,
+                task_ids=task_ids,
+                depends_on=depends_on
+            )
+            current_phase.append(node_id)
+        previous_phase = current_phase
+
+    errors = []
+    for node in nodes.values():
+        for dependency in node.depends_on:
+            if dependency.node_id == node.node_id:
+                errors.append(f"{node.node_id} depends on itself")
+            elif dependency.node_id not in nodes:
+                errors.append(f"{node.node_id} depends on unknown session {dependency.node_id}")
+            elif dependency.task_id is not None and dependency.task_id not in nodes[dependency.node_id].task_ids:
+                errors.append(f"{node.node_id} depends on unknown task {dependency.node_id}:{dependency.task_id}")
+    if errors:
+        raise WorkloadCompileError("; ".join(errors))
+
+    order = _topological_order(nodes)
+    LOGGER.info("Compiled %s into %d session(s)", workload_definition["name"], len(nodes))
+    return ExecutionPlan(name=workload_definition["name"], nodes=nodes, order=order)
+
+
+def _topological_order(nodes: Dict[str, DagNode]) -> List[str]:
+    # Kahn's algorithm, keeps the definition order among ready nodes
+    indegree = {node_id: len({dep.node_id for dep in node.depends_on}) for node_id, node in nodes.items()}
+    dependents: Dict[str, Set[str]] = {node_id: set() for node_id in nodes}
+    for node_id, node in nodes.items():
+        for dependency in node.depends_on:
+            dependents[dependency.node_id].add(node_id)
+
+    ready = [node_id for node_id in nodes if indegree[node_id] == 0]
+    order = []
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for dependent in sorted(dependents[node_id], key=list(nodes).index):
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                ready.append(dependent)
+
+    if len(order) != len(nodes):
+        cycle = sorted(node_id for node_id in nodes if node_id not in order)
+        raise WorkloadCompileError(f"Dependency cycle between sessions: {cycle}")
+    return order
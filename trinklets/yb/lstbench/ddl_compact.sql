@@ -0,0 +1,223 @@
+-- Compact layout of ddl.sql: 16 byte BLOB keys, timestamps as INTEGER micro seconds since the epoch (UTC)
+-- and WITHOUT ROWID mapping tables. Convert an existing database with lstbench.migrate.
+PRAGMA user_version = 1;
+
+CREATE TABLE IF NOT EXISTS base_task (
+     uuid    BLOB   PRIMARY KEY,
+     name    VARCHAR(200)   not null,
+     create_time INTEGER not null,
+     start_time INTEGER,
+     end_time INTEGER,
+     status TINYINT not null,
+     component_type TINYINT not null,
+     task_type TINYINT not null,
+     error_msg TEXT,
+     meta_data TEXT
+);
+
+
+CREATE TABLE IF NOT EXISTS session (
+     uuid    BLOB   PRIMARY KEY,
+     name    VARCHAR(200)   not null,
+     create_time INTEGER not null,
+     start_time INTEGER,
+     end_time INTEGER,
+     status TINYINT not null,
+     component_type TINYINT not null,
+     error_msg TEXT,
+     meta_data TEXT
+);
+
+CREATE TABLE IF NOT EXISTS session_tasks (
+     session_uuid BLOB,
+     task_uuid BLOB,
+     meta_data TEXT,
+     PRIMARY KEY (session_uuid, task_uuid),
+     FOREIGN KEY (session_uuid) REFERENCES session(uuid),
+     FOREIGN KEY (task_uuid) REFERENCES base_task(uuid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS phase (
+     uuid BLOB PRIMARY KEY,
+     name    VARCHAR(200)   not null,
+     create_time INTEGER not null,
+     start_time INTEGER,
+     end_time INTEGER,
+     status TINYINT not null,
+     component_type TINYINT not null,
+     error_msg TEXT,
+     meta_data TEXT
+);
+
+CREATE TABLE IF NOT EXISTS phase_sessions (
+    phase_uuid BLOB,
+    session_uuid BLOB,
+    meta_data TEXT,
+    PRIMARY KEY (phase_uuid, session_uuid),
+    FOREIGN KEY (phase_uuid) REFERENCES phase(uuid),
+    FOREIGN KEY (session_uuid) REFERENCES session(uuid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS workload (
+    uuid BLOB PRIMARY KEY,
+    name    VARCHAR(200)   not null,
+    create_time INTEGER not null,
+    start_time INTEGER,
+    end_time INTEGER,
+    status TINYINT not null,
+    component_type TINYINT not null,
+    error_msg TEXT,
+    meta_data TEXT
+);
+
+
+CREATE TABLE IF NOT EXISTS workload_phases (
+    workload_uuid BLOB,
+    phase_uuid BLOB,
+    meta_data TEXT,
+    PRIMARY KEY (workload_uuid, phase_uuid),
+    FOREIGN KEY (phase_uuid) REFERENCES phase(uuid),
+    FOREIGN KEY (workload_uuid) REFERENCES workload(uuid)
+) WITHOUT ROWID;
+
+
+CREATE TABLE IF NOT EXISTS task_timing (
+    task_uuid BLOB PRIMARY KEY,
+    -- monotonic duration of the task run itself
+    run_ns INTEGER not null,
+    -- time spent by the runner on its own work (sqlite, reporting) around the run
+    bookkeeping_ns INTEGER not null,
+    FOREIGN KEY (task_uuid) REFERENCES base_task(uuid)
+);
+
+CREATE TABLE IF NOT EXISTS latency_histogram (
+    scope_uuid BLOB,
+    component_type TINYINT not null,
+    task_type TINYINT not null,
+    sample_count INTEGER not null,
+    min_ns INTEGER,
+    max_ns INTEGER,
+    mean_ns REAL,
+    p50_ns INTEGER,
+    p95_ns INTEGER,
+    p99_ns INTEGER,
+    buckets TEXT not null,
+    PRIMARY KEY (scope_uuid, task_type)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS task_query_sample (
+    task_uuid BLOB,
+    seq INTEGER not null,
+    query_name VARCHAR(200) not null,
+    host VARCHAR(200),
+    start_time INTEGER not null,
+    duration_ns INTEGER not null,
+    rows_returned INTEGER,
+    error_msg TEXT,
+    PRIMARY KEY (task_uuid, seq),
+    FOREIGN KEY (task_uuid) REFERENCES base_task(uuid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dag_node (
+    workload_uuid BLOB,
+    node_id VARCHAR(200),
+    phase_name VARCHAR(200) not null,
+    session_name VARCHAR(200) not null,
+    -- set once the session is started
+    session_uuid BLOB,
+    duration_ns INTEGER,
+    on_critical_path TINYINT not null default 0,
+    PRIMARY KEY (workload_uuid, node_id),
+    FOREIGN KEY (workload_uuid) REFERENCES workload(uuid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dag_edge (
+    workload_uuid BLOB,
+    from_node VARCHAR(200),
+    to_node VARCHAR(200),
+    -- empty when to_node waits for the whole from_node session
+    from_task VARCHAR(200) not null default '',
+    PRIMARY KEY (workload_uuid, from_node, to_node, from_task),
+    FOREIGN KEY (workload_uuid) REFERENCES workload(uuid)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS base_task_status_idx ON base_task(status, start_time);
+CREATE INDEX IF NOT EXISTS base_task_start_time_idx ON base_task(start_time);
+CREATE INDEX IF NOT EXISTS base_task_name_idx ON base_task(name);
+CREATE INDEX IF NOT EXISTS base_task_task_type_idx ON base_task(task_type);
+CREATE INDEX IF NOT EXISTS session_status_idx ON session(status, start_time);
+CREATE INDEX IF NOT EXISTS session_name_idx ON session(name);
+CREATE INDEX IF NOT EXISTS phase_status_idx ON phase(status, start_time);
+CREATE INDEX IF NOT EXISTS phase_name_idx ON phase(name);
+CREATE INDEX IF NOT EXISTS workload_status_idx ON workload(status, start_time);
+CREATE INDEX IF NOT EXISTS workload_name_idx ON workload(name);
+
+-- the primary keys of the mapping tables cover parent -> child, these cover child -> parent
+CREATE INDEX IF NOT EXISTS session_tasks_task_idx ON session_tasks(task_uuid);
+CREATE INDEX IF NOT EXISTS phase_sessions_session_idx ON phase_sessions(session_uuid);
+CREATE INDEX IF NOT EXISTS workload_phases_phase_idx ON workload_phases(phase_uuid);
+
+CREATE VIEW IF NOT EXISTS task_summary AS
+SELECT
+    w.uuid AS workload_uuid,
+    w.name AS workload_name,
+    p.uuid AS phase_uuid,
+    p.name AS phase_name,
+    s.uuid AS session_uuid,
+    s.name AS session_name,
+    t.uuid AS task_uuid,
+    t.name AS task_name,
+    t.task_type,
+    t.status,
+    t.start_time,
+    t.end_time,
+    (t.end_time - t.start_time) / 1000000.0 AS duration_secs
+FROM base_task t
+JOIN session_tasks st ON st.task_uuid = t.uuid
+JOIN session s ON s.uuid = st.session_uuid
+JOIN phase_sessions ps ON ps.session_uuid = s.uuid
+JOIN phase p ON p.uuid = ps.phase_uuid
+JOIN workload_phases wp ON wp.phase_uuid = p.uuid
+JOIN workload w ON w.uuid = wp.workload_uuid;
+
+CREATE VIEW IF NOT EXISTS session_summary AS
+SELECT
+    w.uuid AS workload_uuid,
+    w.name AS workload_name,
+    p.uuid AS phase_uuid,
+    p.name AS phase_name,
+    s.uuid AS session_uuid,
+    s.name AS session_name,
+    s.status,
+    s.start_time,
+    s.end_time,
+    (s.end_time - s.start_time) / 1000000.0 AS duration_secs
+FROM session s
+JOIN phase_sessions ps ON ps.session_uuid = s.uuid
+JOIN phase p ON p.uuid = ps.phase_uuid
+JOIN workload_phases wp ON wp.phase_uuid = p.uuid
+JOIN workload w ON w.uuid = wp.workload_uuid;
+
+CREATE VIEW IF NOT EXISTS phase_summary AS
+SELECT
+    w.uuid AS workload_uuid,
+    w.name AS workload_name,
+    p.uuid AS phase_uuid,
+    p.name AS phase_name,
+    p.status,
+    p.start_time,
+    p.end_time,
+    (p.end_time - p.start_time) / 1000000.0 AS duration_secs
+FROM phase p
+JOIN workload_phases wp ON wp.phase_uuid = p.uuid
+JOIN workload w ON w.uuid = wp.workload_uuid;
+
+CREATE VIEW IF NOT EXISTS workload_summary AS
+SELECT
+    w.uuid AS workload_uuid,
+    w.name AS workload_name,
+    w.status,
+    w.start_time,
+    w.end_time,
+    (w.end_time - w.start_time) / 1000000.0 AS duration_secs
+FROM workload w;
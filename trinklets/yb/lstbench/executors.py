@@ -0,0 +1,114 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Execution backends for LST tasks.
+
+Tasks run inline in the runner thread by default. A task class can set ``executor_backend`` to
+``ExecutorBackend.PROCESS`` to run in a process pool instead, which is useful for tasks doing client side CPU
+work (data generation, result checking, parsing) that would otherwise serialize on the GIL. Only the
+parent process writes to the lstbench database, workers just send back a TaskOutcome.
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ExecutorBackend(Enum):
+
+    INLINE = "inline"
+    PROCESS = "process"
+
+
+@dataclass
+class TaskOutcome:
+    """What a worker sends back to the parent for one task."""
+
+    result: Any
+    error: Optional[BaseException]
+    error_traceback: str
+    duration_ns: int
+    pid: int
+
+
+class RemoteTaskError(RuntimeError):
+    """Raised in the parent when a task failed in a worker process."""
+
+
+def _picklable(value: Any, fallback: Any) -> Any:
+    try:
+        pickle.dumps(value)
+        return value
+    except Exception:
+        return fallback
+
+
+def run_in_worker(task, run_on_host) -> TaskOutcome:
+    """Entry point in the worker process, runs the task and waits for it to finish."""
+    result, error, error_traceback = None, None, ""
+    start_ns = time.perf_counter_ns()
+    try:
+        result = task.run(run_on_host=run_on_host)
+        task.wait()
+    except Exception as exc:
+        error = exc
+        error_traceback = traceback.format_exc()
+    duration_ns = time.perf_counter_ns() - start_ns
+
+    return TaskOutcome(
+        result=_picklable(result, repr(result)),
+        error=_picklable(error, RuntimeError(repr(error))) if error is not None else None,
+        error_traceback=error_traceback,
+        duration_ns=duration_ns,
+        pid=os.getpid()
+    )
+
+
+class ProcessPoolBackend:
+    """Lazily started process pool shared by all the tasks of a workload run."""
+
+    def __init__(self, max_workers: Optional[int] = None, start_method: str = "spawn"):
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, the parent has sqlite connections and writer threads that must not be forked
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context(self.start_method))
+        return self._pool
+
+    def submit(self, task, run_on_host) -> "Future[TaskOutcome]":
+        return self._get_pool().submit(run_in_worker, task, run_on_host)
+
+    @staticmethod
+    def unwrap(outcome: TaskOutcome) -> Any:
+        """Return the task result, or raise the error of the worker in the parent."""
+        if outcome.error is not None:
+            LOGGER.debug("Task failed in worker %d:\n%s", outcome.pid, outcome.error_traceback)
+            raise RemoteTaskError(f"Task failed in worker {outcome.pid}: {outcome.error}") from outcome.error
+        return outcome.result
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,153 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Mergeable latency histograms.
+
+Values are bucketed HDR style: exact below ``2 ** precision_bits`` and log-linear above, so every bucket is
+within ``2 / 2 ** precision_bits`` of the recorded value (under 1% with the default of 8 bits) no matter
+how large the values get. Histograms with the same precision merge by adding bucket counts.
+"""
+
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+PERCENTILES = (50.0, 95.0, 99.0)
+
+
+class LatencyHistogram:
+
+    def __init__(self, precision_bits: int = 8):
+        self.precision_bits = precision_bits
+        self._exact = 1 << precision_bits
+        self._half = self._exact >> 1
+        # sparse bucket index -> count
+        self.counts: Dict[int, int] = {}
+        self.total_count = 0
+        self.min_value: Optional[int] = None
+        self.max_value: Optional[int] = None
+        self.sum_value = 0
+
+    def _index(self, value: int) -> int:
+        if value < self._exact:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return shift * self._half + (value >> shift)
+
+    def _range(self, index: int) -> Tuple[int, int]:
+        """Lowest and highest value of a bucket."""
+        if index < self._exact:
+            return index, index
+        shift = index // self._half - 1
+        mantissa = index - shift * self._half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1):
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.sum_value += value * count
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+        self.max_value = value if self.max_value is None else max(self.max_value, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if other.precision_bits != self.precision_bits:
+            raise ValueError(f"Can not merge precision {other.precision_bits} into {self.precision_bits}")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.sum_value += other.sum_value
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+            self.max_value = other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+        return self
+
+    def percentile(self, percentile: float) -> Optional[int]:
+        if self.total_count == 0:
+            return None
+        rank = max(1, -(-self.total_count * percentile // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # highest value of the bucket, clamped to what was really recorded
+                return min(self._range(index)[1], self.max_value)
+        return self.max_value
+
+    def mean(self) -> Optional[float]:
+        return self.sum_value / self.total_count if self.total_count else None
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "precision_bits": self.precision_bits,
+            "min": self.min_value,
+            "max": self.max_value,
+            "sum": self.sum_value,
+            "counts": sorted(self.counts.items())
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, content: str) -> "LatencyHistogram":
+        data = json.loads(content)
+        histogram = cls(precision_bits=data["precision_bits"])
+        histogram.counts = {index: count for index, count in data["counts"]}
+        histogram.total_count = sum(histogram.counts.values())
+        histogram.min_value = data["min"]
+        histogram.max_value = data["max"]
+        histogram.sum_value = data["sum"]
+        return histogram
+
+
+@dataclass
+class _Scope:
+
+    parent: Optional[str]
+    histograms: Dict[str, LatencyHistogram] = field(default_factory=dict)
+
+
+class LatencyRecorder:
+    """Histograms of task run durations by task type for sessions, rolled up into phases and workloads.
+
+    Tasks record into their session. Closing a scope returns its histograms and merges them into the
+    parent scope, so a phase histogram is the merge of its sessions and a workload the merge of its phases.
+    """
+
+    def __init__(self, precision_bits: int = 8):
+        self.precision_bits = precision_bits
+        self._scopes: Dict[str, _Scope] = {}
+        self._lock = threading.Lock()
+
+    def open_scope(self, uuid: str, parent: Optional[str] = None):
+        with self._lock:
+            self._scopes[uuid] = _Scope(parent=parent)
+
+    def record(self, scope_uuid: str, task_type: str, value_ns: int):
+        with self._lock:
+            histograms = self._scopes[scope_uuid].histograms
+            if task_type not in histograms:
+                histograms[task_type] = LatencyHistogram(self.precision_bits)
+            histograms[task_type].record(value_ns)
+
+    def close_scope(self, uuid: str) -> Dict[str, LatencyHistogram]:
+        with self._lock:
+            scope = self._scopes.pop(uuid, None)
+            if scope is None:
+                return {}
+            parent = self._scopes.get(scope.parent)
+            if parent is not None:
+                for task_type, histogram in scope.histograms.items():
+                    if task_type not in parent.histograms:
+                        parent.histograms[task_type] = LatencyHistogram(self.precision_bits)
+                    parent.histograms[task_type].merge(histogram)
+            return scope.histograms
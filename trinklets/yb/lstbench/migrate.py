@@ -0,0 +1,126 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""In place migration of an lstbench database to the compact layout of ddl_compact.sql.
+
+Run with ``python -m main.lstbench.migrate <path to db>``. The migration runs in a single transaction and is
+a no-op for a database that is already compact.
+"""
+
+import argparse
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List
+
+from main.lstbench.models import (KEY_COLUMNS, TIME_COLUMNS, encode_key,
+                                  encode_time)
+
+LOGGER = logging.getLogger(__name__)
+
+COMPACT_DDL = Path(__file__).parent.joinpath("ddl_compact.sql")
+COMPACT_VERSION = 1
+
+
+def _to_time(value: Any) -> Any:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return encode_time(value)
+
+
+def _statements(script: str) -> List[str]:
+    # executescript commits, split the script to keep everything in one transaction
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return [statement for statement in statements if statement]
+
+
+def is_compact(conn: sqlite3.Connection) -> bool:
+    return conn.execute("PRAGMA user_version").fetchone()[0] >= COMPACT_VERSION
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def migrate_to_compact(db_file: Path, vacuum: bool = True) -> bool:
+    """Convert the database in place, returns False when there was nothing to do."""
+    conn = sqlite3.connect(str(db_file), isolation_level=None)
+    try:
+        if is_compact(conn):
+            LOGGER.info("%s is already compact", db_file)
+            return False
+        conn.create_function("lst_key", 1, encode_key, deterministic=True)
+        conn.create_function("lst_time", 1, _to_time, deterministic=True)
+
+        conn.execute("BEGIN")
+        try:
+            objects = conn.execute("SELECT type, name FROM sqlite_master WHERE sql IS NOT NULL").fetchall()
+            tables = [name for obj_type, name in objects if obj_type == "table"]
+            # views and indexes are created again by the compact ddl
+            for obj_type, name in objects:
+                if obj_type in ("view", "index"):
+                    conn.execute(f"DROP {obj_type.upper()} IF EXISTS {name}")
+            for table in tables:
+                conn.execute(f"ALTER TABLE {table} RENAME TO {table}__legacy")
+
+            for statement in _statements(COMPACT_DDL.read_text(encoding="utf-8")):
+                conn.execute(statement)
+
+            compact_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            for table in tables:
+                if table not in compact_tables:
+                    LOGGER.warning("Table %s is not part of the compact layout, leaving it as is", table)
+                    conn.execute(f"ALTER TABLE {table}__legacy RENAME TO {table}")
+                    continue
+                legacy_columns = set(_columns(conn, f"{table}__legacy"))
+                columns = [column for column in _columns(conn, table) if column in legacy_columns]
+                expressions = [
+                    f"lst_key({column})" if column in KEY_COLUMNS else
+                    f"lst_time({column})" if column in TIME_COLUMNS else column
+                    for column in columns
+                ]
+                cur = conn.execute(
+                    f"INSERT INTO {table}({', '.join(columns)}) "
+                    f"SELECT {', '.join(expressions)} FROM {table}__legacy")
+                LOGGER.info("Migrated %d row(s) of %s", cur.rowcount, table)
+                conn.execute(f"DROP TABLE {table}__legacy")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if vacuum:
+            conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("db_file", type=Path)
+    parser.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    migrated = migrate_to_compact(args.db_file, vacuum=not args.no_vacuum)
+    print(f"{args.db_file}: {'migrated' if migrated else 'already compact'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,20 @@
 import json
 import logging
 import sqlite3
+import threading
 from contextlib import contextmanager
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional,
+                    Sequence, Tuple)
 from uuid import UUID, uuid4
 
+from main.lstbench.dag import ExecutionPlan
+from main.lstbench.histogram import LatencyHistogram
+from main.lstbench.writer import Statement, WriteBehindConfig, WriteBehindWriter
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -56,6 +62,21 @@ class BaseModel:
 class BaseTask(BaseModel):
 
     task_type: TaskType
+    # monotonic duration of the run itself, set by the runner
+    run_ns: Optional[int] = None
+
+
+@dataclass
+class QuerySample:
+    """One query executed by a task, e.g. one of the 22 TPC-H queries of a single user run."""
+
+    seq: int
+    query_name: str
+    host: Optional[str]
+    start_time: datetime
+    duration_ns: int
+    rows_returned: Optional[int] = None
+    error_msg: str = ""
 
 
 @dataclass
@@ -79,6 +100,68 @@ class RuntimeConfig:
     # sequential when 1, more than 1 implies parallel
     with_concurrency: int = 1
     timeout_secs: int = 900
+    # a timed out task fails its session, by default it is recorded as TIMED_OUT and the session goes on
+    fail_on_timeout: bool = False
+    # workers of the process pool used by tasks with ExecutorBackend.PROCESS, defaults to cpu count
+    process_pool_size: Optional[int] = None
+    # how client hosts are picked for tasks, see lstbench.scheduler.POLICIES
+    host_policy: str = "least_in_flight"
+    # insert every row of the workload in one transaction before it runs, see Handler.register_plan
+    register_plan: bool = False
+
+
+@dataclass
+class RegisteredPlan:
+    """Rows of a workload created up front by Handler.register_plan, keyed by their indices."""
+
+    workload: Workload
+    phases: Dict[int, Phase] = field(default_factory=dict)
+    sessions: Dict[Tuple[int, int], Session] = field(default_factory=dict)
+    tasks: Dict[Tuple[int, int, int], BaseTask] = field(default_factory=dict)
+
+
+@dataclass
+class SqliteTuning:
+    """Connection level settings applied to every pooled connection."""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    # negative values are KiB, positive values are pages (see PRAGMA cache_size)
+    cache_size: int = -16000
+    temp_store: str = "MEMORY"
+    # size of the per connection prepared statement cache
+    cached_statements: int = 256
+
+# encoding of the compact schema (ddl_compact.sql)
+KEY_COLUMNS = frozenset({"uuid", "task_uuid", "session_uuid", "phase_uuid", "workload_uuid", "scope_uuid"})
+TIME_COLUMNS = frozenset({"create_time", "start_time", "end_time"})
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_key(value: Any) -> Any:
+    return bytes.fromhex(value) if isinstance(value, str) else value
+
+
+def decode_key(value: Any) -> Any:
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def encode_time(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return (value - EPOCH) // timedelta(microseconds=1)
+    return value
+
+
+def decode_time(value: Any) -> Any:
+    """datetime of a time column, stored as microseconds in the compact schema and as text in the other one."""
+    if isinstance(value, int):
+        return EPOCH + timedelta(microseconds=value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
 
 # create a base class to work with sqlite3
 
@@ -86,26 +169,96 @@ class RuntimeConfig:
 class Sqlite3Base:
 
     def __init__(self, database: Optional[str] = None, db_path: Optional[Path] = None,
-                 logger: Optional[logging.Logger] = None):
+                 logger: Optional[logging.Logger] = None, pooled: bool = True,
+                 tuning: Optional[SqliteTuning] = None):
         self.database = database if database is not None else ":memory:"
         self.db_path: Path = db_path if db_path is not None else Path(".")
         self.logger = logger if logger is not None else logging.getLogger(__name__)
         self.timeout = 30
 
+        # when pooled, every thread keeps one long lived connection
+        self.pooled = pooled
+        self.tuning = tuning if tuning is not None else SqliteTuning()
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._pool: Dict[int, sqlite3.Connection] = {}
+        self._generation = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def get_db_file_path(self) -> Path:
         if self.database == ":memory":
             return self.database
         return self.db_path.joinpath(self.database).absolute()
 
+    def _connect(self, isolation_level=None) -> sqlite3.Connection:
+        return sqlite3.connect(
+            database=str(self.get_db_file_path()),
+            timeout=self.timeout,
+            isolation_level=isolation_level,
+            cached_statements=self.tuning.cached_statements,
+            check_same_thread=not self.pooled
+        )
+
+    def _tune(self, conn: sqlite3.Connection):
+        conn.execute(f"PRAGMA journal_mode={self.tuning.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.tuning.synchronous}")
+        conn.execute(f"PRAGMA cache_size={int(self.tuning.cache_size)}")
+        conn.execute(f"PRAGMA temp_store={self.tuning.temp_store}")
+
+    def _pooled_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            return conn
+
+        conn = self._connect()
+        self._tune(conn)
+        with self._pool_lock:
+            # connections of threads that are gone can not be used anymore
+            alive = {thread.ident for thread in threading.enumerate()}
+            for ident in [ident for ident in self._pool if ident not in alive]:
+                self._pool.pop(ident).close()
+            stale = self._pool.pop(threading.get_ident(), None)
+            if stale is not None:
+                stale.close()
+            self._pool[threading.get_ident()] = conn
+            self._local.generation = self._generation
+        self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close all the pooled connections, new ones are opened lazily on next use."""
+        with self._pool_lock:
+            self._generation += 1
+            connections = list(self._pool.values())
+            self._pool.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as exc:
+                LOGGER.warning("Failed to close connection: %s", exc)
+        LOGGER.debug("Closed %d pooled connection(s)", len(connections))
+
     @contextmanager
     def with_connection(self, isolation_level=None):
+        if self.pooled:
+            conn = self._pooled_connection()
+            conn.isolation_level = isolation_level
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return
+
         conn = None
         try:
-            conn = sqlite3.connect(
-                database=str(self.get_db_file_path()),
-                timeout=self.timeout,
-                isolation_level=isolation_level
-            )
+            conn = self._connect(isolation_level=isolation_level)
             yield conn
             conn.commit()
         finally:
@@ -145,23 +298,129 @@ class Sqlite3Base:
         else:
             yield from _with_cursor(conn_1=conn)
 
-    def insert(self, cur: sqlite3.Cursor, table_name: str, record: Dict[str, str]):
+    def _insert_statement(self, table_name: str, record: Dict[str, str]) -> Statement:
         columns = ','.join(record.keys())
         placeholders = ",".join([f":{k}" for k in record.keys()])
         sql = f"""
             INSERT INTO {table_name}({columns})
             VALUES ({placeholders})
         """
-        cur.execute(sql, record)
+        return Statement(sql, record)
+
+    def insert(self, cur: sqlite3.Cursor, table_name: str, record: Dict[str, str]):
+        statement = self._insert_statement(table_name, record)
+        cur.execute(statement.sql, statement.params)
 
 
 class Handler(Sqlite3Base):
 
-    def __init__(self, database: Optional[str] = None, db_path: Optional[Path] = None):
-        super().__init__(database, db_path)
+    _SCOPE_COLUMNS = ("workload_uuid", "workload_name", "status", "start_time", "end_time", "duration_secs")
+    SUMMARY_COLUMNS = {
+        "workload_summary": set(_SCOPE_COLUMNS),
+        "phase_summary": {"phase_uuid", "phase_name", *_SCOPE_COLUMNS},
+        "session_summary": {"phase_uuid", "phase_name", "session_uuid", "session_name", *_SCOPE_COLUMNS},
+        "task_summary": {"phase_uuid", "phase_name", "session_uuid", "session_name", "task_uuid", "task_name",
+                         "task_type", *_SCOPE_COLUMNS},
+    }
+
+    _TABLES = {
+        WorkloadComponentType.TASK: "base_task",
+        WorkloadComponentType.SESSION: "session",
+        WorkloadComponentType.PHASE: "phase",
+        WorkloadComponentType.WORKLOAD: "workload"
+    }
+
+    def __init__(self, database: Optional[str] = None, db_path: Optional[Path] = None, pooled: bool = True,
+                 tuning: Optional[SqliteTuning] = None, write_behind: Optional[WriteBehindConfig] = None,
+                 compact: bool = False):
+        super().__init__(database, db_path, pooled=pooled, tuning=tuning)
+        # 16 byte keys and integer timestamps, see ddl_compact.sql
+        self.compact = compact
+        # when set, lifecycle events are queued and committed in batches by a background writer
+        self.write_behind = write_behind
+        self._writer: Optional[WriteBehindWriter] = None
+        self._writer_lock = threading.Lock()
+
+    def _get_writer(self) -> WriteBehindWriter:
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = WriteBehindWriter(self.execute_units, self.write_behind)
+            return self._writer
+
+    def execute_units(self, units: List[List[Statement]]):
+        """Apply all the units in a single transaction, everything is rolled back if any statement fails."""
+        with self.with_connection() as conn, self.with_cursor(conn=conn) as cur:
+            cur.execute("BEGIN")
+            try:
+                for unit in units:
+                    for statement in unit:
+                        cur.execute(statement.sql, self.encode_params(statement.params))
+                        if statement.expect_rows is not None and cur.rowcount != statement.expect_rows:
+                            LOGGER.debug("Update sql: %s", statement.sql)
+                            LOGGER.error("Incorrectly Updated rows: %s", cur.rowcount)
+                            raise RuntimeError(
+                                f"Updated {cur.rowcount} but expected {statement.expect_rows}: {statement.params}")
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def encode_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.compact:
+            return params
+        return {
+            column: encode_key(value) if column in KEY_COLUMNS else encode_time(value)
+            for column, value in params.items()
+        }
+
+    def decode_row(self, columns: List[str], row: tuple) -> Dict[str, Any]:
+        # times are datetimes whatever the schema, keys are only encoded in the compact one
+        record = dict(zip(columns, row))
+        for column, value in record.items():
+            if column in TIME_COLUMNS:
+                record[column] = decode_time(value)
+            elif self.compact and column in KEY_COLUMNS:
+                record[column] = decode_key(value)
+        return record
+
+    def _submit(self, unit: List[Statement]):
+        if self.write_behind is not None:
+            self._get_writer().submit(unit)
+        else:
+            self.execute_units([unit])
+
+    def set_write_behind(self, write_behind: Optional[WriteBehindConfig]):
+        """Switch the write-behind config, what the current writer has queued is committed first."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+            self.write_behind = write_behind
+        if writer is not None:
+            writer.close()
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait for queued lifecycle events to be persisted, no-op unless running in write-behind mode."""
+        if self._writer is not None:
+            self._writer.flush(timeout)
 
-    def create_tables_if_not_exists(self):
-        script = Path("../src/main/lstbench/ddl.sql").absolute()
+    @contextmanager
+    def read_cursor(self) -> Generator[sqlite3.Cursor, None, None]:
+        """Cursor that sees every lifecycle event recorded so far (read your own writes)."""
+        self.flush()
+        with self.with_cursor() as cur:
+            yield cur
+
+    def close(self):
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        try:
+            if writer is not None:
+                writer.close()
+        finally:
+            super().close()
+
+    def create_tables_if_not_exists(self, script: Optional[Path] = None):
+        if script is None:
+            script = Path(__file__).parent.joinpath("ddl_compact.sql" if self.compact else "ddl.sql")
         LOGGER.info("Running ddl script at %s", script)
         with open(script, encoding="utf-8") as script_file:
             script_content = script_file.read()
@@ -197,16 +456,14 @@ class Handler(Sqlite3Base):
         new_workload = Workload(name=name, component_type=WorkloadComponentType.WORKLOAD, **self.__create_base_args())
         workload_record = self.get_as_record(target=new_workload)
 
-        with self.with_cursor() as cur:
-            self.insert(cur, table_name="workload", record=workload_record)
+        self._submit([self._insert_statement(table_name="workload", record=workload_record)])
         return new_workload
 
     def create_new_phase(self, name: str) -> Phase:
         new_phase = Phase(name=name, component_type=WorkloadComponentType.PHASE, **self.__create_base_args())
         phase_record = self.get_as_record(target=new_phase)
 
-        with self.with_cursor() as cur:
-            self.insert(cur, table_name="phase", record=phase_record)
+        self._submit([self._insert_statement(table_name="phase", record=phase_record)])
         return new_phase
 
     def create_new_session(self, name: str) -> Session:
@@ -214,8 +471,7 @@ class Handler(Sqlite3Base):
             name=name, component_type=WorkloadComponentType.SESSION, logical_work=[], **self.__create_base_args())
         session_record = self.get_as_record(target=new_session)
 
-        with self.with_cursor() as cur:
-            self.insert(cur, table_name="session", record=session_record)
+        self._submit([self._insert_statement(table_name="session", record=session_record)])
         return new_session
 
     def create_new_task(self, name: str, task_type: TaskType) -> BaseTask:
@@ -229,20 +485,15 @@ class Handler(Sqlite3Base):
 
         task_record = self.get_as_record(target=new_task)
         task_record["task_type"] = task_type.value
-        with self.with_cursor() as cur:
-            self.insert(cur, table_name="base_task", record=task_record)
+        self._submit([self._insert_statement(table_name="base_task", record=task_record)])
         return new_task
 
-    def __start(self, cur, table_name: str, uuid: str, start_time: datetime):
+    def __start(self, table_name: str, uuid: str, start_time: datetime) -> Statement:
         sql = f"""
             UPDATE {table_name}
             SET start_time=:start_time, status=:status WHERE uuid=:uuid
         """
-        cur.execute(sql, {"start_time": start_time, "status": Status.RUNNING.value, "uuid": uuid})
-        if cur.rowcount != 1:
-            LOGGER.debug("%s update sql: %s", table_name, sql)
-            LOGGER.error("Incorrectly Updated rows: %s", cur.rowcount)
-            raise RuntimeError(f"Failed to start {table_name}: Updated {cur.rowcount} but expected 1!")
+        return Statement(sql, {"start_time": start_time, "status": Status.RUNNING.value, "uuid": uuid}, expect_rows=1)
 
     def start_task(self, task: BaseTask, session: Session, meta_data: Dict[str, Any]):
         # map the task to the session
@@ -251,13 +502,14 @@ class Handler(Sqlite3Base):
             "task_uuid": task.uuid,
             "meta_data": self.dump_json(meta_data)
         }
-        with self.with_connection() as conn, self.in_txn(conn=conn) as cur:
+        start_time = datetime.utcnow()
+        self._submit([
             # insert session <-> task mapping / session has one or more tasks
-            self.insert(cur, table_name="session_tasks", record=session_task_rec)
-            start_time = datetime.utcnow()
-            self.__start(cur, "base_task", task.uuid, start_time)
-            task.start_time = start_time
-            task.status = Status.RUNNING
+            self._insert_statement(table_name="session_tasks", record=session_task_rec),
+            self.__start("base_task", task.uuid, start_time)
+        ])
+        task.start_time = start_time
+        task.status = Status.RUNNING
 
     def start_session(self, session: Session, phase: Phase, meta_data: Dict[str, Any]):
         # map the session to the phase
@@ -266,12 +518,13 @@ class Handler(Sqlite3Base):
             "session_uuid": session.uuid,
             "meta_data": self.dump_json(meta_data)
         }
-        with self.with_connection() as conn, self.in_txn(conn=conn) as cur:
-            self.insert(cur, table_name="phase_sessions", record=phase_sessions_rec)
-            start_time = datetime.utcnow()
-            self.__start(cur, "session", session.uuid, start_time)
-            session.start_time = start_time
-            session.status = Status.RUNNING
+        start_time = datetime.utcnow()
+        self._submit([
+            self._insert_statement(table_name="phase_sessions", record=phase_sessions_rec),
+            self.__start("session", session.uuid, start_time)
+        ])
+        session.start_time = start_time
+        session.status = Status.RUNNING
 
     def start_phase(self, phase: Phase, workload: Workload, meta_data: Dict[str, Any]):
         # map the pahse to the workload
@@ -280,72 +533,361 @@ class Handler(Sqlite3Base):
             "workload_uuid": workload.uuid,
             "meta_data": self.dump_json(meta_data)
         }
-        with self.with_connection() as conn, self.in_txn(conn=conn) as cur:
-            self.insert(cur, table_name="workload_phases", record=workload_phases_rec)
-            start_time = datetime.utcnow()
-            self.__start(cur, "phase", phase.uuid, start_time)
-            phase.start_time = start_time
-            phase.status = Status.RUNNING
+        start_time = datetime.utcnow()
+        self._submit([
+            self._insert_statement(table_name="workload_phases", record=workload_phases_rec),
+            self.__start("phase", phase.uuid, start_time)
+        ])
+        phase.start_time = start_time
+        phase.status = Status.RUNNING
 
     def start_workload(self, workload: Workload):
-        with self.with_connection() as conn, self.in_txn(conn=conn) as cur:
-            start_time = datetime.utcnow()
-            self.__start(cur, "workload", workload.uuid, start_time)
-            workload.start_time = start_time
-            workload.status = Status.RUNNING
+        start_time = datetime.utcnow()
+        self._submit([self.__start("workload", workload.uuid, start_time)])
+        workload.start_time = start_time
+        workload.status = Status.RUNNING
 
     def __end(
-            self, cur, table_name: str, uuid: str, status: Status, end_time: datetime, error_msg: Optional[str] = None):
+            self, table_name: str, uuid: str, status: Status, end_time: datetime,
+            error_msg: Optional[str] = None, meta_data: Optional[Dict[str, Any]] = None) -> Statement:
+        params = {"end_time": end_time, "status": status.value, "uuid": uuid}
+        set_extra = ""
+        if error_msg:
+            set_extra += ", error_msg=:error_msg"
+            params["error_msg"] = error_msg
+        if meta_data:
+            set_extra += ", meta_data=:meta_data"
+            params["meta_data"] = self.dump_json(meta_data)
         update_sql = f"""
                 UPDATE {table_name}
-                SET end_time=:end_time, status=:status WHERE uuid=:uuid
+                SET end_time=:end_time, status=:status{set_extra} WHERE uuid=:uuid
             """
-        cur.execute(update_sql, {"end_time": end_time, "status": status.value, "uuid": uuid})
-        if cur.rowcount != 1:
-            LOGGER.debug("Task update sql: %s", update_sql)
-            LOGGER.error("Incorrectly Updated rows: %s", cur.rowcount)
-            raise RuntimeError(f"Failed to end {table_name}: Updated {cur.rowcount} but expected 1!")
-        cur.connection.commit()
-
-        if not error_msg:
-            update_sql = f"""
-                UPDATE {table_name}
-                SET error_msg=:error_msg WHERE uuid=:uuid
-            """
-            cur.execute(update_sql, {"error_msg": error_msg, "uuid": uuid})
-            cur.connection.commit()
-
-    def end_task(self, task: BaseTask, status: Status, error_msg: Optional[str] = None):
-        with self.with_connection() as conn, self.with_cursor(conn=conn) as cur:
-            end_time = datetime.utcnow()
-            self.__end(cur, "base_task", task.uuid, status, end_time, error_msg)
-            task.end_time = end_time
-            task.status = status
-            task.error_msg = error_msg
+        return Statement(update_sql, params, expect_rows=1)
+
+    def end_task(self, task: BaseTask, status: Status, error_msg: Optional[str] = None,
+                 meta_data: Optional[Dict[str, Any]] = None):
+        end_time = datetime.utcnow()
+        self._submit([self.__end("base_task", task.uuid, status, end_time, error_msg, meta_data)])
+        task.end_time = end_time
+        task.status = status
+        task.error_msg = error_msg
+        if meta_data:
+            task.meta_data = self.dump_json(meta_data)
 
     def end_session(self, session: Session, status: Status, error_msg: Optional[str] = None):
-        with self.with_connection() as conn, self.with_cursor(conn=conn) as cur:
-            end_time = datetime.utcnow()
-            self.__end(cur, "session", session.uuid, status, end_time, error_msg)
-            session.end_time = end_time
-            session.status = status
-            session.error_msg = error_msg
+        end_time = datetime.utcnow()
+        self._submit([self.__end("session", session.uuid, status, end_time, error_msg)])
+        session.end_time = end_time
+        session.status = status
+        session.error_msg = error_msg
 
     def end_phase(self, phase: Phase, status: Status, error_msg: Optional[str] = None):
-        with self.with_connection() as conn, self.with_cursor(conn=conn) as cur:
-            end_time = datetime.utcnow()
-            self.__end(cur, "phase", phase.uuid, status, end_time, error_msg)
-            phase.end_time = end_time
-            phase.status = status
-            phase.error_msg = error_msg
+        end_time = datetime.utcnow()
+        self._submit([self.__end("phase", phase.uuid, status, end_time, error_msg)])
+        phase.end_time = end_time
+        phase.status = status
+        phase.error_msg = error_msg
 
     def end_workload(self, workload: Workload, status: Status, error_msg: Optional[str] = None):
+        end_time = datetime.utcnow()
+        self._submit([self.__end("workload", workload.uuid, status, end_time, error_msg)])
+        workload.end_time = end_time
+        workload.status = status
+        workload.error_msg = error_msg
+
+    def start_existing(self, target: BaseModel):
+        """Start a component whose rows already exist, registered up front or picked up by a resumed run."""
+        table_name = self._TABLES[target.component_type]
+        start_time = target.start_time or datetime.utcnow()
+        sql = f"""
+            UPDATE {table_name}
+            SET start_time=:start_time, status=:status, end_time=NULL, error_msg=NULL WHERE uuid=:uuid
+        """
+        params = {"start_time": start_time, "status": Status.RUNNING.value, "uuid": target.uuid}
+        self._submit([Statement(sql, params, expect_rows=1)])
+        target.start_time = start_time
+        target.end_time = None
+        target.status = Status.RUNNING
+        target.error_msg = None
+
+    def abort_orphans(self, workload: Workload, error_msg: str = "Orphaned by an interrupted run"):
+        """Mark the phases, sessions and tasks of the workload left RUNNING by a dead runner as ABORTED."""
+        scopes = {
+            "phase": "SELECT phase_uuid FROM workload_phases WHERE workload_uuid=:workload_uuid",
+            "session": """
+                SELECT ps.session_uuid FROM workload_phases wp
+                JOIN phase_sessions ps ON ps.phase_uuid = wp.phase_uuid
+                WHERE wp.workload_uuid=:workload_uuid
+            """,
+            "base_task": """
+                SELECT st.task_uuid FROM workload_phases wp
+                JOIN phase_sessions ps ON ps.phase_uuid = wp.phase_uuid
+                JOIN session_tasks st ON st.session_uuid = ps.session_uuid
+                WHERE wp.workload_uuid=:workload_uuid
+            """
+        }
+        params = {
+            "aborted": Status.ABORTED.value,
+            "running": Status.RUNNING.value,
+            "end_time": datetime.utcnow(),
+            "error_msg": error_msg,
+            "workload_uuid": workload.uuid
+        }
+        self._submit([
+            Statement(f"""
+                UPDATE {table_name} SET status=:aborted, end_time=:end_time, error_msg=:error_msg
+                WHERE status=:running AND uuid IN ({members})
+            """, params)
+            for table_name, members in scopes.items()
+        ])
+
+    def record_task_timing(self, task: BaseTask, run_ns: int, bookkeeping_ns: int):
+        record = {"task_uuid": task.uuid, "run_ns": run_ns, "bookkeeping_ns": bookkeeping_ns}
+        self._submit([self._insert_statement(table_name="task_timing", record=record)])
+
+    def record_query_sample(self, task_uuid: str, sample: QuerySample):
+        record = {
+            "task_uuid": task_uuid,
+            "seq": sample.seq,
+            "query_name": sample.query_name,
+            "host": sample.host,
+            "start_time": sample.start_time,
+            "duration_ns": sample.duration_ns,
+            "rows_returned": sample.rows_returned,
+            "error_msg": sample.error_msg
+        }
+        self._submit([self._insert_statement(table_name="task_query_sample", record=record)])
+
+    def save_latency_histograms(self, scope: BaseModel, histograms: Dict[str, LatencyHistogram]):
+        unit = []
+        for task_type, histogram in histograms.items():
+            record = {
+                "scope_uuid": scope.uuid,
+                "component_type": scope.component_type.value,
+                "task_type": task_type,
+                "sample_count": histogram.total_count,
+                "min_ns": histogram.min_value,
+                "max_ns": histogram.max_value,
+                "mean_ns": histogram.mean(),
+                "p50_ns": histogram.percentile(50),
+                "p95_ns": histogram.percentile(95),
+                "p99_ns": histogram.percentile(99),
+                "buckets": histogram.to_json()
+            }
+            statement = self._insert_statement(table_name="latency_histogram", record=record)
+            statement.sql = statement.sql.replace("INSERT INTO", "INSERT OR REPLACE INTO")
+            unit.append(statement)
+        if unit:
+            self._submit(unit)
+
+    def register_plan(self, workload_definition: Dict[str, Any],
+                      describe_task: Callable[[Dict[str, Any]], Tuple[str, TaskType]]) -> RegisteredPlan:
+        """Insert every row of the workload as NOT_YET_STARTED in one transaction, before it runs.
+
+        ``describe_task`` gives the name and type of a task definition. The definition is walked once, lazy
+        definitions must be materialized first (see lstbench.workload.materialize_workload).
+        """
+        records: Dict[str, List[Dict[str, Any]]] = {}
+
+        def add(table_name: str, record: Dict[str, Any]):
+            records.setdefault(table_name, []).append(record)
+
+        workload = Workload(
+            name=workload_definition["name"], component_type=WorkloadComponentType.WORKLOAD,
+            **self.__create_base_args())
+        plan = RegisteredPlan(workload=workload)
+        add("workload", self.get_as_record(target=workload))
+        for phase_index, phase_def in enumerate(workload_definition["phases"]):
+            phase = Phase(name=phase_def["name"], component_type=WorkloadComponentType.PHASE,
+                          **self.__create_base_args())
+            plan.phases[phase_index] = phase
+            add("phase", self.get_as_record(target=phase))
+            add("workload_phases", {
+                "phase_uuid": phase.uuid,
+                "workload_uuid": workload.uuid,
+                "meta_data": self.dump_json({"phase_index": phase_index})
+            })
+            for session_index, session_def in enumerate(phase_def["sessions"]):
+                session = Session(
+                    name=session_def["name"], component_type=WorkloadComponentType.SESSION, logical_work=[],
+                    **self.__create_base_args())
+                plan.sessions[(phase_index, session_index)] = session
+                add("session", self.get_as_record(target=session))
+                add("phase_sessions", {
+                    "phase_uuid": phase.uuid,
+                    "session_uuid": session.uuid,
+                    "meta_data": self.dump_json({"session_index": session_index})
+                })
+                for task_index, task_def in enumerate(session_def["tasks"]):
+                    name, task_type = describe_task(task_def)
+                    task = BaseTask(
+                        name=name, task_type=task_type, component_type=WorkloadComponentType.TASK,
+                        **self.__create_base_args())
+                    plan.tasks[(phase_index, session_index, task_index)] = task
+                    task_record = self.get_as_record(target=task)
+                    task_record["task_type"] = task_type.value
+                    add("base_task", task_record)
+                    add("session_tasks", {
+                        "session_uuid": session.uuid,
+                        "task_uuid": task.uuid,
+                        "meta_data": self.dump_json(
+                            {"phase_index": phase_index, "session_index": session_index, "task_index": task_index})
+                    })
+
+        # keep the order with lifecycle events already queued by the write-behind writer
+        self.flush()
         with self.with_connection() as conn, self.with_cursor(conn=conn) as cur:
-            end_time = datetime.utcnow()
-            self.__end(cur, "workload", workload.uuid, status, end_time, error_msg)
-            workload.end_time = end_time
-            workload.status = status
-            workload.error_msg = error_msg
+            cur.execute("BEGIN")
+            try:
+                for table_name, table_records in records.items():
+                    sql = self._insert_statement(table_name=table_name, record=table_records[0]).sql
+                    cur.executemany(sql, [self.encode_params(record) for record in table_records])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        LOGGER.info("Registered %s with %d phase(s), %d session(s) and %d task(s)",
+                    workload.name, len(plan.phases), len(plan.sessions), len(plan.tasks))
+        return plan
+
+    def record_dag(self, workload: Workload, plan: ExecutionPlan):
+        unit = []
+        for node_id in plan.order:
+            node = plan.nodes[node_id]
+            record = {
+                "workload_uuid": workload.uuid,
+                "node_id": node_id,
+                "phase_name": node.phase_name,
+                "session_name": node.session_def["name"]
+            }
+            unit.append(self._insert_statement(table_name="dag_node", record=record))
+        for dependency, node_id in plan.edges():
+            record = {
+                "workload_uuid": workload.uuid,
+                "from_node": dependency.node_id,
+                "to_node": node_id,
+                "from_task": dependency.task_id or ""
+            }
+            statement = self._insert_statement(table_name="dag_edge", record=record)
+            # a session may list the same dependency twice
+            statement.sql = statement.sql.replace("INSERT INTO", "INSERT OR IGNORE INTO")
+            unit.append(statement)
+        self._submit(unit)
+
+    def start_dag_node(self, workload: Workload, node_id: str, session: Session):
+        sql = "UPDATE dag_node SET session_uuid=:session_uuid WHERE workload_uuid=:workload_uuid AND node_id=:node_id"
+        params = {"session_uuid": session.uuid, "workload_uuid": workload.uuid, "node_id": node_id}
+        self._submit([Statement(sql, params, expect_rows=1)])
+
+    def record_critical_path(self, workload: Workload, durations_ns: Dict[str, int], critical_path: List[str]):
+        sql = """
+            UPDATE dag_node SET duration_ns=:duration_ns, on_critical_path=:on_critical_path
+            WHERE workload_uuid=:workload_uuid AND node_id=:node_id
+        """
+        if not durations_ns:
+            return
+        self._submit([
+            Statement(sql, {
+                "duration_ns": duration_ns,
+                "on_critical_path": int(node_id in critical_path),
+                "workload_uuid": workload.uuid,
+                "node_id": node_id
+            }, expect_rows=1)
+            for node_id, duration_ns in durations_ns.items()
+        ])
+
+    def get_latency_summary(self, scope_uuid: str) -> List[Dict[str, Any]]:
+        """Persisted latency percentiles of a session, phase or workload by task type."""
+        sql = """
+            SELECT task_type, sample_count, min_ns, max_ns, mean_ns, p50_ns, p95_ns, p99_ns
+            FROM latency_histogram WHERE scope_uuid=:scope_uuid ORDER BY task_type
+        """
+        return self.query(sql, {"scope_uuid": scope_uuid})
+
+    def get_latency_histogram(self, scope_uuid: str, task_type: TaskType) -> Optional[LatencyHistogram]:
+        sql = "SELECT buckets FROM latency_histogram WHERE scope_uuid=:scope_uuid AND task_type=:task_type"
+        rows = self.query(sql, {"scope_uuid": scope_uuid, "task_type": task_type.value})
+        return LatencyHistogram.from_json(rows[0]["buckets"]) if rows else None
+
+    def query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        with self.read_cursor() as cur:
+            cur.execute(sql, self.encode_params(params or {}))
+            columns = [column[0] for column in cur.description]
+            return [self.decode_row(columns, row) for row in cur.fetchall()]
+
+    def find_tasks(self, status: Optional[Status] = None, task_type: Optional[TaskType] = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   **filters: Any) -> List[Dict[str, Any]]:
+        """Tasks with their session/phase/workload, e.g. ``find_tasks(Status.ERROR, since=last_week)``."""
+        where, params = self.__summary_filters("task_summary", status, task_type, since, until, filters)
+        return self.query(f"SELECT * FROM task_summary {where} ORDER BY start_time", params)
+
+    def task_duration_stats(self, group_by: Sequence[str] = ("workload_name", "task_type"),
+                            status: Optional[Status] = None, task_type: Optional[TaskType] = None,
+                            since: Optional[datetime] = None, until: Optional[datetime] = None,
+                            **filters: Any) -> List[Dict[str, Any]]:
+        """Task duration aggregates, e.g. average duration of LOAD tasks per workload."""
+        return self.__duration_stats("task_summary", group_by, status, task_type, since, until, filters)
+
+    def session_duration_stats(self, group_by: Sequence[str] = ("workload_name", "phase_name"),
+                               status: Optional[Status] = None, since: Optional[datetime] = None,
+                               until: Optional[datetime] = None, **filters: Any) -> List[Dict[str, Any]]:
+        return self.__duration_stats("session_summary", group_by, status, None, since, until, filters)
+
+    def phase_duration_stats(self, group_by: Sequence[str] = ("workload_name", "phase_name"),
+                             status: Optional[Status] = None, since: Optional[datetime] = None,
+                             until: Optional[datetime] = None, **filters: Any) -> List[Dict[str, Any]]:
+        return self.__duration_stats("phase_summary", group_by, status, None, since, until, filters)
+
+    def workload_duration_stats(self, group_by: Sequence[str] = ("workload_name",),
+                                status: Optional[Status] = None, since: Optional[datetime] = None,
+                                until: Optional[datetime] = None, **filters: Any) -> List[Dict[str, Any]]:
+        return self.__duration_stats("workload_summary", group_by, status, None, since, until, filters)
+
+    def __duration_stats(self, view: str, group_by: Sequence[str], status: Optional[Status],
+                         task_type: Optional[TaskType], since: Optional[datetime], until: Optional[datetime],
+                         filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.__check_columns(view, group_by)
+        where, params = self.__summary_filters(view, status, task_type, since, until, filters)
+        columns = ", ".join(group_by)
+        group = f"GROUP BY {columns}" if group_by else ""
+        select = f"{columns}, " if group_by else ""
+        sql = f"""
+            SELECT {select}COUNT(*) AS count, AVG(duration_secs) AS avg_secs, MIN(duration_secs) AS min_secs,
+                MAX(duration_secs) AS max_secs, SUM(duration_secs) AS total_secs
+            FROM {view} {where} {group}
+            ORDER BY {columns or "count"}
+        """
+        return self.query(sql, params)
+
+    def __summary_filters(self, view: str, status: Optional[Status], task_type: Optional[TaskType],
+                          since: Optional[datetime], until: Optional[datetime], filters: Dict[str, Any]):
+        self.__check_columns(view, filters.keys())
+        clauses, params = [], {}
+        for column, value in filters.items():
+            clauses.append(f"{column}=:{column}")
+            params[column] = value
+        if status is not None:
+            clauses.append("status=:status")
+            params["status"] = status.value
+        if task_type is not None:
+            clauses.append("task_type=:task_type")
+            params["task_type"] = task_type.value
+        if since is not None:
+            clauses.append("start_time>=:since")
+            params["since"] = since
+        if until is not None:
+            clauses.append("start_time<:until")
+            params["until"] = until
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def __check_columns(self, view: str, columns: Iterable[str]):
+        # column names end up in the sql text, only allow the ones of the summary views
+        allowed = self.SUMMARY_COLUMNS[view]
+        unknown = [column for column in columns if column not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown {view} column(s) {unknown}, expected one of {sorted(allowed)}")
 
     def dump_json(self, content: Dict[str, Any]) -> str:
         return json.dumps(content, indent=None, sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,161 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Resume of interrupted workloads from the lstbench database.
+
+The runner records the index of every phase, session and task in the meta data of the mapping rows. A
+checkpoint matches a workload definition to those rows by index and name, components already FINISHED are
+skipped and the unfinished phases and sessions are picked up again in place. Tasks that did not finish get a
+new task row, earlier attempts are kept, rows registered up front and never started are used as they are.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from main.lstbench.models import (BaseModel, BaseTask, Handler, Phase, Session,
+                                  Status, TaskType, Workload,
+                                  WorkloadComponentType)
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _index(row: Dict[str, Any], key: str) -> Optional[int]:
+    for meta_data in (row.get("map_meta"), row.get("meta_data")):
+        if meta_data:
+            value = json.loads(meta_data).get(key)
+            if value is not None:
+                return int(value)
+    return None
+
+
+def _by_index(rows: List[Dict[str, Any]], key: str) -> Dict[int, Dict[str, Any]]:
+    # rows recorded before the runner saved indices are matched by their start order
+    result = {}
+    for position, row in enumerate(rows):
+        index = _index(row, key)
+        result[position if index is None else index] = row
+    return result
+
+
+def _as_model(row: Dict[str, Any], component_type: WorkloadComponentType) -> BaseModel:
+    args = {
+        "name": row["name"],
+        "uuid": row["uuid"],
+        "create_time": row["create_time"],
+        "start_time": row["start_time"],
+        "end_time": row["end_time"],
+        "status": Status(row["status"]),
+        "component_type": component_type,
+        "meta_data": row["meta_data"],
+        "error_msg": row["error_msg"]
+    }
+    if component_type is WorkloadComponentType.TASK:
+        return BaseTask(task_type=TaskType(row["task_type"]), **args)
+    if component_type is WorkloadComponentType.SESSION:
+        return Session(logical_work=[], **args)
+    if component_type is WorkloadComponentType.PHASE:
+        return Phase(**args)
+    return Workload(**args)
+
+
+class Checkpoint:
+    """Progress of a recorded workload run."""
+
+    def __init__(self, workload: Workload, phases: Dict[int, Phase], sessions: Dict[Tuple[int, int], Session],
+                 finished_tasks: Set[Tuple[int, int, int]], pending_tasks: Dict[Tuple[int, int, int], BaseTask]):
+        self.workload = workload
+        self.phases = phases
+        self.sessions = sessions
+        self.finished_tasks = finished_tasks
+        # registered by Handler.register_plan and never started
+        self.pending_tasks = pending_tasks
+
+    @classmethod
+    def load(cls, handler: Handler, name: str) -> Optional["Checkpoint"]:
+        """Checkpoint of the latest run of the workload, None if it never ran.
+
+        RUNNING phases, sessions and tasks of that run are marked ABORTED first, the runner that owned them is
+        assumed dead.
+        """
+        rows = handler.query("SELECT * FROM workload WHERE name=:name ORDER BY create_time DESC LIMIT 1",
+                             {"name": name})
+        if not rows:
+            return None
+        workload = _as_model(rows[0], WorkloadComponentType.WORKLOAD)
+        handler.abort_orphans(workload)
+        params = {"workload_uuid": workload.uuid}
+
+        phase_rows = _by_index(handler.query("""
+            SELECT p.*, wp.meta_data AS map_meta FROM workload_phases wp
+            JOIN phase p ON p.uuid = wp.phase_uuid
+            WHERE wp.workload_uuid=:workload_uuid ORDER BY p.start_time
+        """, params), "phase_index")
+        phases = {index: _as_model(row, WorkloadComponentType.PHASE) for index, row in phase_rows.items()}
+        phase_indices = {phase.uuid: index for index, phase in phases.items()}
+
+        session_rows: Dict[int, List[Dict[str, Any]]] = {}
+        for row in handler.query("""
+            SELECT s.*, ps.phase_uuid, ps.meta_data AS map_meta FROM workload_phases wp
+            JOIN phase_sessions ps ON ps.phase_uuid = wp.phase_uuid
+            JOIN session s ON s.uuid = ps.session_uuid
+            WHERE wp.workload_uuid=:workload_uuid ORDER BY s.start_time
+        """, params):
+            if row["phase_uuid"] in phase_indices:
+                session_rows.setdefault(phase_indices[row["phase_uuid"]], []).append(row)
+        sessions = {
+            (phase_index, session_index): _as_model(row, WorkloadComponentType.SESSION)
+            for phase_index, rows in session_rows.items()
+            for session_index, row in _by_index(rows, "session_index").items()
+        }
+        session_indices = {session.uuid: key for key, session in sessions.items()}
+
+        finished_tasks = set()
+        pending_tasks = {}
+        for row in handler.query("""
+            SELECT t.*, st.session_uuid, st.meta_data AS map_meta FROM workload_phases wp
+            JOIN phase_sessions ps ON ps.phase_uuid = wp.phase_uuid
+            JOIN session_tasks st ON st.session_uuid = ps.session_uuid
+            JOIN base_task t ON t.uuid = st.task_uuid
+            WHERE wp.workload_uuid=:workload_uuid AND t.status IN (:finished, :pending)
+        """, dict(params, finished=Status.FINISHED.value, pending=Status.NOT_YET_STARTED.value)):
+            task_index = _index(row, "task_index")
+            if task_index is None or row["session_uuid"] not in session_indices:
+                continue
+            key = (*session_indices[row["session_uuid"]], task_index)
+            if row["status"] == Status.FINISHED.value:
+                finished_tasks.add(key)
+            else:
+                pending_tasks[key] = _as_model(row, WorkloadComponentType.TASK)
+
+        LOGGER.info("Resuming %s from %d phase(s), %d session(s) and %d finished task(s)",
+                    name, len(phases), len(sessions), len(finished_tasks))
+        return cls(workload, phases, sessions, finished_tasks, pending_tasks)
+
+    def phase(self, phase_index: int, name: str) -> Optional[Phase]:
+        return self.__check(self.phases.get(phase_index), name, f"Phase {phase_index}")
+
+    def session(self, phase_index: int, session_index: int, name: str) -> Optional[Session]:
+        return self.__check(self.sessions.get((phase_index, session_index)), name,
+                            f"Session {phase_index}/{session_index}")
+
+    def task_finished(self, phase_index: int, session_index: int, task_index: int) -> bool:
+        return (phase_index, session_index, task_index) in self.finished_tasks
+
+    def pending_task(self, phase_index: int, session_index: int, task_index: int) -> Optional[BaseTask]:
+        return self.pending_tasks.get((phase_index, session_index, task_index))
+
+    @staticmethod
+    def __check(component: Optional[BaseModel], name: str, what: str) -> Optional[BaseModel]:
+        if component is not None and component.name != name:
+            raise RuntimeError(f"{what} is {component.name} in the database but {name} in the definition")
+        return component
@@ -1,13 +1,30 @@
+import asyncio
 import logging
+import queue
+import threading
+import time
 from abc import ABC, abstractmethod
-from contextlib import contextmanager
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from contextlib import ExitStack, contextmanager
+from dataclasses import replace
 from functools import partial
-from random import choice
-from typing import Any, Dict, Generator, Optional
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional,
+                    Set, Tuple, Union)
 
 from main.config import Config, HostConfig
-from main.lstbench.models import (BaseTask, Handler, Phase, Session, Status,
-                                  TaskType, Workload)
+from main.lstbench.dag import ExecutionPlan, compile_workload
+from main.lstbench.executors import (ExecutorBackend, ProcessPoolBackend,
+                                     TaskOutcome)
+from main.lstbench.histogram import LatencyRecorder
+from main.lstbench.models import (BaseModel, BaseTask, Handler, Phase,
+                                  QuerySample, RegisteredPlan, RuntimeConfig,
+                                  Session, Status, TaskType, Workload)
+from main.lstbench.resume import Checkpoint
+from main.lstbench.scheduler import HostScheduler, host_key
+from main.lstbench.workload import (build_task, close_workload,
+                                    materialize_workload)
+from main.lstbench.writer import WriteBehindConfig
 from main.report import Report, Step
 
 LOGGER = logging.getLogger(__name__)
@@ -26,71 +43,267 @@ class BaseTaskRunnable(ABC):
         pass
 
 
+class AsyncTaskRunnable(ABC):
+    """Task that runs on the event loop of the runner, see ExperimentRunner.run_async."""
+
+    @abstractmethod
+    async def run_async(self, run_on_host: HostConfig):
+        pass
+
+
 class LstTask(BaseTaskRunnable):
 
+    # set to ExecutorBackend.PROCESS for tasks doing CPU heavy client side work
+    executor_backend: ExecutorBackend = ExecutorBackend.INLINE
+
     def __init__(self, task_type: TaskType):
         self.task_type: TaskType = task_type
+        # set by the runner for inline tasks, streams per query samples to the lstbench db
+        self.sample_sink: Optional[Callable[[QuerySample], None]] = None
+        self.stopping = False
+
+    def emit_sample(self, sample: QuerySample):
+        if self.sample_sink is not None:
+            self.sample_sink(sample)
+
+    def stop(self):
+        """Ask the task to return early, called by the runner when it timed out or got cancelled.
+
+        Long running tasks should check ``stopping`` between units of work, the runner waits for them to return.
+        """
+        self.stopping = True
+
+
+class AsyncLstTask(AsyncTaskRunnable):
+
+    def __init__(self, task_type: TaskType):
+        self.task_type: TaskType = task_type
+        self.sample_sink: Optional[Callable[[QuerySample], None]] = None
+
+    def emit_sample(self, sample: QuerySample):
+        if self.sample_sink is not None:
+            self.sample_sink(sample)
 
 
 class WorkloadRunner:
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, process_pool_size: Optional[int] = None,
+                 scheduler: Optional[HostScheduler] = None):
         self.config = config
         self.reporter = self.config.meta.reporter
+        self.process_backend = ProcessPoolBackend(max_workers=process_pool_size)
+        self.scheduler = scheduler if scheduler is not None else HostScheduler(self.config.client_hosts)
+
+    def close(self):
+        self.process_backend.shutdown()
+
+    @staticmethod
+    def session_key(phase_index: Optional[int], session_index: Optional[int]) -> str:
+        # tasks of one session share the key, used by the sticky policy
+        return f"{phase_index}/{session_index}"
+
+    def end_session(self, phase_index: int, session_index: int):
+        self.scheduler.end_session(self.session_key(phase_index, session_index))
+
+    @contextmanager
+    def on_host(self, meta: Dict[str, Any]) -> Generator[Optional[HostConfig], None, None]:
+        session_key = self.session_key(meta.get("phase_index"), meta.get("session_index"))
+        with self.scheduler.acquire(session_key=session_key) as run_on_host:
+            if run_on_host is not None:
+                meta["host"] = host_key(run_on_host)
+            yield run_on_host
 
     def run_and_wait(self, task: LstTask, meta: Dict[str, str] = None):
         if not meta:
             meta = {}
 
-        # get a random client
-        run_on_host: HostConfig = None
-        if self.config.client_hosts:
-            run_on_host = choice(self.config.client_hosts)
-        task.run(run_on_host=run_on_host)
-        task.wait()
+        with self.on_host(meta) as run_on_host:
+            if task.executor_backend is ExecutorBackend.PROCESS:
+                outcome = self.process_backend.submit(task, run_on_host).result()
+                return self._handle_outcome(outcome, meta)
+            task.run(run_on_host=run_on_host)
+            task.wait()
+        return None
+
+    def _handle_outcome(self, outcome: TaskOutcome, meta: Dict[str, Any]):
+        meta["worker_pid"] = outcome.pid
+        meta["worker_duration_ns"] = outcome.duration_ns
+        return ProcessPoolBackend.unwrap(outcome)
+
+    async def _run_in_process(self, task: LstTask, meta: Dict[str, Any]):
+        # the host is held until the worker is done, also when the runner stopped waiting for it on timeout
+        host = ExitStack()
+        run_on_host = host.enter_context(self.on_host(meta))
+        try:
+            future = self.process_backend.submit(task, run_on_host)
+        except BaseException:
+            host.close()
+            raise
+        future.add_done_callback(lambda _: host.close())
+        outcome = await asyncio.wrap_future(future)
+        return self._handle_outcome(outcome, meta)
+
+    async def _run_async_task(self, task: AsyncLstTask, meta: Dict[str, Any]):
+        with self.on_host(meta) as run_on_host:
+            return await task.run_async(run_on_host=run_on_host)
+
+    async def run_and_wait_async(self, task: Union[LstTask, AsyncLstTask], meta: Dict[str, str] = None,
+                                 timeout: Optional[float] = None):
+        if not meta:
+            meta = {}
+
+        if isinstance(task, AsyncTaskRunnable):
+            run = self._run_async_task(task, meta)
+        elif task.executor_backend is ExecutorBackend.PROCESS:
+            # the worker process can not be interrupted, on timeout it finishes the task in the background
+            run = self._run_in_process(task, meta)
+        else:
+            run = self._run_in_thread(task, meta)
+        try:
+            await asyncio.wait_for(run, timeout)
+        except TimeoutError as exc:
+            raise TimeoutError(f"Timed out after {timeout} secs") from exc
+
+    async def _run_in_thread(self, task: LstTask, meta: Dict[str, Any]):
+        """Run a blocking task on a thread of its own, abandoned when the runner stops waiting for it.
+
+        A thread can not be cancelled: on timeout or cancellation the task is asked to stop (see LstTask.stop)
+        and left to return in the background, still holding its host, while the session moves on.
+        """
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def settle(exc: Optional[BaseException]):
+            if not done.done():
+                if exc is None:
+                    done.set_result(None)
+                else:
+                    done.set_exception(exc)
+
+        def target():
+            exc = None
+            try:
+                self.run_and_wait(task, meta)
+            except BaseException as error:
+                exc = error
+            if loop.is_closed():
+                return
+            try:
+                loop.call_soon_threadsafe(settle, exc)
+            except RuntimeError:
+                # the loop closed in between, nobody waits for the task any more
+                pass
+
+        thread = threading.Thread(target=target, name=f"task-{type(task).__name__}", daemon=True)
+        thread.start()
+        try:
+            await asyncio.shield(done)
+        except asyncio.CancelledError:
+            task.stop()
+            LOGGER.warning("Stopped waiting for %s, it keeps its host until it returns", type(task).__name__)
+            raise
+
+
+class SerializedStep:
+    """Step whose calls to the reporter are serialized with a lock shared by the runner."""
+
+    def __init__(self, lock: threading.RLock, **kwargs):
+        self.lock = lock
+        self.step = Step(**kwargs)
+        self.entered = None
+
+    def __enter__(self):
+        with self.lock:
+            self.entered = self.step.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.lock:
+            return self.step.__exit__(exc_type, exc_value, traceback)
+
+    def failed(self):
+        with self.lock:
+            self.entered.failed()
+
+    def edit_step_properties(self, properties: Dict[str, Any]):
+        with self.lock:
+            self.entered.edit_step_properties(properties)
 
 
 class ExperimentRunner:
     """An experiment is a workload run against a config."""
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, handler: Optional[Handler] = None,
+                 runtime_config: Optional[RuntimeConfig] = None):
         self.config = config
         self.reporter: Report = self.config.meta.reporter
-
-        # configure step
-        self.step = partial(Step, reporter=self.reporter)
+        # pass a Handler(write_behind=WriteBehindConfig()) to keep bookkeeping off the task path
+        self.handler: Handler = handler if handler is not None else sqlite3_handler
+        self.runtime_config = runtime_config if runtime_config is not None else RuntimeConfig()
+        self.latency = LatencyRecorder()
+        # progress of the run picked up by a resumed run
+        self.checkpoint: Optional[Checkpoint] = None
+        # rows of the run created up front when runtime_config.register_plan is set
+        self.plan: Optional[RegisteredPlan] = None
+
+        # configure step, sessions may report concurrently
+        self.step = partial(SerializedStep, lock=threading.RLock(), reporter=self.reporter)
 
     @contextmanager
-    def task_ctx(self, session: Session, name: str, task_type: TaskType) -> Generator[BaseTask, None, None]:
-        task = sqlite3_handler.create_new_task(name, task_type)
-        sqlite3_handler.start_task(task, session, {})
+    def task_ctx(self, session: Session, name: str, task_type: TaskType, meta: Optional[Dict[str, Any]] = None,
+                 existing: Optional[BaseTask] = None) -> Generator[BaseTask, None, None]:
+        ctx_start_ns = time.perf_counter_ns()
+        if existing is None:
+            task = self.handler.create_new_task(name, task_type)
+            self.handler.start_task(task, session, dict(meta or {}))
+        else:
+            task = existing
+            self.handler.start_existing(task)
 
         status = Status.FINISHED
         error_msg = None
         with self.step(name=f"Task: {name}", properties={"task_type": task_type.name}) as step:
             try:
                 yield task
+            except (asyncio.CancelledError, KeyboardInterrupt):
+                status = Status.ABORTED
+                step.failed()
+                raise
             except Exception as exc:
                 error_msg = exc.args[0]
-                status = Status.ERROR
+                status = Status.TIMED_OUT if isinstance(exc, TimeoutError) else Status.ERROR
 
                 step.failed()
                 step.edit_step_properties({"exc": str(exc.args[0])})
+                if status is Status.TIMED_OUT and not self.runtime_config.fail_on_timeout:
+                    LOGGER.warning("Task %s timed out, the session goes on: %s", name, error_msg)
+                    return
                 # fail the session if task has failed
                 raise RuntimeError(f"Task {name} failed.") from exc
             finally:
-                sqlite3_handler.end_task(task, status, error_msg)
+                self.handler.end_task(task, status, error_msg, meta)
+                self._record_timing(task, session, ctx_start_ns)
 
     @contextmanager
-    def session_ctx(self, phase: Phase, name: str) -> Generator[Session, None, None]:
-        session = sqlite3_handler.create_new_session(name)
-        sqlite3_handler.start_session(session, phase, {})
+    def session_ctx(self, phase: Phase, name: str, meta: Optional[Dict[str, Any]] = None,
+                    existing: Optional[Session] = None) -> Generator[Session, None, None]:
+        if existing is None:
+            session = self.handler.create_new_session(name)
+            self.handler.start_session(session, phase, meta or {})
+        else:
+            session = existing
+            self.handler.start_existing(session)
+        self.latency.open_scope(session.uuid, parent=phase.uuid)
 
         status = Status.FINISHED
         error_msg = None
         with self.step(name=f"Session: {name}", properties={}) as step:
             try:
                 yield session
+            except (asyncio.CancelledError, KeyboardInterrupt):
+                status = Status.ABORTED
+                step.failed()
+                raise
             except Exception as exc:
                 error_msg = exc.args[0]
                 status = Status.ERROR
@@ -99,18 +312,29 @@ class ExperimentRunner:
                 step.edit_step_properties({"exc": str(exc.args[0])})
                 raise RuntimeError(f"Session {name} failed.") from exc
             finally:
-                sqlite3_handler.end_session(session, status, error_msg)
+                self.handler.end_session(session, status, error_msg)
+                self.handler.save_latency_histograms(session, self.latency.close_scope(session.uuid))
 
     @contextmanager
-    def phase_ctx(self, workload: Workload, name: str) -> Generator[Phase, None, None]:
-        phase = sqlite3_handler.create_new_phase(name)
-        sqlite3_handler.start_phase(phase, workload, {})
+    def phase_ctx(self, workload: Workload, name: str, meta: Optional[Dict[str, Any]] = None,
+                  existing: Optional[Phase] = None) -> Generator[Phase, None, None]:
+        if existing is None:
+            phase = self.handler.create_new_phase(name)
+            self.handler.start_phase(phase, workload, meta or {})
+        else:
+            phase = existing
+            self.handler.start_existing(phase)
+        self.latency.open_scope(phase.uuid, parent=workload.uuid)
 
         status = Status.FINISHED
         error_msg = None
         with self.step(name=f"Phase: {name}", properties={}) as step:
             try:
                 yield phase
+            except (asyncio.CancelledError, KeyboardInterrupt):
+                status = Status.ABORTED
+                step.failed()
+                raise
             except Exception as exc:
                 error_msg = exc.args[0]
                 status = Status.ERROR
@@ -119,45 +343,466 @@ class ExperimentRunner:
                 step.edit_step_properties({"exc": str(exc.args[0])})
                 raise RuntimeError(f"Phase {name} failed.") from exc
             finally:
-                sqlite3_handler.end_phase(phase, status, error_msg)
+                self.handler.end_phase(phase, status, error_msg)
+                self.handler.save_latency_histograms(phase, self.latency.close_scope(phase.uuid))
 
     @contextmanager
-    def workload_ctx(self, name: str) -> Generator[Phase, None, None]:
-        workload = sqlite3_handler.create_new_workload(name)
-        sqlite3_handler.start_workload(workload)
+    def workload_ctx(self, name: str, existing: Optional[Workload] = None) -> Generator[Workload, None, None]:
+        if existing is None:
+            workload = self.handler.create_new_workload(name)
+            self.handler.start_workload(workload)
+        else:
+            workload = existing
+            self.handler.start_existing(workload)
+        self.latency.open_scope(workload.uuid)
 
         status = Status.FINISHED
         error_msg = None
         try:
             yield workload
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            status = Status.ABORTED
+            raise
         except Exception as exc:
             error_msg = exc.args[0]
             status = Status.ERROR
             raise RuntimeError(f"Workload {name} failed.") from exc
         finally:
-            sqlite3_handler.end_workload(workload, status, error_msg)
+            self.handler.end_workload(workload, status, error_msg)
+            self.handler.save_latency_histograms(workload, self.latency.close_scope(workload.uuid))
 
-    def run(self, workload_definition: Dict[str, Any]):
-        sqlite3_handler.create_tables_if_not_exists()
+    @contextmanager
+    def timed_run(self, task: BaseTask):
+        """Monotonic duration of the task run, kept apart from the bookkeeping around it."""
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            task.run_ns = time.perf_counter_ns() - start_ns
+
+    def _bind_sample_sink(self, task_instance: Union[LstTask, AsyncLstTask], task: BaseTask):
+        # tasks in worker processes can not reach the handler, only the parent writes to the db
+        if getattr(task_instance, "executor_backend", ExecutorBackend.INLINE) is ExecutorBackend.INLINE:
+            task_instance.sample_sink = partial(self.handler.record_query_sample, task.uuid)
+
+    def _record_timing(self, task: BaseTask, session: Session, ctx_start_ns: int):
+        if task.run_ns is None:
+            return
+        bookkeeping_ns = time.perf_counter_ns() - ctx_start_ns - task.run_ns
+        self.handler.record_task_timing(task, task.run_ns, bookkeeping_ns)
+        if task.status is Status.FINISHED:
+            self.latency.record(session.uuid, task.task_type.value, task.run_ns)
+
+    def run(self, workload_definition: Dict[str, Any], resume: bool = False):
+        """Run the workload, phases, sessions and tasks may be lazy iterables (see lstbench.workload).
+
+        With ``resume`` the latest run of the workload with the same name is continued instead, see
+        lstbench.resume. Resuming a resumed run is safe, a finished run is left as is.
+        """
+        self.handler.create_tables_if_not_exists()
+        try:
+            if not self._load_checkpoint(workload_definition["name"], resume):
+                return
+            definition = self._register_plan(workload_definition)
 
-        workload_instance = WorkloadRunner(config=self.config)
-        with self.workload_ctx(workload_definition["name"]) as curr_workload:
+            workload_instance = self._workload_runner()
+            try:
+                self._run(workload_instance, definition)
+            finally:
+                workload_instance.close()
+                self.handler.close()
+        finally:
+            close_workload(workload_definition)
+
+    def _run(self, workload_instance: WorkloadRunner, workload_definition: Dict[str, Any]):
+        with self.workload_ctx(workload_definition["name"], self._existing_workload()) as curr_workload:
+            phase_count = 0
             for phase_index, phase_def in enumerate(workload_definition["phases"]):
-                with self.phase_ctx(curr_workload, phase_def["name"]) as curr_phase:
-                    for session_index, session_def in enumerate(phase_def["sessions"]):
-                        with self.session_ctx(curr_phase, session_def["name"]) as curr_session:
-                            for task_index, task_def in enumerate(session_def["tasks"]):
-                                task_instance: LstTask = task_def["task"]
-                                task_type = task_instance.task_type
-                                task_name = task_def.get("name", f"{task_type}_{task_instance.__class__.__name__}")
-                                task_meta = {
-                                    "phase_index": phase_index,
-                                    "session_index": session_index,
-                                    "task_index": task_index
-                                }
-                                with self.task_ctx(curr_session, task_name, task_type) as curr_task:
-                                    task_meta["uuid"] = curr_task.uuid
-                                    workload_instance.run_and_wait(task=task_instance, meta=task_meta)
-                            LOGGER.info("All %d tasks executed", len(session_def["tasks"]))
-                    LOGGER.info("All %d sessions finished", len(phase_def["sessions"]))
-            LOGGER.info("All %d phases finished", len(workload_definition["phases"]))
+                existing = self._existing_phase(phase_index, phase_def["name"])
+                if self._is_finished(existing):
+                    continue
+                with self.phase_ctx(curr_workload, phase_def["name"], {"phase_index": phase_index},
+                                    existing) as curr_phase:
+                    session_count = self._run_sessions(
+                        workload_instance, curr_phase, phase_index, phase_def["sessions"])
+                    LOGGER.info("All %d sessions finished", session_count)
+                phase_count += 1
+            LOGGER.info("All %d phases finished", phase_count)
+
+    def _run_sessions(self, workload_instance: WorkloadRunner, curr_phase: Phase, phase_index: int,
+                      session_defs: Iterable[Dict[str, Any]]) -> int:
+        concurrency = self.runtime_config.with_concurrency
+        session_count = 0
+        if concurrency <= 1:
+            for session_index, session_def in enumerate(session_defs):
+                self._run_session(workload_instance, curr_phase, phase_index, session_index, session_def)
+                session_count += 1
+            return session_count
+
+        # sessions of a phase are independent, each one still runs its tasks in order
+        errors: List[BaseException] = []
+        running: Set[Future] = set()
+
+        def collect(finished: Set[Future]):
+            errors.extend(future.exception() for future in finished if future.exception() is not None)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"phase-{phase_index}") as pool:
+            # pull the next session only when a worker is free, session definitions may be a long generator
+            for session_index, session_def in enumerate(session_defs):
+                while len(running) >= concurrency and not errors:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                # like the sequential run, do not start new sessions once one has failed
+                if errors:
+                    break
+                running.add(pool.submit(
+                    self._run_session, workload_instance, curr_phase, phase_index, session_index, session_def))
+                session_count += 1
+            finished, _ = wait(running)
+            collect(finished)
+
+        if errors:
+            if len(errors) > 1:
+                LOGGER.error("%d sessions failed in phase %s", len(errors), curr_phase.name)
+            raise errors[0]
+        return session_count
+
+    def _run_session(self, workload_instance: WorkloadRunner, curr_phase: Phase, phase_index: int, session_index: int,
+                     session_def: Dict[str, Any], on_started: Optional[Callable[[Session], None]] = None,
+                     on_task_done: Optional[Callable[[int], None]] = None):
+        existing = self._existing_session(phase_index, session_index, session_def["name"])
+        if self._is_finished(existing):
+            return
+        try:
+            with self.session_ctx(curr_phase, session_def["name"], {"session_index": session_index},
+                                  existing) as curr_session:
+                if on_started is not None:
+                    on_started(curr_session)
+                task_count = 0
+                for task_index, task_def in enumerate(session_def["tasks"]):
+                    if self._is_resumed_task(phase_index, session_index, task_index):
+                        continue
+                    task_instance, task_name, task_type, task_meta = self._task_args(
+                        task_def, phase_index, session_index, task_index)
+                    existing_task = self._existing_task(phase_index, session_index, task_index)
+                    with self.task_ctx(curr_session, task_name, task_type, task_meta, existing_task) as curr_task:
+                        task_meta["uuid"] = curr_task.uuid
+                        self._bind_sample_sink(task_instance, curr_task)
+                        with self.timed_run(curr_task):
+                            workload_instance.run_and_wait(task=task_instance, meta=task_meta)
+                    if on_task_done is not None:
+                        on_task_done(task_index)
+                    task_count += 1
+                LOGGER.info("All %d tasks executed", task_count)
+        finally:
+            workload_instance.end_session(phase_index, session_index)
+
+    def run_dag(self, workload_definition: Dict[str, Any]):
+        """Run every session as soon as the sessions and tasks it depends on are done, see lstbench.dag.
+
+        Up to ``with_concurrency`` sessions run at once. Phases may overlap, a phase is started with its first
+        session and ended with its last one, without a report step of its own. The whole definition is compiled
+        up front, lazy definitions are materialized. The DAG and its critical path are saved in dag_node and
+        dag_edge.
+        """
+        try:
+            plan = compile_workload(workload_definition)
+        finally:
+            close_workload(workload_definition)
+        self.handler.create_tables_if_not_exists()
+        self.checkpoint = None
+        self.plan = None
+
+        workload_instance = self._workload_runner()
+        try:
+            with self.workload_ctx(plan.name) as curr_workload:
+                self.handler.record_dag(curr_workload, plan)
+                self._run_plan(workload_instance, curr_workload, plan)
+        finally:
+            workload_instance.close()
+            self.handler.close()
+
+    def _run_plan(self, workload_instance: WorkloadRunner, curr_workload: Workload, plan: ExecutionPlan):
+        concurrency = max(1, self.runtime_config.with_concurrency)
+        # (node id, task id, None) when a task is done, (node id, None, future) when the session is done
+        events: queue.Queue = queue.Queue()
+        waiting = list(plan.order)
+        running: Dict[str, Future] = {}
+        done_nodes: Set[str] = set()
+        done_tasks: Set[Tuple[str, str]] = set()
+        durations_ns: Dict[str, int] = {}
+        errors: List[BaseException] = []
+
+        phases: Dict[int, Phase] = {}
+        phase_remaining: Dict[int, int] = {}
+        for node in plan.nodes.values():
+            phase_remaining[node.phase_index] = phase_remaining.get(node.phase_index, 0) + 1
+        phase_errors: Dict[int, str] = {}
+
+        def is_ready(node_id: str) -> bool:
+            return all(
+                dependency.node_id in done_nodes if dependency.task_id is None
+                else (dependency.node_id, dependency.task_id) in done_tasks
+                for dependency in plan.nodes[node_id].depends_on)
+
+        def run_node(node_id: str, curr_phase: Phase):
+            node = plan.nodes[node_id]
+            start_ns = time.perf_counter_ns()
+            try:
+                self._run_session(
+                    workload_instance, curr_phase, node.phase_index, node.session_index, node.session_def,
+                    on_started=partial(self.handler.start_dag_node, curr_workload, node_id),
+                    on_task_done=lambda task_index: events.put((node_id, node.task_ids[task_index], None)))
+            finally:
+                durations_ns[node_id] = time.perf_counter_ns() - start_ns
+
+        def submit(pool: ThreadPoolExecutor, node_id: str):
+            phase_index = plan.nodes[node_id].phase_index
+            if phase_index not in phases:
+                phases[phase_index] = self._open_phase(curr_workload, plan.nodes[node_id].phase_name, phase_index)
+            future = pool.submit(run_node, node_id, phases[phase_index])
+            future.add_done_callback(lambda finished: events.put((node_id, None, finished)))
+            running[node_id] = future
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="dag") as pool:
+                while waiting or running:
+                    if not errors:
+                        for node_id in [node_id for node_id in waiting if is_ready(node_id)]:
+                            if len(running) >= concurrency:
+                                break
+                            waiting.remove(node_id)
+                            submit(pool, node_id)
+                    if not running:
+                        # only after a failure, the dependencies of a valid plan are always met eventually
+                        break
+
+                    node_id, task_id, future = events.get()
+                    if future is None:
+                        done_tasks.add((node_id, task_id))
+                        continue
+                    del running[node_id]
+                    phase_index = plan.nodes[node_id].phase_index
+                    phase_remaining[phase_index] -= 1
+                    if future.exception() is not None:
+                        errors.append(future.exception())
+                        phase_errors.setdefault(phase_index, str(future.exception()))
+                    else:
+                        done_nodes.add(node_id)
+                    if phase_remaining[phase_index] == 0:
+                        self._close_phase(phases.pop(phase_index), phase_errors.get(phase_index))
+        finally:
+            # phases with sessions that never got to run because of a failure
+            for phase_index, curr_phase in phases.items():
+                self._close_phase(
+                    curr_phase, phase_errors.get(phase_index, f"{phase_remaining[phase_index]} session(s) not run"),
+                    Status.ERROR if phase_index in phase_errors else Status.ABORTED)
+            critical_path, length_ns = plan.critical_path(durations_ns)
+            self.handler.record_critical_path(curr_workload, durations_ns, critical_path)
+            LOGGER.info("Critical path %s took %.3f secs", " -> ".join(critical_path), length_ns / 1e9)
+
+        if errors:
+            if len(errors) > 1:
+                LOGGER.error("%d sessions failed in workload %s", len(errors), plan.name)
+            raise errors[0]
+        LOGGER.info("All %d sessions finished", len(done_nodes))
+
+    def _open_phase(self, workload: Workload, name: str, phase_index: int) -> Phase:
+        phase = self.handler.create_new_phase(name)
+        self.handler.start_phase(phase, workload, {"phase_index": phase_index})
+        self.latency.open_scope(phase.uuid, parent=workload.uuid)
+        return phase
+
+    def _close_phase(self, phase: Phase, error_msg: Optional[str] = None, status: Optional[Status] = None):
+        if status is None:
+            status = Status.ERROR if error_msg else Status.FINISHED
+        self.handler.end_phase(phase, status, error_msg)
+        self.handler.save_latency_histograms(phase, self.latency.close_scope(phase.uuid))
+
+    def _load_checkpoint(self, name: str, resume: bool) -> bool:
+        """Set the checkpoint of a resumed run, False when there is nothing left to run."""
+        self.checkpoint = Checkpoint.load(self.handler, name) if resume else None
+        if self.checkpoint is not None and self.checkpoint.workload.status is Status.FINISHED:
+            LOGGER.info("Workload %s already finished, nothing to resume", name)
+            self.handler.close()
+            return False
+        return True
+
+    def _register_plan(self, workload_definition: Dict[str, Any]) -> Dict[str, Any]:
+        self.plan = None
+        if not self.runtime_config.register_plan:
+            return workload_definition
+        if self.checkpoint is not None:
+            LOGGER.info("Resumed run, the rows of %s exist already", workload_definition["name"])
+            return workload_definition
+
+        workload_definition = materialize_workload(workload_definition)
+        # the plan needs the name and type of every task, each one is built once here and that instance runs later
+        for phase_def in workload_definition["phases"]:
+            for session_def in phase_def["sessions"]:
+                session_def["tasks"] = [dict(task_def, task=build_task(task_def)) for task_def in session_def["tasks"]]
+        self.plan = self.handler.register_plan(workload_definition, self._describe_task)
+        return workload_definition
+
+    def _describe_task(self, task_def: Dict[str, Any]) -> Tuple[str, TaskType]:
+        task_instance = task_def["task"]
+        return self._task_name(task_def, task_instance), task_instance.task_type
+
+    @staticmethod
+    def _task_name(task_def: Dict[str, Any], task_instance: Union[LstTask, AsyncLstTask]) -> str:
+        return task_def.get("name", f"{task_instance.task_type}_{task_instance.__class__.__name__}")
+
+    def _existing_workload(self) -> Optional[Workload]:
+        if self.checkpoint is not None:
+            return self.checkpoint.workload
+        return self.plan.workload if self.plan is not None else None
+
+    def _existing_phase(self, phase_index: int, name: str) -> Optional[Phase]:
+        if self.checkpoint is not None:
+            return self.checkpoint.phase(phase_index, name)
+        return self.plan.phases[phase_index] if self.plan is not None else None
+
+    def _existing_session(self, phase_index: int, session_index: int, name: str) -> Optional[Session]:
+        if self.checkpoint is not None:
+            return self.checkpoint.session(phase_index, session_index, name)
+        return self.plan.sessions[(phase_index, session_index)] if self.plan is not None else None
+
+    def _existing_task(self, phase_index: int, session_index: int, task_index: int) -> Optional[BaseTask]:
+        if self.checkpoint is not None:
+            return self.checkpoint.pending_task(phase_index, session_index, task_index)
+        return self.plan.tasks[(phase_index, session_index, task_index)] if self.plan is not None else None
+
+    def _is_resumed_task(self, phase_index: int, session_index: int, task_index: int) -> bool:
+        return self.checkpoint is not None and self.checkpoint.task_finished(phase_index, session_index, task_index)
+
+    @staticmethod
+    def _is_finished(existing: Optional[BaseModel]) -> bool:
+        if existing is not None and existing.status is Status.FINISHED:
+            LOGGER.info("%s %s already finished, skipping", existing.component_type.name.title(), existing.name)
+            return True
+        return False
+
+    def _workload_runner(self) -> WorkloadRunner:
+        scheduler = HostScheduler.with_policy(self.config.client_hosts, self.runtime_config.host_policy)
+        return WorkloadRunner(
+            config=self.config, process_pool_size=self.runtime_config.process_pool_size, scheduler=scheduler)
+
+    def _task_args(self, task_def: Dict[str, Any], phase_index: int, session_index: int,
+                   task_index: int) -> Tuple[Union[LstTask, AsyncLstTask], str, TaskType, Dict[str, Any]]:
+        # built here so a long workload does not hold every task instance up front, unless registered as a plan
+        task_instance: Union[LstTask, AsyncLstTask] = build_task(task_def)
+        task_type = task_instance.task_type
+        task_name = self._task_name(task_def, task_instance)
+        task_meta = {
+            "phase_index": phase_index,
+            "session_index": session_index,
+            "task_index": task_index
+        }
+        return task_instance, task_name, task_type, task_meta
+
+    async def run_async(self, workload_definition: Dict[str, Any], resume: bool = False):
+        """Run the workload on the current event loop, e.g. ``asyncio.run(runner.run_async(definition))``.
+
+        Up to ``with_concurrency`` sessions of a phase run at once on the loop, and so at most that many tasks.
+        Lifecycle events are always written behind, without a limit on the queue (see Handler.write_behind), to
+        keep sqlite off the loop.
+        A task running longer than ``timeout_secs`` is recorded as TIMED_OUT and its session goes on with the next
+        task, unless ``fail_on_timeout`` is set. Coroutine tasks are cancelled. Blocking tasks are asked to stop
+        (see LstTask.stop) and left to return in the background, as are tasks in worker processes; either keeps
+        its host until it is actually done. When a session fails the other sessions of the phase are cancelled
+        and recorded as ABORTED. See run for ``resume``.
+        """
+        self.handler.create_tables_if_not_exists()
+        try:
+            if not self._load_checkpoint(workload_definition["name"], resume):
+                return
+            await self._run_workload_async(self._register_plan(workload_definition))
+        finally:
+            close_workload(workload_definition)
+
+    async def _run_workload_async(self, workload_definition: Dict[str, Any]):
+        # lifecycle rows are written by the background writer, a direct sqlite commit would block the loop, and
+        # its queue has no limit, submit would block the loop too once a bounded queue is full
+        write_behind = self.handler.write_behind
+        self.handler.set_write_behind(replace(write_behind or WriteBehindConfig(), max_pending=0))
+        workload_instance = self._workload_runner()
+        try:
+            with self.workload_ctx(workload_definition["name"], self._existing_workload()) as curr_workload:
+                phase_count = 0
+                for phase_index, phase_def in enumerate(workload_definition["phases"]):
+                    existing = self._existing_phase(phase_index, phase_def["name"])
+                    if self._is_finished(existing):
+                        continue
+                    with self.phase_ctx(curr_workload, phase_def["name"], {"phase_index": phase_index},
+                                        existing) as curr_phase:
+                        session_count = await self._run_sessions_async(
+                            workload_instance, curr_phase, phase_index, phase_def["sessions"])
+                        LOGGER.info("All %d sessions finished", session_count)
+                    phase_count += 1
+                LOGGER.info("All %d phases finished", phase_count)
+        finally:
+            workload_instance.close()
+            self.handler.close()
+            self.handler.set_write_behind(write_behind)
+
+    async def _run_sessions_async(self, workload_instance: WorkloadRunner, curr_phase: Phase, phase_index: int,
+                                  session_defs: Iterable[Dict[str, Any]]) -> int:
+        # sessions run their tasks in order, so this also bounds the tasks running at once
+        concurrency = max(1, self.runtime_config.with_concurrency)
+        running: Set[asyncio.Task] = set()
+        errors: List[BaseException] = []
+        session_count = 0
+
+        def collect(finished: Set[asyncio.Task]):
+            errors.extend(run.exception() for run in finished if not run.cancelled() and run.exception() is not None)
+
+        try:
+            for session_index, session_def in enumerate(session_defs):
+                while len(running) >= concurrency and not errors:
+                    finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    collect(finished)
+                if errors:
+                    break
+                running.add(asyncio.create_task(
+                    self._run_session_async(workload_instance, curr_phase, phase_index, session_index, session_def),
+                    name=f"session-{phase_index}-{session_index}"))
+                session_count += 1
+            while running and not errors:
+                finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_EXCEPTION)
+                collect(finished)
+        finally:
+            # abort the rest of the phase once a session has failed or the phase got cancelled
+            for session_run in running:
+                session_run.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        if errors:
+            raise errors[0]
+        return session_count
+
+    async def _run_session_async(self, workload_instance: WorkloadRunner, curr_phase: Phase, phase_index: int,
+                                 session_index: int, session_def: Dict[str, Any]):
+        existing = self._existing_session(phase_index, session_index, session_def["name"])
+        if self._is_finished(existing):
+            return
+        try:
+            with self.session_ctx(curr_phase, session_def["name"], {"session_index": session_index},
+                                  existing) as curr_session:
+                task_count = 0
+                for task_index, task_def in enumerate(session_def["tasks"]):
+                    if self._is_resumed_task(phase_index, session_index, task_index):
+                        continue
+                    task_instance, task_name, task_type, task_meta = self._task_args(
+                        task_def, phase_index, session_index, task_index)
+                    timeout = task_def.get("timeout_secs", self.runtime_config.timeout_secs)
+                    existing_task = self._existing_task(phase_index, session_index, task_index)
+                    with self.task_ctx(curr_session, task_name, task_type, task_meta, existing_task) as curr_task:
+                        task_meta["uuid"] = curr_task.uuid
+                        self._bind_sample_sink(task_instance, curr_task)
+                        with self.timed_run(curr_task):
+                            await workload_instance.run_and_wait_async(
+                                task=task_instance, meta=task_meta, timeout=timeout)
+                    task_count += 1
+                LOGGER.info("All %d tasks executed", task_count)
+        finally:
+            workload_instance.end_session(phase_index, session_index)
@@ -0,0 +1,149 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Client host scheduling for LST tasks.
+
+The HostScheduler keeps track of the tasks in flight on every client host and asks a pluggable policy where
+the next task should run.
+"""
+
+import itertools
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Generator, List, Optional
+
+from main.config import HostConfig
+
+LOGGER = logging.getLogger(__name__)
+
+
+def host_key(host: HostConfig) -> str:
+    return host.private_ip
+
+
+def host_capacity(host: HostConfig) -> float:
+    """Relative capacity of a client host, taken from the ``capacity`` tag and 1 when not set."""
+    tags = getattr(host, "tags", None) or {}
+    return max(float(tags.get("capacity", 1)), 0.001)
+
+
+class SchedulingPolicy(ABC):
+
+    @abstractmethod
+    def choose(self, hosts: List[HostConfig], in_flight: Dict[str, int], session_key: Optional[str]) -> HostConfig:
+        pass
+
+    def release(self, session_key: str):
+        """Forget what was kept for a session, called once the session is done."""
+
+
+class RoundRobinPolicy(SchedulingPolicy):
+
+    def __init__(self):
+        self.counter = itertools.count()
+
+    def choose(self, hosts: List[HostConfig], in_flight: Dict[str, int], session_key: Optional[str]) -> HostConfig:
+        return hosts[next(self.counter) % len(hosts)]
+
+
+class LeastInFlightPolicy(SchedulingPolicy):
+
+    def __init__(self):
+        # rotate the starting point so ties do not always land on the first host
+        self.counter = itertools.count()
+
+    def choose(self, hosts: List[HostConfig], in_flight: Dict[str, int], session_key: Optional[str]) -> HostConfig:
+        offset = next(self.counter) % len(hosts)
+        rotated = hosts[offset:] + hosts[:offset]
+        return min(rotated, key=lambda host: in_flight[host_key(host)])
+
+
+class WeightedCapacityPolicy(SchedulingPolicy):
+    """Least loaded host relative to its capacity, a host with capacity 2 gets twice the tasks."""
+
+    def __init__(self):
+        self.counter = itertools.count()
+
+    def choose(self, hosts: List[HostConfig], in_flight: Dict[str, int], session_key: Optional[str]) -> HostConfig:
+        offset = next(self.counter) % len(hosts)
+        rotated = hosts[offset:] + hosts[:offset]
+        return min(rotated, key=lambda host: (in_flight[host_key(host)] + 1) / host_capacity(host))
+
+
+class StickySessionPolicy(SchedulingPolicy):
+    """All the tasks of a session run on the host picked for its first task."""
+
+    def __init__(self, fallback: Optional[SchedulingPolicy] = None):
+        self.fallback = fallback if fallback is not None else LeastInFlightPolicy()
+        self.assigned: Dict[str, str] = {}
+
+    def choose(self, hosts: List[HostConfig], in_flight: Dict[str, int], session_key: Optional[str]) -> HostConfig:
+        by_key = {host_key(host): host for host in hosts}
+        if session_key is not None and self.assigned.get(session_key) in by_key:
+            return by_key[self.assigned[session_key]]
+        host = self.fallback.choose(hosts, in_flight, session_key)
+        if session_key is not None:
+            self.assigned[session_key] = host_key(host)
+        return host
+
+    def release(self, session_key: str):
+        self.assigned.pop(session_key, None)
+
+
+POLICIES = {
+    "least_in_flight": LeastInFlightPolicy,
+    "round_robin": RoundRobinPolicy,
+    "weighted": WeightedCapacityPolicy,
+    "sticky": StickySessionPolicy,
+}
+
+
+class HostScheduler:
+
+    def __init__(self, hosts: Optional[List[HostConfig]], policy: Optional[SchedulingPolicy] = None):
+        self.hosts: List[HostConfig] = list(hosts or [])
+        self.policy = policy if policy is not None else LeastInFlightPolicy()
+        self.in_flight: Dict[str, int] = {host_key(host): 0 for host in self.hosts}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def with_policy(cls, hosts: Optional[List[HostConfig]], policy_name: str) -> "HostScheduler":
+        if policy_name not in POLICIES:
+            raise ValueError(f"Unknown host policy {policy_name}, expected one of {sorted(POLICIES)}")
+        return cls(hosts, POLICIES[policy_name]())
+
+    @contextmanager
+    def acquire(self, session_key: Optional[str] = None) -> Generator[Optional[HostConfig], None, None]:
+        """Pick a host for one task and count it as in flight until the block exits."""
+        if not self.hosts:
+            yield None
+            return
+
+        with self.lock:
+            host = self.policy.choose(self.hosts, self.in_flight, session_key)
+            self.in_flight[host_key(host)] += 1
+        LOGGER.debug("Scheduled on %s, in flight: %s", host_key(host), self.in_flight)
+        try:
+            yield host
+        finally:
+            with self.lock:
+                self.in_flight[host_key(host)] -= 1
+
+    def end_session(self, session_key: str):
+        with self.lock:
+            self.policy.release(session_key)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.in_flight)
@@ -13,7 +13,7 @@ class Task1(LstTask):
         # sleep for random time
         rtime = random.randint(5, 30)
         total_time = 0
-        while total_time < rtime:
+        while total_time < rtime and not self.stopping:
             time.sleep(2)
             total_time += 2
             LOGGER.info("Slept for %d secs of %d", total_time, rtime)
@@ -1,15 +1,20 @@
+import logging
+import time
 from abc import abstractmethod
+from datetime import datetime
 from functools import partial
 from threading import Thread
-from typing import Callable, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from apps.tpcc.tpcch_app import TPCHApp
 from apps.yugabyte.yugabyte_abstract_app import AbstractYugabyteApp
 from apps.yugaware.types import YWNodeDetailsSet
 from main.config import HostConfig
-from main.lstbench.models import TaskType
+from main.lstbench.models import QuerySample, TaskType
 from main.lstbench.runner import LstTask
 
+LOGGER = logging.getLogger(__name__)
+
 
 class TpchBaseTask(LstTask):
 
@@ -18,21 +23,35 @@ class TpchBaseTask(LstTask):
         self.app = tpch_app
         self.yb = yb
         self.thread = None
+        # raised by the target in the thread, re-raised by wait
+        self.error: Optional[BaseException] = None
 
     def run(self, run_on_host: HostConfig):
         node_details: List[YWNodeDetailsSet] = self.yw.get_universe_details().details.node_details
         target_hosts = [node.cloud_info.private_ip for node in node_details]
         target = self.get_runnable_target(run_on_host, target_hosts)
-        self.thread = Thread(target=target)
+        self.error = None
+        self.thread = Thread(target=self._run_target, args=(target,))
         self.thread.start()
 
+    def _run_target(self, target: Callable[[], None]):
+        try:
+            target()
+        except BaseException as exc:
+            self.error = exc
+
     @abstractmethod
     def get_runnable_target(self, run_on_host, target_hosts) -> Callable[[], None]:
         pass
 
-    def wait(self, timeout: Optional[float] = 0):
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the target is done, by default without a limit, and raise what the target raised."""
         if self.thread:
             self.thread.join(timeout)
+            if self.thread.is_alive():
+                raise TimeoutError(f"{type(self).__name__} still running after {timeout} secs")
+        if self.error is not None:
+            raise self.error
 
 
 class TpchAppLoadTask(TpchBaseTask):
@@ -49,15 +68,73 @@ class TpchAppLoadTask(TpchBaseTask):
                        )
 
 
+def count_rows(result: Any) -> Optional[int]:
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get("rows"), list):
+        return len(result["rows"])
+    return None
+
+
 class TpchAppSingleUserTask(TpchBaseTask):
+    """Runs the TPC-H queries one by one and streams a QuerySample per query to the runner.
 
-    def __init__(self, tpch_app: TPCHApp, yb: AbstractYugabyteApp):
+    The queries are sent one at a time through the client server of the app instead of the app's run_queries,
+    which runs the whole set in one call and gives no per query timing.
+    """
+
+    def __init__(self, tpch_app: TPCHApp, yb: AbstractYugabyteApp, database_name: str = "yb1",
+                 username: str = "yugabyte", password: str = "", ysql_port: int = 5433):
         super().__init__(TaskType.SINGLE_USER, tpch_app, yb)
+        self.database_name = database_name
+        self.ysql_port = ysql_port
+        self.username = username
+        self.password = password
 
     def get_runnable_target(self, run_on_host: HostConfig, target_hosts: List[str]) -> Callable[[], None]:
-        return partial(self.app.run_queries,
-                       database_name="yb1",
-                       target_host=target_hosts)
+        return partial(self.run_queries,
+                       run_on_host=run_on_host,
+                       target_hosts=target_hosts)
+
+    def run_queries(self, run_on_host: HostConfig, target_hosts: List[str]):
+        queries: Dict[str, str] = self.app.get_queries(run_on_host.private_ip, self.database_name)
+        failed = []
+        for seq, (query_name, query) in enumerate(queries.items()):
+            if self.stopping:
+                raise RuntimeError(f"Stopped after {seq} of {len(queries)} queries")
+            sample = self.run_query(seq, query_name, query, run_on_host, target_hosts)
+            # emitted as soon as the query finishes, nothing is held for the whole run
+            self.emit_sample(sample)
+            if sample.error_msg:
+                failed.append(query_name)
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(queries)} queries failed: {failed}")
+
+    def run_query(self, seq: int, query_name: str, query: str, run_on_host: HostConfig,
+                  target_hosts: List[str]) -> QuerySample:
+        start_time = datetime.utcnow()
+        rows_returned, error_msg = None, ""
+        start_ns = time.perf_counter_ns()
+        try:
+            result = self.app.client_server.execute(
+                queries=[query],
+                keyspace=self.database_name,
+                username=self.username,
+                password=self.password,
+                addresses=",".join(f"{host}:{self.ysql_port}" for host in target_hosts))
+            rows_returned = count_rows(result)
+        except Exception as exc:
+            LOGGER.error("Query %s failed: %s", query_name, exc)
+            error_msg = str(exc)
+        return QuerySample(
+            seq=seq,
+            query_name=query_name,
+            host=run_on_host.private_ip,
+            start_time=start_time,
+            duration_ns=time.perf_counter_ns() - start_ns,
+            rows_returned=rows_returned,
+            error_msg=error_msg
+        )
 
 
 class TpchAppDataMaintenceTask(TpchBaseTask):
@@ -0,0 +1,164 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Lazily expanded workload definitions.
+
+A workload definition is a dict with a ``name`` and ``phases``, every phase has a ``name`` and ``sessions`` and
+every session a ``name`` and ``tasks``. Phases, sessions and tasks can be any iterable, including generators,
+and the runner only pulls the next one when it gets to it. A task definition either holds a ready ``task``
+instance or describes how to build one when it is about to run:
+
+    {"task": Task1(TaskType.LOAD)}
+    {"factory": partial(Task1, TaskType.LOAD)}
+    {"class": "main.lstbench.tasks.example.Task1", "kwargs": {"task_type": "LOAD"}}
+
+Workloads can also be streamed from a JSONL file, see iter_jsonl_workload.
+"""
+
+import importlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from main.lstbench.models import TaskType
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _import(dotted_path: str):
+    module_name, _, attr = dotted_path.rpartition(".")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def build_task(task_def: Dict[str, Any]):
+    """Task instance of a task definition, built only now when it is given as a factory or class path."""
+    if "task" in task_def:
+        return task_def["task"]
+    if "factory" in task_def:
+        return task_def["factory"]()
+    if "class" in task_def:
+        kwargs = dict(task_def.get("kwargs", {}))
+        if isinstance(kwargs.get("task_type"), str):
+            kwargs["task_type"] = TaskType[kwargs["task_type"]]
+        return _import(task_def["class"])(**kwargs)
+    raise ValueError(f"Task definition needs one of task, factory or class: {task_def}")
+
+
+class _Lines:
+    """Iterator over the records of a JSONL file with one record of look ahead."""
+
+    def __init__(self, path: Path):
+        self.file = open(path, encoding="utf-8")
+        self.line_no = 0
+        self.head: Optional[Dict[str, Any]] = None
+        self.advance()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def advance(self):
+        self.head = None
+        if self.file.closed:
+            return
+        for line in self.file:
+            self.line_no += 1
+            if line.strip():
+                self.head = json.loads(line)
+                return
+        self.close()
+
+    def close(self):
+        self.head = None
+        self.file.close()
+
+
+class _Phases:
+    """Phases of a JSONL workload, ``close`` releases the file when the runner stops before the last one."""
+
+    def __init__(self, lines: _Lines, phases: Iterator[Dict[str, Any]]):
+        self.lines = lines
+        self.phases = phases
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.phases
+
+    def close(self):
+        self.phases.close()
+        self.lines.close()
+
+
+def close_workload(workload_definition: Dict[str, Any]):
+    """Release what the lazy phases of a definition hold open, e.g. the file of iter_jsonl_workload."""
+    phases = workload_definition.get("phases")
+    if hasattr(phases, "close"):
+        phases.close()
+
+
+def iter_jsonl_workload(path: Path) -> Dict[str, Any]:
+    """Workload definition streamed from a JSONL file.
+
+    The first line names the workload, every following line is one session of a phase. Consecutive lines with
+    the same phase belong to the same phase:
+
+        {"workload": "soak"}
+        {"phase": "load", "session": "load_yb1", "tasks": [{"class": "...", "kwargs": {...}}]}
+        {"phase": "queries", "session": "su_1", "tasks": [...]}
+
+    Only the line of the session being started is held in memory, the file is read as the runner goes and
+    closed at its end, or by close_workload when the run stops early.
+    """
+    lines = _Lines(path)
+    if lines.head is None or "workload" not in lines.head:
+        lines.close()
+        raise ValueError(f'{path}: first line must be like {{"workload": "<name>"}}')
+    name = lines.head["workload"]
+    lines.advance()
+
+    def sessions(phase_name: str) -> Iterator[Dict[str, Any]]:
+        while lines.head is not None and lines.head["phase"] == phase_name:
+            record = lines.head
+            lines.advance()
+            yield {"name": record["session"], "tasks": record.get("tasks", [])}
+
+    def phases() -> Iterator[Dict[str, Any]]:
+        while lines.head is not None:
+            phase_name = lines.head["phase"]
+            yield {"name": phase_name, "sessions": sessions(phase_name)}
+            # skip what is left of a phase the runner did not finish
+            while lines.head is not None and lines.head["phase"] == phase_name:
+                lines.advance()
+
+    return {"name": name, "phases": _Phases(lines, phases())}
+
+
+def load_hocon_workload(path: Path) -> Dict[str, Any]:
+    """Workload definition from a HOCON file, tasks are given as class paths and built when they run."""
+    from pyhocon import ConfigFactory  # only needed for HOCON workloads
+
+    config = ConfigFactory.parse_file(str(path))
+    definition = json.loads(json.dumps(config.as_plain_ordered_dict()))
+    LOGGER.info("Loaded workload %s from %s", definition["name"], path)
+    return definition
+
+
+def materialize_workload(workload_definition: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of the definition with every lazy phase, session and task list expanded."""
+    return dict(workload_definition, phases=[
+        dict(phase_def, sessions=[
+            dict(session_def, tasks=list(session_def["tasks"])) for session_def in phase_def["sessions"]
+        ])
+        for phase_def in workload_definition["phases"]
+    ])
@@ -0,0 +1,153 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Write-behind recording of lifecycle events.
+
+The handler turns every ``create/start/end`` call into a unit of statements. In write-behind mode the
+units are queued in memory and a background thread commits them in batches (group commit).
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Statement:
+
+    sql: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    # number of rows the statement must touch, not checked when None
+    expect_rows: Optional[int] = None
+
+
+@dataclass
+class WriteBehindConfig:
+
+    # submit blocks once this many units are waiting to be written, 0 for no limit
+    max_pending: int = 10000
+    # max units committed in one transaction
+    batch_size: int = 500
+    # how long the writer waits for more units before committing a partial batch
+    flush_interval_secs: float = 0.05
+
+
+class _Barrier:
+    """Marker put in the queue, set once everything queued before it is committed."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class WriteBehindWriter:
+    """Background writer that commits queued units of statements in batched transactions.
+
+    ``execute_batch`` receives a list of units (each a list of statements) and must apply all of them in
+    a single transaction, raising if any of them fails.
+    """
+
+    _STOP = object()
+
+    def __init__(self, execute_batch: Callable[[List[List[Statement]]], None],
+                 config: Optional[WriteBehindConfig] = None, name: str = "lstbench-writer"):
+        self.execute_batch = execute_batch
+        self.config = config if config is not None else WriteBehindConfig()
+        self._queue: queue.Queue = queue.Queue(maxsize=self.config.max_pending)
+        self._errors: List[Exception] = []
+        self._errors_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+        # flush whatever is pending when the interpreter exits, including after an unhandled exception
+        atexit.register(self.close)
+
+    def submit(self, unit: List[Statement]):
+        if self._closed:
+            raise RuntimeError("Write-behind writer is closed!")
+        self._queue.put(unit)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every unit submitted so far is committed, raise errors seen by the writer."""
+        if not self._closed:
+            barrier = _Barrier()
+            self._queue.put(barrier)
+            if not barrier.done.wait(timeout):
+                raise TimeoutError(f"Write-behind flush did not finish in {timeout} secs")
+        self._raise_errors()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._raise_errors()
+
+    def _raise_errors(self):
+        with self._errors_lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise RuntimeError(f"{len(errors)} write-behind unit(s) failed, first: {errors[0]}") from errors[0]
+
+    def _next_batch(self):
+        batch: List[List[Statement]] = []
+        barriers: List[_Barrier] = []
+        stop = False
+
+        item = self._queue.get()
+        while True:
+            if item is self._STOP:
+                stop = True
+                break
+            if isinstance(item, _Barrier):
+                barriers.append(item)
+                break
+            batch.append(item)
+            if len(batch) >= self.config.batch_size:
+                break
+            try:
+                item = self._queue.get(timeout=self.config.flush_interval_secs)
+            except queue.Empty:
+                break
+        return batch, barriers, stop
+
+    def _write(self, batch: List[List[Statement]]):
+        try:
+            self.execute_batch(batch)
+            return
+        except Exception as exc:
+            LOGGER.warning("Batch of %d unit(s) failed, retrying one by one: %s", len(batch), exc)
+
+        # isolate the failing unit(s) so the rest of the batch is not lost
+        for unit in batch:
+            try:
+                self.execute_batch([unit])
+            except Exception as exc:
+                LOGGER.error("Failed to write unit %s", unit, exc_info=True)
+                with self._errors_lock:
+                    self._errors.append(exc)
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            batch, barriers, stop = self._next_batch()
+            if batch:
+                self._write(batch)
+            for barrier in barriers:
+                barrier.done.set()
+        LOGGER.debug("Write-behind writer stopped")
@@ -1,16 +1,26 @@
-import logging
 import json
+import logging
 import sys
 import os
 from pathlib import Path
 from typing import Any, Dict, List
 
-import requests
 import utils
 from main.config import Config
-from main.report import Report
+from main.reportplus.client import ReportPlus
+from main.reportplus.crawler import AttachmentCrawler
+from main.reportplus.deleter import BatchDeleter, DeleteConfig
+from main.reportplus.filters import (
+    filter_attachments,
+    leaf,
+    name_contains,
+    older_than,
+)
+from main.reportplus.metadata_cache import MetadataCache
+from main.reportplus.uploads import POINTER_SUFFIX, ContentIndex
 from pyhocon import ConfigFactory
 import datetime
+import time
 
 LOGGER = logging.getLogger()
 
@@ -60,77 +70,6 @@ def init_logger(log_level: int = logging.DEBUG):
     logging.getLogger().addHandler(fh)
 
 
-class ReportPlus(Report):
-
-    def get_tests(self, suite_name: str) -> List[Dict[str, Any]]:
-        start_time = datetime.datetime.now() - datetime.timedelta(days=100)
-        payload = {
-            "start": start_time.timestamp(),
-            "end": datetime.datetime.now().timestamp(),
-            "filters": [{"key": "suite_name", "value": suite_name}],
-        }
-        resp = requests.post(f"{self.url}/back/get_tests", json=payload, timeout=300)
-        res = []
-        if resp.status_code == 200:
-            res = resp.json()["tests"]
-        else:
-            raise RuntimeError(
-                "Resp status code: %s, %s", str(resp.status_code), resp.text
-            )
-        return res
-
-    def get_attachments(self, test_info: Dict[str, Any]) -> List[Dict[str, Any]]:
-        payload = {"test_id": test_info.get("test_id")}
-        LOGGER.debug("Payload is %s", str(payload))
-        resp = requests.post(
-            f"{self.url}/back/get_attachments", json=payload, timeout=300
-        )
-        res = []
-        if resp.status_code == 200:
-            res = resp.json()["attachments"]
-        else:
-            raise RuntimeError(
-                "Resp status code: %s, %s", str(resp.status_code), resp.text
-            )
-        return res
-
-    def delete_attachment(self, attachment_info: Dict[str, Any]):
-        payload = {"attachments": [attachment_info]}
-        LOGGER.debug("Payload is %s", str(payload))
-        resp = requests.post(
-            f"{self.url}/back/delete_attachments", json=payload, timeout=300
-        )
-        res = {}
-        if resp.status_code == 200:
-            LOGGER.info(f"attachment deleted: {attachment_info['attachment_id']}")
-            res = resp.json()
-        else:
-            raise RuntimeError(
-                "Resp status code: %s, %s", str(resp.status_code), resp.text
-            )
-        return res
-
-
-def filter_attachment_by_name(
-    attachment_info_list: List[Dict[str, Any]], name
-) -> List[Dict[str, Any]]:
-    flattened_list = []
-    for attachment_info in attachment_info_list:
-        if name in attachment_info["name"]:
-            if len(attachment_info.get("children", [])) == 0:
-                flattened_list.append(attachment_info)
-            else:
-                LOGGER.info(
-                    "Found tpch_data.gz with child nodes!: %s",
-                    json.dumps(attachment_info),
-                )
-        else:
-            flattened_list.extend(
-                filter_attachment_by_name(attachment_info.get("children", []), name)
-            )
-    return flattened_list
-
-
 if __name__ == "__main__":
 
     init_logger()
@@ -140,37 +79,67 @@ if __name__ == "__main__":
     hakon_config = ConfigFactory.parse_file(config_path)
     raw_config = utils.dict_merge({}, utils.dict_through(hakon_config))
     config = Config(raw_config=raw_config)
-    report = ReportPlus(config)
+    # later runs only fetch tests newer than the last sync
+    metadata_cache = MetadataCache(Path(root_dir(), "logs", "report_metadata.db"))
+    report = ReportPlus(config, metadata_cache=metadata_cache)
 
     # get all tests
     tests = report.get_tests(suite_name="ParallelQuerySuite")
 
-    all_attachments: List[Dict[str, Any]] = []
-    total_tests = len(tests)
-    for index, test_info in enumerate(tests):
-        LOGGER.info(f"Fetching attachments: {index} of {total_tests}")
-        attachment_info = report.get_attachments(test_info=test_info)
-        all_attachments.extend(attachment_info)
-
-    attachments_to_prune = filter_attachment_by_name(
-        all_attachments, name="tpch_data.gz"
+    # attachments are filtered as the responses of the parallel crawl arrive
+    LOGGER.info(f"Fetching attachments of {len(tests)} tests")
+    crawler = AttachmentCrawler(report, max_workers=16)
+    # tpch_data.gz files older than 2 weeks, picked in the same pass
+    retention = datetime.timedelta(weeks=2)
+    old_dumps = (
+        name_contains("tpch_data.gz")
+        & ~name_contains(POINTER_SUFFIX)
+        & leaf()
+        & older_than(retention)
     )
-
-    # filter attachments older than 2 weeks
-    attachments_to_prune_2_weeks = []
-    two_weeks_before = datetime.datetime.now() - datetime.timedelta(weeks=2)
-    for att in attachments_to_prune:
-        d1 = datetime.datetime.fromtimestamp(att["time"])
-        if d1 < two_weeks_before:
-            attachments_to_prune_2_weeks.append(att)
-
-    # delete the attachment
-    start_index = 1
-    index = start_index
-    while index < len(attachments_to_prune_2_weeks):
-        LOGGER.info(
-            f"Delete attachment: {index} of {len(attachments_to_prune_2_weeks)}"
+    candidates = []
+    for test_info, attachment_info in crawler.crawl(tests):
+        matches = list(
+            filter_attachments(
+                [attachment_info],
+                old_dumps,
+                prune=name_contains("tpch_data.gz"),
+                on_prune=lambda node: LOGGER.info(
+                    "Found tpch_data.gz with child nodes!: %s", json.dumps(node)
+                ),
+            )
+        )
+        candidates.extend((test_info["test_id"], match) for match in matches)
+    if crawler.progress.failed_test_ids:
+        LOGGER.warning(
+            "Could not fetch attachments of tests: %s", crawler.progress.failed_test_ids
         )
-        report.delete_attachment(attachments_to_prune_2_weeks[index])
-        start_index = index
-        index += 1
+
+    # content that links of tests within the retention still point to is kept
+    content_index = ContentIndex(Path(root_dir(), "logs", "attachment_content.db"))
+    referenced = content_index.referenced(
+        [(test_id, match["name"]) for test_id, match in candidates],
+        since=time.time() - retention.total_seconds(),
+    )
+    if referenced:
+        LOGGER.info("Keeping %d linked attachments: %s", len(referenced), referenced)
+    candidates = [
+        (test_id, match)
+        for test_id, match in candidates
+        if (test_id, match["name"]) not in referenced
+    ]
+    attachments_to_prune: List[Dict[str, Any]] = [match for _, match in candidates]
+    tests_to_prune = sorted({test_id for test_id, _ in candidates})
+    pruned_names = [(test_id, match["name"]) for test_id, match in candidates]
+
+    # delete the attachments in batches, pass --dry-run to only count them
+    deleter = BatchDeleter(report, DeleteConfig(dry_run="--dry-run" in sys.argv))
+    result = deleter.delete(attachments_to_prune)
+    LOGGER.info("Pruned attachments: %s", result)
+    if not result.dry_run:
+        # the attachment trees of these tests changed on the server
+        metadata_cache.invalidate(test_ids=tests_to_prune)
+        # uploads must not link to the pruned contents any more
+        content_index.forget(pruned_names)
+    content_index.close()
+    metadata_cache.close()
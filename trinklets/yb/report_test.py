@@ -7,6 +7,10 @@ from pyhocon import ConfigFactory
 import utils
 from main.config import Config
 from main.report import Report, ResultsType
+from main.reportplus.client import ReportClient
+from main.reportplus.download import Downloader
+from main.reportplus.log_index import LogIndex
+from main.reportplus.uploads import ContentIndex, DedupUploader
 
 if __name__ == '__main__':
 
@@ -19,8 +23,9 @@ if __name__ == '__main__':
     reporter.logger = logging.getLogger()
     reporter.add_results(name="Just checking", data="some error", result_type=ResultsType.EXCEPTION)
 
-    # attaching
-    reporter.add_local_attachment_file(
+    # attaching, content uploaded before is attached as a <name>.link.json pointer to it instead of sent again
+    uploader = DedupUploader(reporter, ContentIndex(Path("/Users/arastogi/code/attachment_content.db")))
+    uploader.add_local_attachment_file(
         "Framework logs/reports/example.html",
         Path("/Users/arastogi/code/yb-stress-test/src/example.html")
     )
@@ -31,13 +36,11 @@ if __name__ == '__main__':
     resp = requests.post(f"{reporter.url}/back/get_attachments", json=payload, timeout=120)
     details = resp.json()
 
-    # use file server to download attachments
-    params = {
-        "name": "31a333d9-4f58-457d-85c1-4dca947f940a-client-server-a10983.log"
-    }
-    resp = requests.get(url=f"{reporter.url}/files/get", params=params, timeout=120)
-    with open("/Users/arastogi/code/test.log", "wb") as fp:
-        fp.write(resp.content)
+    # use file server to download attachments, streamed to disk in chunks
+    downloader = Downloader(ReportClient(reporter.url))
+    downloader.download([
+        ("31a333d9-4f58-457d-85c1-4dca947f940a-client-server-a10983.log", Path("/Users/arastogi/code/test.log"))
+    ])
 
     # find all tests in report
     resp = requests.post(url=f"{reporter.url}/back/get_reports", timeout=120)
@@ -249,6 +252,14 @@ if __name__ == '__main__':
     # dict_keys(['test_id', 'config', 'start_time', 'end_time', 'status'])
 
     # download all artifacts and Ingest all log records in sqlite3 db
+    test_info = resp.json()["test_info"]
+    artifacts_dir = Path("/Users/arastogi/code/artifacts").joinpath(test_info["test_id"])
+    downloader.download_test(test_info, artifacts_dir)
+    log_index = LogIndex(Path("/Users/arastogi/code/logs.db"))
+    log_index.ingest_dir(test_info["test_id"], artifacts_dir, base_time=test_info["start_time"])
+    # all errors of the test in its first hour
+    errors = log_index.query(test_info["test_id"], levels=["ERROR"], start=test_info["start_time"],
+                             end=test_info["start_time"] + 3600)
     # Run queries and publish results
 
     # get report pages
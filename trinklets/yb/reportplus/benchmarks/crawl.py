@@ -0,0 +1,76 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Attachment crawl against the local stand-in, one bare request per test versus the pooled parallel crawler.
+
+Run with ``python -m main.reportplus.benchmarks.crawl --tests 300 --latency-secs 0.02``.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+import requests
+
+from main.reportplus.client import ReportClient, RetryPolicy
+from main.reportplus.crawler import AttachmentCrawler
+from main.reportplus.standin import StandInServer, StandInState
+
+
+def crawl_sequential(url: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    tests = requests.post(f"{url}/back/get_tests", json={}, timeout=300).json()["tests"]
+    attachments = 0
+    for test_info in tests:
+        resp = requests.post(f"{url}/back/get_attachments", json={"test_id": test_info["test_id"]}, timeout=300)
+        attachments += len(resp.json()["attachments"])
+    return {"tests": len(tests), "attachments": attachments, "elapsed_secs": round(time.perf_counter() - start, 4)}
+
+
+def crawl_parallel(url: str, workers: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    client = ReportClient(url, pool_size=workers, retry=RetryPolicy(backoff_secs=0.05))
+    crawler = AttachmentCrawler(client, max_workers=workers)
+    attachments = sum(len(tree) for _, tree in crawler.crawl(client.post("get_tests", {})["tests"]))
+    client.close()
+    return {
+        "tests": crawler.progress.tests_done,
+        "attachments": attachments,
+        "failed": len(crawler.progress.failed_test_ids),
+        "elapsed_secs": round(time.perf_counter() - start, 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tests", type=int, default=300)
+    parser.add_argument("--latency-secs", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    with StandInServer(StandInState(tests=args.tests, latency_secs=args.latency_secs)) as server:
+        before = crawl_sequential(server.url)
+        # only the crawler retries, inject failures for its run only
+        server.state.failure_rate = args.failure_rate
+        after = crawl_parallel(server.url, args.workers)
+
+    print(json.dumps({
+        "before": before,
+        "after": after,
+        "speedup": round(before["elapsed_secs"] / after["elapsed_secs"], 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Attachment tree filtering on synthetic trees, the recursive filter plus a second age pass versus the single
+pass filter engine.
+
+Run with ``python -m main.reportplus.benchmarks.filters --nodes 2000000``.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from main.reportplus.filters import filter_attachments, leaf, name_contains, older_than
+
+NOW = 1_700_000_000.0
+
+
+def synthetic_trees(nodes: int, fanout: int = 8, depth: int = 6, seed: int = 0) -> Iterator[List[Dict[str, Any]]]:
+    """One attachment tree per test until about ``nodes`` nodes."""
+    rnd = random.Random(seed)
+    names = ["app_debug.log", "tpch_data.gz", "schema.sql", "client-server.log", "example.html"]
+    made = 0
+
+    def node(level: int) -> Dict[str, Any]:
+        nonlocal made
+        made += 1
+        children = [node(level + 1) for _ in range(rnd.randint(0, fanout))] if level < depth else []
+        return {"attachment_id": str(made), "name": rnd.choice(names), "time": NOW - rnd.uniform(0, 60) * 86400,
+                "size": rnd.randint(0, 1 << 30), "children": children}
+
+    while made < nodes:
+        yield [node(1) for _ in range(4)]
+
+
+def deep_tree() -> List[Dict[str, Any]]:
+    """A chain twice as deep as the recursion limit with one match at the bottom."""
+    chain: Dict[str, Any] = {"attachment_id": "deep", "name": "tpch_data.gz", "time": 0, "size": 1, "children": []}
+    for level in range(sys.getrecursionlimit() * 2):
+        chain = {"attachment_id": f"d{level}", "name": "dir", "time": 0, "size": 0, "children": [chain]}
+    return [chain]
+
+
+def legacy_filter(attachment_info_list: List[Dict[str, Any]], name: str) -> List[Dict[str, Any]]:
+    flattened_list = []
+    for attachment_info in attachment_info_list:
+        if name in attachment_info["name"]:
+            if len(attachment_info.get("children", [])) == 0:
+                flattened_list.append(attachment_info)
+        else:
+            flattened_list.extend(legacy_filter(attachment_info.get("children", []), name))
+    return flattened_list
+
+
+def legacy(trees: Iterable[List[Dict[str, Any]]]) -> int:
+    all_attachments = [attachment for tree in trees for attachment in tree]
+    matches = legacy_filter(all_attachments, "tpch_data.gz")
+    cutoff = NOW - timedelta(weeks=2).total_seconds()
+    return len([attachment for attachment in matches if attachment["time"] < cutoff])
+
+
+def engine(trees: Iterable[List[Dict[str, Any]]]) -> int:
+    predicate = name_contains("tpch_data.gz") & leaf() & older_than(timedelta(weeks=2), now=NOW)
+    return sum(1 for _ in filter_attachments(trees, predicate, prune=name_contains("tpch_data.gz")))
+
+
+def timed(run: Callable[[Iterable[List[Dict[str, Any]]]], int], trees: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    matches = run(trees)
+    elapsed = time.perf_counter() - start
+    return {"matches": matches, "elapsed_secs": round(elapsed, 3)}
+
+
+def peak_mb(run: Callable[[Iterable[List[Dict[str, Any]]]], int], nodes: int) -> float:
+    """Peak memory of the run fed by a generator, i.e. what it holds on top of the input stream."""
+    tracemalloc.start()
+    run(synthetic_trees(nodes))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1e6, 1)
+
+
+def deep_tree_result(run: Callable[[Iterable[List[Dict[str, Any]]]], int]) -> Any:
+    try:
+        return run([deep_tree()])
+    except RecursionError:
+        return "RecursionError"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=2_000_000)
+    parser.add_argument("--memory", action="store_true", help="also trace peak memory, slow")
+    args = parser.parse_args()
+
+    trees = list(synthetic_trees(args.nodes))
+    before, after = timed(legacy, trees), timed(engine, trees)
+    before["deep_tree"], after["deep_tree"] = deep_tree_result(legacy), deep_tree_result(engine)
+    if args.memory:
+        before["peak_mb"], after["peak_mb"] = peak_mb(legacy, args.nodes), peak_mb(engine, args.nodes)
+
+    print(json.dumps({
+        "nodes": args.nodes,
+        "before": before,
+        "after": after,
+        "speedup": round(before["elapsed_secs"] / after["elapsed_secs"], 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
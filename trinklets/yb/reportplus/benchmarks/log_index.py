@@ -0,0 +1,96 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Log indexing on synthetic client-server and framework logs: ingest rate and the latency of level and time
+range queries.
+
+Run with ``python -m main.reportplus.benchmarks.log_index --lines 2000000 --tests 4``.
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from main.reportplus.log_index import LogIndex
+
+START = 1_729_080_000.0
+
+
+def write_logs(directory: Path, lines: int, seed: int = 0) -> List[Path]:
+    """A glog client-server log with 1% errors and some multi-line records, plus a smaller framework log."""
+    rnd = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    server, framework = directory / "client-server.log", directory / "app.log"
+    with open(server, "w") as fp:
+        for line in range(lines):
+            ts = time.gmtime(START + line * 0.01)
+            level = "E" if rnd.random() < 0.01 else rnd.choice("IIIIW")
+            fp.write(f"{level}{ts.tm_mon:02d}{ts.tm_mday:02d} {ts.tm_hour:02d}:{ts.tm_min:02d}:{ts.tm_sec:02d}."
+                     f"{line % 100:02d}0000 {1000 + line % 7} tablet_service.cc:{rnd.randint(1, 900)}] "
+                     f"T {rnd.getrandbits(32):08x} read of tablet {rnd.getrandbits(32):08x} took {rnd.random():.3f}s\n")
+            if level == "E" and rnd.random() < 0.2:
+                fp.write("    @ 0x7f00 yb::tserver::TabletServiceImpl::Read()\n")
+    with open(framework, "w") as fp:
+        for line in range(lines // 10):
+            ts = time.gmtime(START + line * 0.1)
+            fp.write(f"[{ts.tm_hour:02d}:{ts.tm_min:02d}:{ts.tm_sec:02d}] {{/src/main/lstbench/runner.py:{line % 300}}} "
+                     f"{rnd.choice(['INFO', 'INFO', 'DEBUG', 'ERROR'])} - step {line} done\n")
+    return [server, framework]
+
+
+def timed_query(index: LogIndex, repeat: int = 20, **kwargs) -> Dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = index.query(**kwargs)
+    return {"rows": len(rows), "ms": round((time.perf_counter() - start) / repeat * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=2_000_000, help="client-server log lines per test")
+    parser.add_argument("--tests", type=int, default=4)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="log_index"))
+    index = LogIndex(work_dir / "logs.db")
+    files = write_logs(work_dir / "logs", args.lines)
+    size = sum(path.stat().st_size for path in files)
+
+    start = time.perf_counter()
+    records = 0
+    for test in range(args.tests):
+        for path in files:
+            # the same files for every test, the index does not dedupe across tests
+            records += index.ingest_file(f"test-{test}", path, base_time=START).records
+    ingest_secs = time.perf_counter() - start
+
+    window = (START + 600, START + 1200)
+    print(json.dumps({
+        "records": records,
+        "ingest_secs": round(ingest_secs, 2),
+        "records_per_sec": round(records / ingest_secs),
+        "mb_per_sec": round(size * args.tests / ingest_secs / 1e6, 1),
+        "db_mb": round((work_dir / "logs.db").stat().st_size / 1e6, 1),
+        "errors_in_window": timed_query(index, test_id="test-1", levels=["ERROR"], start=window[0], end=window[1]),
+        "all_errors": timed_query(index, repeat=3, test_id="test-1", levels=["ERROR"]),
+        "text_in_window": timed_query(index, test_id="test-1", text="TabletServiceImpl", start=window[0],
+                                      end=window[1]),
+    }, indent=2))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Clients for the /back/* and /files/get endpoints of the report server.
+
+Every request goes through one keep-alive ``requests.Session`` per client, its connection pool is sized for
+the parallel crawls and deletes. Requests failing with a 5xx, a 429 or a connection error are retried with
+exponential backoff, a request the client gives up on raises RequestFailed.
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from main.config import Config
+from main.report import Report
+from main.reportplus.metadata_cache import MetadataCache
+from main.reportplus.response_cache import ResponseCache
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RequestFailed(RuntimeError):
+    """Request the client gave up on, ``status_code`` is None when no response came back."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class RetryPolicy:
+
+    attempts: int = 5
+    backoff_secs: float = 0.5
+    max_backoff_secs: float = 30.0
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def backoff(self, attempt: int) -> float:
+        # full jitter, parallel workers hitting the same failure do not retry in lock step
+        return random.uniform(0, min(self.max_backoff_secs, self.backoff_secs * 2 ** attempt))
+
+    def retryable(self, exc: BaseException) -> bool:
+        """Whether the failure may go away when tried again: no response, or a status in ``retry_statuses``."""
+        if isinstance(exc, RequestFailed):
+            return exc.status_code is None or exc.status_code in self.retry_statuses
+        return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+class ReportClient:
+    """Pooled client of the report server endpoints, usable without a config (e.g. against the stand-in)."""
+
+    def __init__(self, url: str, pool_size: int = 16, timeout_secs: float = 300,
+                 retry: Optional[RetryPolicy] = None, metadata_cache: Optional[MetadataCache] = None,
+                 response_cache: Optional[ResponseCache] = None):
+        self.url = url
+        self.timeout_secs = timeout_secs
+        self.retry = retry if retry is not None else RetryPolicy()
+        # serves get_tests and get_attachments from a local copy when set
+        self.metadata_cache = metadata_cache
+        # memoizes the read endpoints that have a TTL in the cache
+        self.response_cache = response_cache
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+    def close(self):
+        self.http.close()
+
+    def post(self, endpoint: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """POST to ``/back/<endpoint>`` and return the json response, retrying transient failures."""
+        cached = self.response_cache is not None and self.response_cache.cacheable(endpoint)
+        if cached:
+            response = self.response_cache.get(endpoint, payload)
+            if response is not None:
+                return response
+        response = self._post(endpoint, payload)
+        if cached:
+            self.response_cache.put(endpoint, payload, response)
+        return response
+
+    def _post(self, endpoint: str, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        url = f"{self.url}/back/{endpoint}"
+        for attempt in range(self.retry.attempts):
+            last_attempt = attempt == self.retry.attempts - 1
+            try:
+                resp = self.http.post(url, json=payload, timeout=self.timeout_secs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if last_attempt:
+                    raise RequestFailed(f"{endpoint} failed after {self.retry.attempts} attempts: {exc}") from exc
+                LOGGER.warning("%s failed, retrying: %s", endpoint, exc)
+            else:
+                if resp.status_code == 200:
+                    return resp.json()
+                if resp.status_code not in self.retry.retry_statuses or last_attempt:
+                    raise RequestFailed(f"Resp status code: {resp.status_code}, {resp.text}", resp.status_code)
+                LOGGER.warning("%s returned %s, retrying", endpoint, resp.status_code)
+            time.sleep(self.retry.backoff(attempt))
+        raise RuntimeError(f"{endpoint} failed, no attempts configured")
+
+    def get_tests(self, suite_name: str, days: int = 100) -> List[Dict[str, Any]]:
+        start = (datetime.now() - timedelta(days=days)).timestamp()
+        end = datetime.now().timestamp()
+        if self.metadata_cache is not None:
+            return self.metadata_cache.get_tests(suite_name, start, end, partial(self._fetch_tests, suite_name))
+        return self._fetch_tests(suite_name, start, end)
+
+    def _fetch_tests(self, suite_name: str, start: float, end: float) -> List[Dict[str, Any]]:
+        payload = {
+            "start": start,
+            "end": end,
+            "filters": [{"key": "suite_name", "value": suite_name}],
+        }
+        return self.post("get_tests", payload)["tests"]
+
+    def get_attachments(self, test_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.metadata_cache is not None:
+            return self.metadata_cache.get_attachments(
+                test_info["test_id"], partial(self._fetch_attachments, test_info))
+        return self._fetch_attachments(test_info)
+
+    def _fetch_attachments(self, test_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        payload = {"test_id": test_info.get("test_id")}
+        LOGGER.debug("Payload is %s", str(payload))
+        return self.post("get_attachments", payload)["attachments"]
+
+    def get_reports(self) -> List[Dict[str, Any]]:
+        return self.post("get_reports")["reports"]
+
+    def get_report_pages(self, name: str) -> Dict[str, Dict[str, Any]]:
+        return self.post("get_report_pages", {"name": name})["pages"]
+
+    def get_report_tests(self, name: str, page: str) -> List[Dict[str, Any]]:
+        return self.post("get_report_tests", {"name": name, "page": page})["tests"]
+
+    def get_test_info(self, test_id: str) -> Dict[str, Any]:
+        return self.post("get_test_info", {"test_id": test_id})["test_info"]
+
+    def get_test_results(self, test_id: str) -> List[Dict[str, Any]]:
+        return self.post("get_test_results", {"test_id": test_id})["results"]
+
+    def get_file(self, name: str, start: int = 0, end: Optional[int] = None) -> requests.Response:
+        """Streaming GET of ``/files/get``, from byte ``start`` to ``end`` (inclusive) when a range is given.
+
+        Opening the response is retried like the POSTs, reading and closing it is up to the caller. The status
+        is 206 when the server honoured the range, 200 when it sends the whole file and 416 for a range past the
+        end of the file.
+        """
+        headers = {"Range": f"bytes={start}-{'' if end is None else end}"} if start or end is not None else {}
+        for attempt in range(self.retry.attempts):
+            last_attempt = attempt == self.retry.attempts - 1
+            try:
+                resp = self.http.get(f"{self.url}/files/get", params={"name": name}, headers=headers,
+                                     stream=True, timeout=self.timeout_secs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if last_attempt:
+                    raise RequestFailed(f"{name} failed after {self.retry.attempts} attempts: {exc}") from exc
+                LOGGER.warning("Download of %s failed, retrying: %s", name, exc)
+            else:
+                if resp.status_code in (200, 206, 416):
+                    return resp
+                resp.close()
+                if resp.status_code not in self.retry.retry_statuses or last_attempt:
+                    raise RequestFailed(f"Resp status code: {resp.status_code} for file {name}", resp.status_code)
+                LOGGER.warning("Download of %s returned %s, retrying", name, resp.status_code)
+            time.sleep(self.retry.backoff(attempt))
+        raise RuntimeError(f"{name} failed, no attempts configured")
+
+    def delete_attachment(self, attachment_info: Dict[str, Any]) -> Dict[str, Any]:
+        res = self.delete_attachments([attachment_info])
+        LOGGER.info("attachment deleted: %s", attachment_info["attachment_id"])
+        return res
+
+    def delete_attachments(self, attachments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Delete many attachments in one request, see reportplus.deleter for batching."""
+        payload = {"attachments": attachments}
+        LOGGER.debug("Deleting %d attachment(s)", len(attachments))
+        return self.post("delete_attachments", payload)
+
+
+class ReportPlus(Report, ReportClient):
+    """Report with the pooled client for reading tests and attachments and deleting attachments."""
+
+    def __init__(self, config: Config, pool_size: int = 16, timeout_secs: float = 300,
+                 retry: Optional[RetryPolicy] = None, metadata_cache: Optional[MetadataCache] = None,
+                 response_cache: Optional[ResponseCache] = None):
+        Report.__init__(self, config)
+        ReportClient.__init__(self, self.url, pool_size=pool_size, timeout_secs=timeout_secs, retry=retry,
+                              metadata_cache=metadata_cache, response_cache=response_cache)
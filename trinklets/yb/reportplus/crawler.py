@@ -0,0 +1,98 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Parallel crawl of attachment metadata.
+
+Up to ``max_workers`` tests are fetched at once over the pooled session of the client, results are yielded
+as they arrive so filtering starts with the first response instead of after the whole crawl.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from main.reportplus.client import ReportClient
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class CrawlProgress:
+
+    started: float = field(default_factory=time.monotonic)
+    tests_done: int = 0
+    attachments: int = 0
+    failed_test_ids: List[str] = field(default_factory=list)
+
+    @property
+    def tests_per_sec(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.tests_done / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.tests_done} tests, {self.attachments} attachments, {len(self.failed_test_ids)} failed, "
+                f"{self.tests_per_sec:.1f} tests/sec")
+
+
+class AttachmentCrawler:
+
+    def __init__(self, report: ReportClient, max_workers: int = 8, progress_every_secs: float = 10.0):
+        self.report = report
+        self.max_workers = max_workers
+        self.progress_every_secs = progress_every_secs
+        self.progress = CrawlProgress()
+        self._last_report = time.monotonic()
+
+    def crawl(self, tests: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Yield ``(test_info, attachments)`` in completion order.
+
+        A test still failing after the retries of the client is logged and listed in
+        ``progress.failed_test_ids``, the crawl goes on with the other tests.
+        """
+        self.progress = CrawlProgress()
+        self._last_report = time.monotonic()
+        running: Set[Future] = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crawl") as pool:
+            for test_info in tests:
+                # the test list may be a generator too, keep a bounded number of requests queued
+                while len(running) >= self.max_workers * 2:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    yield from self._collect(finished)
+                running.add(pool.submit(self._fetch, test_info))
+            while running:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                yield from self._collect(finished)
+        LOGGER.info("Crawl finished: %s", self.progress)
+
+    def _fetch(self, test_info: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]:
+        try:
+            return test_info, self.report.get_attachments(test_info)
+        except Exception:
+            LOGGER.error("Failed to fetch attachments of test %s", test_info.get("test_id"), exc_info=True)
+            return test_info, None
+
+    def _collect(self, finished: Set[Future]) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        for future in finished:
+            test_info, attachments = future.result()
+            if attachments is None:
+                self.progress.failed_test_ids.append(test_info.get("test_id"))
+            else:
+                self.progress.tests_done += 1
+                self.progress.attachments += len(attachments)
+            # logged as results come in, including while the last requests drain
+            if time.monotonic() - self._last_report >= self.progress_every_secs:
+                LOGGER.info("Crawl progress: %s", self.progress)
+                self._last_report = time.monotonic()
+            if attachments is not None:
+                yield test_info, attachments
@@ -0,0 +1,157 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Batched deletion of attachments with the list form of /back/delete_attachments.
+
+Attachments are sent ``batch_size`` at a time with up to ``max_in_flight`` batches running at once. When a
+batch fails only its failed items are retried: the ids listed under ``failed`` in the response if the server
+reports them, else, when the server rejected the request with a 4xx that one bad item may cause, the batch is
+split in halves until the failing attachments are isolated. A request failing as a whole with what the
+client's RetryPolicy deems retryable (no response, 5xx, 429) is sent again as it is, at most
+``batch_attempts`` times, and then the batch fails; splitting it would only multiply the load on a server
+that is failing already.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from main.reportplus.client import ReportClient, RequestFailed
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class DeleteConfig:
+
+    batch_size: int = 100
+    max_in_flight: int = 4
+    # attempts of a failing item on its own, on top of the retries of the client
+    item_attempts: int = 2
+    # attempts of a whole batch failing with a retryable error, on top of the retries of the client
+    batch_attempts: int = 2
+    # only count what would be deleted
+    dry_run: bool = False
+
+
+@dataclass
+class DeleteResult:
+
+    dry_run: bool = False
+    requested: int = 0
+    deleted: int = 0
+    # bytes of the deleted attachments, from their size when the server reports it
+    reclaimed_bytes: int = 0
+    batches: int = 0
+    failed: List[Dict[str, Any]] = field(default_factory=list)
+
+    def __str__(self):
+        verb = "would delete" if self.dry_run else "deleted"
+        return (f"{verb} {self.deleted} of {self.requested} attachment(s) in {self.batches} batch(es), "
+                f"{self.reclaimed_bytes / 2 ** 30:.2f} GiB, {len(self.failed)} failed")
+
+
+def _batches(attachments: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for attachment in attachments:
+        batch.append(attachment)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BatchDeleter:
+
+    def __init__(self, client: ReportClient, config: Optional[DeleteConfig] = None):
+        self.client = client
+        self.config = config if config is not None else DeleteConfig()
+
+    def delete(self, attachments: Iterable[Dict[str, Any]]) -> DeleteResult:
+        result = DeleteResult(dry_run=self.config.dry_run)
+        running: Set[Future] = set()
+
+        def collect(finished: Set[Future]):
+            for future in finished:
+                deleted, failed = future.result()
+                result.deleted += len(deleted)
+                result.reclaimed_bytes += sum(attachment.get("size") or 0 for attachment in deleted)
+                result.failed.extend(failed)
+
+        with ThreadPoolExecutor(max_workers=self.config.max_in_flight, thread_name_prefix="delete") as pool:
+            for batch in _batches(attachments, self.config.batch_size):
+                result.requested += len(batch)
+                result.batches += 1
+                if self.config.dry_run:
+                    result.deleted += len(batch)
+                    result.reclaimed_bytes += sum(attachment.get("size") or 0 for attachment in batch)
+                    continue
+                while len(running) >= self.config.max_in_flight:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                running.add(pool.submit(self._delete_batch, batch))
+            finished, _ = wait(running)
+            collect(finished)
+
+        LOGGER.info("Attachments: %s", result)
+        for attachment in result.failed:
+            LOGGER.error("Could not delete attachment %s", attachment.get("attachment_id"))
+        return result
+
+    def _delete_batch(self, batch: List[Dict[str, Any]], attempt: int = 0):
+        """Delete the batch, returns the deleted and the failed attachments."""
+        try:
+            resp = self._send(batch)
+        except RequestFailed as exc:
+            if self.client.retry.retryable(exc) or not 400 <= (exc.status_code or 0) < 500:
+                return [], batch
+            if len(batch) == 1:
+                LOGGER.warning("Deleting %s failed: %s", batch[0].get("attachment_id"), exc)
+                return [], batch
+            # may be caused by a single bad item
+            LOGGER.warning("Batch of %d rejected, splitting it: %s", len(batch), exc)
+            middle = len(batch) // 2
+            deleted, failed = self._delete_batch(batch[:middle], attempt)
+            more_deleted, more_failed = self._delete_batch(batch[middle:], attempt)
+            return deleted + more_deleted, failed + more_failed
+        except Exception as exc:
+            LOGGER.warning("Batch of %d failed: %s", len(batch), exc)
+            return [], batch
+
+        failed_ids = set(resp.get("failed") or [])
+        if not failed_ids:
+            return batch, []
+        deleted = [attachment for attachment in batch if attachment["attachment_id"] not in failed_ids]
+        failed = [attachment for attachment in batch if attachment["attachment_id"] in failed_ids]
+        if attempt + 1 >= self.config.item_attempts:
+            return deleted, failed
+        LOGGER.warning("%d of %d attachment(s) not deleted, retrying them", len(failed), len(batch))
+        retried, failed = self._delete_batch(failed, attempt + 1)
+        return deleted + retried, failed
+
+    def _send(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One request for the batch, sent again while it fails as a whole with a retryable error."""
+        for attempt in range(self.config.batch_attempts):
+            try:
+                return self.client.delete_attachments(batch)
+            except RequestFailed as exc:
+                if not self.client.retry.retryable(exc):
+                    raise
+                if attempt + 1 >= self.config.batch_attempts:
+                    LOGGER.warning("Batch of %d failed %d time(s), giving up: %s", len(batch), attempt + 1, exc)
+                    raise
+                LOGGER.warning("Batch of %d failed, sending it again: %s", len(batch), exc)
+            time.sleep(self.client.retry.backoff(attempt))
+        raise RuntimeError(f"Batch of {len(batch)} not sent, no attempts configured")
@@ -0,0 +1,243 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Streaming, resumable downloads from /files/get.
+
+Files are written to disk ``chunk_size`` bytes at a time, never held in memory. A file of at least
+``2 * part_min_bytes`` is split into up to ``max_parts`` range requests fetched in parallel, every part goes to
+its own ``<file>.<start>-<end>.part`` file that is picked up where it stopped by the next attempt or the next
+run. Once all parts are on disk they are joined into a temporary file, ``.gz`` files are optionally
+decompressed during that pass, and it is renamed to the destination only when complete. At most
+``max_transfers`` requests run at once over all files.
+"""
+
+import logging
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+
+from main.reportplus.client import ReportClient
+from main.reportplus.filters import Predicate, filter_attachments, leaf
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class DownloadConfig:
+
+    chunk_size: int = 1 << 20
+    # smallest part a file is split into, smaller files are fetched in one request
+    part_min_bytes: int = 32 << 20
+    max_parts: int = 4
+    # requests running at once, over all files and their parts
+    max_transfers: int = 8
+    # attempts of a part breaking off mid transfer, each one resumes where the last stopped
+    part_attempts: int = 5
+    # write ``x.gz`` decompressed to ``x``
+    decompress_gzip: bool = False
+    # download again files whose destination already exists
+    overwrite: bool = False
+
+
+@dataclass
+class DownloadResult:
+
+    name: str
+    path: Path
+    # size on the server, None when it did not send one
+    size: Optional[int] = None
+    # bytes received by this run, the rest was on disk already
+    transferred: int = 0
+    resumed_bytes: int = 0
+    parts: int = 0
+    skipped: bool = False
+    error: Optional[str] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_transferred(self, count: int):
+        with self._lock:
+            self.transferred += count
+
+
+@dataclass
+class _Part:
+
+    start: int
+    # inclusive, None until the end of the file
+    end: Optional[int]
+    path: Path
+
+    @property
+    def length(self) -> Optional[int]:
+        return None if self.end is None else self.end - self.start + 1
+
+    def on_disk(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+
+def _content_size(resp: requests.Response) -> Tuple[Optional[int], bool]:
+    """Size of the file and whether the server honours ranges, from the answer to a ``bytes=0-0`` request."""
+    if resp.status_code in (206, 416):
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return (int(total) if total.isdigit() else None), True
+    length = resp.headers.get("Content-Length")
+    return (int(length) if length is not None else None), False
+
+
+def _gunzip(sources: List[Path], target: Path, chunk_size: int):
+    """Decompress the concatenation of ``sources`` into ``target``, gzip files with many members included."""
+    decompressor = zlib.decompressobj(wbits=31)
+    with open(target, "wb") as out:
+        for source in sources:
+            with open(source, "rb") as fp:
+                for chunk in iter(lambda: fp.read(chunk_size), b""):
+                    while chunk:
+                        out.write(decompressor.decompress(chunk))
+                        chunk = b""
+                        if decompressor.eof:
+                            chunk = decompressor.unused_data
+                            decompressor = zlib.decompressobj(wbits=31)
+        out.write(decompressor.flush())
+
+
+class Downloader:
+
+    def __init__(self, client: ReportClient, config: Optional[DownloadConfig] = None):
+        self.client = client
+        self.config = config if config is not None else DownloadConfig()
+
+    def download(self, files: Iterable[Tuple[str, Path]]) -> List[DownloadResult]:
+        """Download every ``(server file name, destination)`` pair, failures are reported in the results."""
+        results: List[DownloadResult] = []
+        running: Dict[Future, Tuple[str, DownloadResult, Any]] = {}
+        pending_parts: Dict[int, Set[Future]] = {}
+
+        with ThreadPoolExecutor(max_workers=self.config.max_transfers, thread_name_prefix="download") as executor:
+            for name, dest in files:
+                result = DownloadResult(name=name, path=self._target(Path(dest)))
+                results.append(result)
+                if result.path.exists() and not self.config.overwrite:
+                    result.skipped = True
+                    continue
+                running[executor.submit(self._plan, name, Path(dest), result)] = ("plan", result, Path(dest))
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, result, context = running.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as exc:
+                        LOGGER.error("Download of %s failed at %s: %s", result.name, stage, exc)
+                        if result.error is None:
+                            result.error = str(exc)
+                        value = None
+                    if stage == "plan" and value is not None:
+                        parts_futures = {executor.submit(self._fetch_part, result, part, value[1]) for part in value[0]}
+                        pending_parts[id(result)] = set(parts_futures)
+                        for part_future in parts_futures:
+                            running[part_future] = ("part", result, (context, value[0]))
+                    elif stage == "part":
+                        waiting = pending_parts[id(result)]
+                        waiting.discard(future)
+                        if not waiting and result.error is None:
+                            dest, parts = context
+                            running[executor.submit(self._assemble, dest, parts, result)] = ("assemble", result, None)
+        return results
+
+    def download_test(self, test_info: Dict[str, Any], dest_dir: Path,
+                      predicate: Optional[Predicate] = None) -> List[DownloadResult]:
+        """Download the files attached to a test, or those matching ``predicate``, into ``dest_dir``."""
+        predicate = leaf() & predicate if predicate is not None else leaf()
+        attachments = filter_attachments([self.client.get_attachments(test_info)], predicate)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        return self.download((attachment["name"], dest_dir / attachment["name"]) for attachment in attachments)
+
+    def _target(self, dest: Path) -> Path:
+        if self.config.decompress_gzip and dest.suffix == ".gz":
+            return dest.with_suffix("")
+        return dest
+
+    def _plan(self, name: str, dest: Path, result: DownloadResult) -> Tuple[List[_Part], bool]:
+        resp = self.client.get_file(name, 0, 0)
+        resp.close()
+        size, ranges = _content_size(resp)
+        result.size = size
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if not ranges or size is None:
+            parts = [_Part(0, None, dest.with_name(f"{dest.name}.part"))]
+        else:
+            count = max(1, min(self.config.max_parts, size // max(self.config.part_min_bytes, 1)))
+            bounds = [size * index // count for index in range(count + 1)]
+            parts = [_Part(start, end - 1, dest.with_name(f"{dest.name}.{start}-{end - 1}.part"))
+                     for start, end in zip(bounds, bounds[1:])]
+        result.parts = len(parts)
+        result.resumed_bytes = sum(part.on_disk() for part in parts) if ranges else 0
+        return parts, ranges
+
+    def _fetch_part(self, result: DownloadResult, part: _Part, ranges: bool):
+        for attempt in range(self.config.part_attempts):
+            have = part.on_disk() if ranges else 0
+            if part.length is not None and have >= part.length:
+                if have > part.length:
+                    raise RuntimeError(f"{part.path} is larger than its range, remove it and download again")
+                return
+            try:
+                resp = self.client.get_file(result.name, part.start + have, part.end) if ranges else \
+                    self.client.get_file(result.name)
+                with resp, open(part.path, "ab" if have else "wb") as fp:
+                    if resp.status_code == 200 and (part.start + have) > 0:
+                        raise RuntimeError(f"Server ignored the range request for {result.name}")
+                    for chunk in resp.iter_content(chunk_size=self.config.chunk_size):
+                        fp.write(chunk)
+                        result.add_transferred(len(chunk))
+                if part.length is None or part.on_disk() == part.length:
+                    return
+                LOGGER.warning("%s ended at %d of %d bytes, resuming", part.path.name, part.on_disk(), part.length)
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout) as exc:
+                LOGGER.warning("%s broke off, resuming (attempt %d): %s", part.path.name, attempt + 1, exc)
+            time.sleep(self.client.retry.backoff(attempt))
+        raise RuntimeError(f"{part.path.name} not complete after {self.config.part_attempts} attempts")
+
+    def _assemble(self, dest: Path, parts: List[_Part], result: DownloadResult):
+        if result.path == dest and len(parts) == 1 and parts[0].path.exists():
+            parts[0].path.replace(dest)
+        else:
+            # written next to the destination and moved there once complete, an interrupted pass leaves the parts
+            # as they were and no partial destination that a later run would take as downloaded
+            tmp = result.path.with_name(f"{result.path.name}.{'gunzip' if result.path != dest else 'join'}.tmp")
+            try:
+                if result.path != dest:
+                    _gunzip([part.path for part in parts], tmp, self.config.chunk_size)
+                else:
+                    with open(tmp, "wb") as out:
+                        # the part of an empty file is never written
+                        for part in (part for part in parts if part.length != 0):
+                            with open(part.path, "rb") as fp:
+                                shutil.copyfileobj(fp, out, self.config.chunk_size)
+                tmp.replace(result.path)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+        for part in parts:
+            part.path.unlink(missing_ok=True)
+        # parts of an earlier run split differently
+        for stale in dest.parent.glob(f"{dest.name}.*.part"):
+            stale.unlink()
+        LOGGER.info("Downloaded %s to %s", result.name, result.path)
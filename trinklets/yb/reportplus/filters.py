@@ -0,0 +1,111 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Single pass filters over attachment trees.
+
+Trees are walked with an explicit stack, so depth is not bounded by the recursion limit, and matches are
+yielded as they are found. Predicates are plain functions of a node and compose with ``&``, ``|`` and ``~``:
+
+    old_dumps = name_contains("tpch_data.gz") & older_than(timedelta(weeks=2)) & leaf()
+    for attachment in filter_attachments(trees, old_dumps):
+        ...
+
+A matching node is yielded and its children are not visited.
+"""
+
+import fnmatch
+import re
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+Attachment = Dict[str, Any]
+
+
+class Predicate:
+    """Condition on one attachment node, a function of the node with a readable description."""
+
+    def __init__(self, test: Callable[[Attachment], bool], description: str):
+        self.test = test
+        self.description = description
+
+    def __call__(self, attachment: Attachment) -> bool:
+        return self.test(attachment)
+
+    def __and__(self, other: "Predicate") -> "Predicate":
+        first, second = self.test, other.test
+        return Predicate(lambda node: first(node) and second(node), f"({self} & {other})")
+
+    def __or__(self, other: "Predicate") -> "Predicate":
+        first, second = self.test, other.test
+        return Predicate(lambda node: first(node) or second(node), f"({self} | {other})")
+
+    def __invert__(self) -> "Predicate":
+        test = self.test
+        return Predicate(lambda node: not test(node), f"~{self}")
+
+    def __str__(self):
+        return self.description
+
+
+def name_contains(text: str) -> Predicate:
+    return Predicate(lambda node: text in node["name"], f"name_contains({text!r})")
+
+
+def name_glob(pattern: str) -> Predicate:
+    match = re.compile(fnmatch.translate(pattern)).match
+    return Predicate(lambda node: match(node["name"]) is not None, f"name_glob({pattern!r})")
+
+
+def name_regex(pattern: str) -> Predicate:
+    search = re.compile(pattern).search
+    return Predicate(lambda node: search(node["name"]) is not None, f"name_regex({pattern!r})")
+
+
+def older_than(age: timedelta, now: Optional[float] = None) -> Predicate:
+    cutoff = (now if now is not None else time.time()) - age.total_seconds()
+    return Predicate(lambda node: node["time"] < cutoff, f"older_than({age})")
+
+
+def larger_than(size_bytes: int) -> Predicate:
+    return Predicate(lambda node: (node.get("size") or 0) > size_bytes, f"larger_than({size_bytes})")
+
+
+def leaf() -> Predicate:
+    return Predicate(lambda node: not node.get("children"), "leaf()")
+
+
+def filter_attachments(trees: Iterable[List[Attachment]], predicate: Predicate,
+                       prune: Optional[Predicate] = None,
+                       on_prune: Optional[Callable[[Attachment], None]] = None) -> Iterator[Attachment]:
+    """Yield the top most nodes matching the predicate, from a stream of attachment trees.
+
+    The children of a matching node are not visited, nor those of a node matching ``prune``. ``on_prune`` is
+    called with every node whose children are skipped that way.
+    """
+    test = predicate.test
+    skip = prune.test if prune is not None else None
+    for roots in trees:
+        stack = list(reversed(roots))
+        while stack:
+            node = stack.pop()
+            if test(node):
+                yield node
+                continue
+            children = node.get("children")
+            if not children:
+                continue
+            if skip is not None and skip(node):
+                if on_prune is not None:
+                    on_prune(node)
+                continue
+            stack.extend(reversed(children))
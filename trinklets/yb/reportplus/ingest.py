@@ -0,0 +1,251 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Bulk ingest of report results into a local SQLite analytics store.
+
+The pages of a report are listed with get_report_pages. Tests of the new or changed pages and their results
+are fetched concurrently. Table results, rows like ``['16.sql', {'value': '2.06', 'status': 'passed'}, ...]``
+under a header row, are flattened to one ``result_cell`` per row and column with the value typed as a number
+when it parses as one. Each page is written in one transaction with executemany.
+
+A page is ingested again only when the report's ``update_pages`` moved and the order or status counts of
+the page changed.
+
+    python -m main.reportplus.ingest --url http://reports:8080 --report "Parallel Query" --db results.db
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from main.reportplus.client import ReportClient
+
+LOGGER = logging.getLogger(__name__)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS ingested_report (
+    report_name TEXT PRIMARY KEY,
+    update_pages REAL
+);
+
+CREATE TABLE IF NOT EXISTS report_page (
+    report_name TEXT,
+    page TEXT,
+    page_order INTEGER,
+    -- order and status counts as listed by get_report_pages, compared on the next ingest
+    page_info TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (report_name, page)
+);
+
+CREATE TABLE IF NOT EXISTS report_test (
+    test_id TEXT PRIMARY KEY,
+    report_name TEXT NOT NULL,
+    page TEXT NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    status TEXT,
+    config TEXT
+);
+CREATE INDEX IF NOT EXISTS report_test_page_idx ON report_test(report_name, page);
+
+CREATE TABLE IF NOT EXISTS test_result (
+    result_id TEXT PRIMARY KEY,
+    test_id TEXT NOT NULL,
+    name TEXT,
+    type TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS test_result_test_idx ON test_result(test_id);
+
+CREATE TABLE IF NOT EXISTS result_cell (
+    result_id TEXT,
+    row_index INTEGER,
+    column_index INTEGER,
+    -- first cell of the row, e.g. the query name
+    row_key TEXT,
+    column_name TEXT,
+    value_num REAL,
+    value_text TEXT,
+    status TEXT,
+    PRIMARY KEY (result_id, row_index, column_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS result_cell_column_idx ON result_cell(column_name, row_key);
+
+CREATE VIEW IF NOT EXISTS result_cell_by_page AS
+SELECT p.report_name, p.page, p.page_order, t.test_id, r.name AS result_name, c.row_key, c.column_name,
+       c.value_num, c.value_text, c.status
+FROM result_cell c
+JOIN test_result r ON r.result_id = c.result_id
+JOIN report_test t ON t.test_id = r.test_id
+JOIN report_page p ON p.report_name = t.report_name AND p.page = t.page;
+"""
+
+
+@dataclass
+class IngestStats:
+
+    pages_listed: int = 0
+    pages_ingested: int = 0
+    tests: int = 0
+    results: int = 0
+    cells: int = 0
+    elapsed_secs: float = 0.0
+
+
+def _typed(value: Any) -> Tuple[Optional[float], Optional[str]]:
+    if isinstance(value, bool) or value is None:
+        return None, None if value is None else str(value)
+    if isinstance(value, (int, float)):
+        return float(value), None
+    try:
+        return float(value), None
+    except (TypeError, ValueError):
+        return None, str(value)
+
+
+def flatten_table(result: Dict[str, Any]) -> Iterator[Tuple[Any, ...]]:
+    """``result_cell`` rows of a table result, the first row of the data is the header."""
+    data = result.get("data") or []
+    if result.get("type") != "table" or not data:
+        return
+    header = [str(name) for name in data[0]]
+    for row_index, row in enumerate(data[1:], start=1):
+        row_key = row[0]["value"] if isinstance(row[0], dict) else row[0]
+        for column_index, cell in enumerate(row):
+            value, status = (cell.get("value"), cell.get("status")) if isinstance(cell, dict) else (cell, None)
+            value_num, value_text = _typed(value)
+            column_name = header[column_index] if column_index < len(header) else str(column_index)
+            yield (result["result_id"], row_index, column_index, str(row_key), column_name, value_num, value_text,
+                   status)
+
+
+class ReportIngester:
+
+    def __init__(self, client: ReportClient, db_file: Path, max_workers: int = 8):
+        self.client = client
+        self.db_file = Path(db_file)
+        self.max_workers = max_workers
+        self.conn = sqlite3.connect(str(self.db_file), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(DDL)
+
+    def close(self):
+        self.conn.close()
+
+    def _changed_pages(self, report_name: str, update_pages: Optional[float],
+                       pages: Dict[str, Dict[str, Any]]) -> List[str]:
+        row = self.conn.execute(
+            "SELECT update_pages FROM ingested_report WHERE report_name=?", (report_name,)).fetchone()
+        if row is not None and update_pages is not None and row[0] == update_pages:
+            return []
+        known = dict(self.conn.execute(
+            "SELECT page, page_info FROM report_page WHERE report_name=?", (report_name,)).fetchall())
+        return [page for page, info in pages.items() if known.get(page) != json.dumps(info, sort_keys=True)]
+
+    def ingest(self, report_name: str) -> IngestStats:
+        start = time.perf_counter()
+        stats = IngestStats()
+        report = next((report for report in self.client.get_reports() if report["name"] == report_name), None)
+        if report is None:
+            raise RuntimeError(f"Report {report_name} not found")
+        update_pages = report.get("config", {}).get("update_pages")
+        pages = self.client.get_report_pages(report_name)
+        stats.pages_listed = len(pages)
+        changed = self._changed_pages(report_name, update_pages, pages)
+        LOGGER.info("%d of %d page(s) of %s to ingest", len(changed), len(pages), report_name)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest") as pool:
+            tests_of_page = dict(zip(changed, pool.map(
+                lambda page: self.client.get_report_tests(report_name, page), changed)))
+            pending = {page: len(tests) for page, tests in tests_of_page.items()}
+            results: Dict[str, List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]] = {page: [] for page in changed}
+            futures = {
+                pool.submit(self.client.get_test_results, test["test_id"]): (page, test)
+                for page, tests in tests_of_page.items() for test in tests
+            }
+            # pages without tests are written right away, the others once their last test is in
+            for page in [page for page, count in pending.items() if count == 0]:
+                self._write_page(report_name, page, pages[page], [], stats)
+            for future in as_completed(futures):
+                page, test = futures[future]
+                results[page].append((test, future.result()))
+                pending[page] -= 1
+                if pending[page] == 0:
+                    self._write_page(report_name, page, pages[page], results.pop(page), stats)
+
+        self.conn.execute("INSERT OR REPLACE INTO ingested_report(report_name, update_pages) VALUES (?, ?)",
+                          (report_name, update_pages))
+        stats.elapsed_secs = round(time.perf_counter() - start, 3)
+        LOGGER.info("Ingested %s: %s", report_name, stats)
+        return stats
+
+    def _write_page(self, report_name: str, page: str, page_info: Dict[str, Any],
+                    test_results: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]], stats: IngestStats):
+        tests = [(test["test_id"], report_name, page, test.get("start_time"), test.get("end_time"),
+                  test.get("status"), json.dumps(test.get("config"))) for test, _ in test_results]
+        results = [(result["result_id"], test["test_id"], result.get("name"), result.get("type"),
+                    None if result.get("type") == "table" else json.dumps(result.get("data")))
+                   for test, test_result in test_results for result in test_result]
+        cells = [cell for _, test_result in test_results for result in test_result for cell in flatten_table(result)]
+
+        self.conn.execute("BEGIN")
+        try:
+            # a changed page replaces what was ingested for it before
+            old_tests = "SELECT test_id FROM report_test WHERE report_name=? AND page=?"
+            old_results = f"SELECT result_id FROM test_result WHERE test_id IN ({old_tests})"
+            self.conn.execute(f"DELETE FROM result_cell WHERE result_id IN ({old_results})", (report_name, page))
+            self.conn.execute(f"DELETE FROM test_result WHERE test_id IN ({old_tests})", (report_name, page))
+            self.conn.execute("DELETE FROM report_test WHERE report_name=? AND page=?", (report_name, page))
+            self.conn.executemany("INSERT OR REPLACE INTO report_test VALUES (?, ?, ?, ?, ?, ?, ?)", tests)
+            self.conn.executemany("INSERT OR REPLACE INTO test_result VALUES (?, ?, ?, ?, ?)", results)
+            self.conn.executemany("INSERT OR REPLACE INTO result_cell VALUES (?, ?, ?, ?, ?, ?, ?, ?)", cells)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO report_page VALUES (?, ?, ?, ?, ?)",
+                (report_name, page, page_info.get("order"), json.dumps(page_info, sort_keys=True), time.time()))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        stats.pages_ingested += 1
+        stats.tests += len(tests)
+        stats.results += len(results)
+        stats.cells += len(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--report", required=True)
+    parser.add_argument("--db", type=Path, default=Path("report_results.db"))
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = ReportClient(args.url, pool_size=args.workers)
+    ingester = ReportIngester(client, args.db, max_workers=args.workers)
+    try:
+        print(json.dumps(ingester.ingest(args.report).__dict__, indent=2))
+    finally:
+        ingester.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Index of the log files attached to tests, in SQLite with full text search.
+
+Log files are streamed line by line, plain or gzipped, and parsed with the first of ``LOG_FORMATS`` matching
+most of their opening lines:
+
+* ``glog``: client-server logs, ``E1016 12:34:56.789012 12345 tablet.cc:123] message``
+* ``postgres``: ``2024-10-16 12:34:56.789 UTC [12345] ERROR:  message``
+* ``framework``: app.log of the test framework, ``[12:34:56] {/path/to/file.py:12} ERROR - message``
+* ``framework_debug``: app_debug.log, ``name:file.py:func:12:ERROR   :: message``, without a timestamp
+
+Lines that do not match, like tracebacks, are appended to the message of the record before them. Timestamps
+are read as UTC. A date or year missing from the lines is taken from ``base_time``, best the start time of the
+test, else the ``Log file created at`` header of glog files or the file mtime. Every
+file is inserted with executemany in one transaction, the full text index is filled from the inserted rows in
+the same transaction. A ``(test, level, time)`` index answers level and time range queries without reading
+lines of other tests or outside the range, a time range over all levels is read as one range per level:
+
+    python -m main.reportplus.log_index --db logs.db ingest <test id> downloads/<test id>
+    python -m main.reportplus.log_index --db logs.db query <test id> --level ERROR --start 1729080000
+"""
+
+import argparse
+import calendar
+import gzip
+import json
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS log_test (
+    test_key INTEGER PRIMARY KEY,
+    test_id TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS log_file (
+    file_id INTEGER PRIMARY KEY,
+    test_key INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    format TEXT,
+    size INTEGER,
+    mtime REAL,
+    records INTEGER,
+    -- lines of the file are the log_line rows between these ids
+    first_line_id INTEGER,
+    last_line_id INTEGER,
+    UNIQUE (test_key, path)
+);
+
+CREATE TABLE IF NOT EXISTS log_level (
+    test_key INTEGER,
+    level TEXT,
+    PRIMARY KEY (test_key, level)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS log_line (
+    line_id INTEGER PRIMARY KEY,
+    test_key INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    ts REAL,
+    level TEXT,
+    source TEXT,
+    message TEXT
+);
+-- time ranges over all levels are read as one range per level, see LogIndex.query
+CREATE INDEX IF NOT EXISTS log_line_level_idx ON log_line(test_key, level, ts);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(message, content='log_line', content_rowid='line_id');
+"""
+
+GLOG_HEADER = re.compile(r"Log file created at: (\d{4})/(\d\d)/(\d\d) (\d\d):(\d\d):(\d\d)")
+
+LEVELS = {
+    "I": "INFO", "W": "WARNING", "E": "ERROR", "F": "FATAL",
+    "WARN": "WARNING", "LOG": "INFO", "CRITICAL": "FATAL", "PANIC": "FATAL",
+}
+
+
+@dataclass(frozen=True)
+class LogFormat:
+
+    name: str
+    # named groups: level and message, optionally year, month, day, hour, minute, second and source
+    pattern: "re.Pattern"
+    # lines carry a time but no date, the date rolls over when the time goes back
+    dateless: bool = False
+
+
+LOG_FORMATS = [
+    LogFormat("glog", re.compile(
+        r"(?P<level>[IWEF])(?P<month>\d\d)(?P<day>\d\d) (?P<hour>\d\d):(?P<minute>\d\d):(?P<second>\d\d(?:\.\d+)?)"
+        r"\s+\d+ (?P<source>[^\]]+)\] ?(?P<message>.*)")),
+    LogFormat("postgres", re.compile(
+        r"(?P<year>\d{4})-(?P<month>\d\d)-(?P<day>\d\d) (?P<hour>\d\d):(?P<minute>\d\d):(?P<second>\d\d(?:\.\d+)?)"
+        r" \S+ \[(?P<source>\d+)\] (?P<level>[A-Z]+):\s+(?P<message>.*)")),
+    LogFormat("framework", re.compile(
+        r"\[(?:(?P<year>\d{4})-(?P<month>\d\d)-(?P<day>\d\d) )?(?P<hour>\d\d):(?P<minute>\d\d):"
+        r"(?P<second>\d\d(?:[.,]\d+)?)\] \{(?P<source>[^}]*)\} (?P<level>[A-Z]+) - (?P<message>.*)"), dateless=True),
+    LogFormat("framework_debug", re.compile(
+        r"(?P<source>[\w.]+:[^:\s]+:[^:\s]+:\d+):(?P<level>[A-Z]+)\s*:: (?P<message>.*)")),
+]
+
+
+@dataclass
+class IngestedFile:
+
+    path: Path
+    format: Optional[str] = None
+    records: int = 0
+    skipped: bool = False
+    elapsed_secs: float = 0.0
+
+
+def open_log(path: Path):
+    """Text stream of a plain or gzipped log, undecodable bytes are replaced."""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace", buffering=1 << 20)
+
+
+def detect_format(lines: List[str]) -> Optional[LogFormat]:
+    """Format matching most of the given lines, None when none matches any."""
+    best, best_count = None, 0
+    for log_format in LOG_FORMATS:
+        count = sum(1 for line in lines if log_format.pattern.match(line))
+        if count > best_count:
+            best, best_count = log_format, count
+    return best
+
+
+class _Clock:
+    """Epoch seconds of parsed timestamps, with the epoch of every distinct minute computed once."""
+
+    def __init__(self, base_time: float, dateless: bool):
+        base = datetime.fromtimestamp(base_time, tz=timezone.utc)
+        self.year, self.month, self.day = base.year, base.month, base.day
+        self.dateless = dateless
+        self.day_offset = 0.0
+        self.last = float("-inf")
+        self.minutes: Dict[Tuple[Optional[str], ...], float] = {}
+
+    def __call__(self, year: Optional[str], month: Optional[str], day: Optional[str], hour: Optional[str],
+                 minute: Optional[str], second: Optional[str]) -> Optional[float]:
+        if hour is None:
+            return None
+        key = (year, month, day, hour, minute)
+        epoch = self.minutes.get(key)
+        if epoch is None:
+            epoch = self.minutes[key] = calendar.timegm((
+                int(year) if year else self.year, int(month) if month else self.month,
+                int(day) if day else self.day, int(hour), int(minute), 0))
+        ts = epoch + float(second.replace(",", ".")) + self.day_offset
+        if self.dateless and day is None and ts < self.last - 3600:
+            self.day_offset += 86400
+            ts += 86400
+        self.last = ts
+        return ts
+
+
+_FIELDS = ("year", "month", "day", "hour", "minute", "second", "level", "source", "message")
+
+
+def parse_log(lines: Iterable[str], log_format: LogFormat, base_time: float
+              ) -> Iterator[Tuple[int, Optional[float], Optional[str], Optional[str], str]]:
+    """``(line number, ts, level, source, message)`` records of a log, continuation lines joined to the record
+    they follow."""
+    match = log_format.pattern.match
+    clock = _Clock(base_time, log_format.dateless)
+    groupindex = log_format.pattern.groupindex
+    # positions of the fields in match.groups(), a field missing from the pattern reads the always None slot
+    missing = log_format.pattern.groups
+    year, month, day, hour, minute, second, level, source, message = (
+        groupindex[name] - 1 if name in groupindex else missing for name in _FIELDS)
+    levels = LEVELS
+
+    record: Optional[List[Any]] = None
+    for line_no, line in enumerate(lines, start=1):
+        found = match(line)
+        if found is None:
+            if record is None:
+                record = [line_no, None, None, None, line.rstrip("\n")]
+            else:
+                record[4] += "\n" + line.rstrip("\n")
+            continue
+        if record is not None:
+            yield tuple(record)
+        groups = found.groups() + (None,)
+        line_level = groups[level]
+        record = [line_no, clock(groups[year], groups[month], groups[day], groups[hour], groups[minute],
+                                 groups[second]),
+                  levels.get(line_level, line_level), groups[source], groups[message]]
+    if record is not None:
+        yield tuple(record)
+
+
+class LogIndex:
+
+    def __init__(self, db_file: Path, batch_size: int = 50000):
+        self.db_file = Path(db_file)
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(str(self.db_file), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(DDL)
+
+    def close(self):
+        self.conn.close()
+
+    def _test_key(self, test_id: str) -> int:
+        self.conn.execute("INSERT OR IGNORE INTO log_test(test_id) VALUES (?)", (test_id,))
+        return self.conn.execute("SELECT test_key FROM log_test WHERE test_id=?", (test_id,)).fetchone()[0]
+
+    def ingest_file(self, test_id: str, path: Path, base_time: Optional[float] = None) -> IngestedFile:
+        """Index one log file of a test, a file indexed before with the same size and mtime is skipped."""
+        start = time.perf_counter()
+        path = Path(path)
+        result = IngestedFile(path)
+        stat = path.stat()
+        test_key = self._test_key(test_id)
+        known = self.conn.execute("SELECT file_id, size, mtime FROM log_file WHERE test_key=? AND path=?",
+                                  (test_key, str(path))).fetchone()
+        if known is not None and known[1:] == (stat.st_size, stat.st_mtime):
+            result.skipped = True
+            return result
+
+        with open_log(path) as fp:
+            head = [line for _, line in zip(range(50), fp)]
+        if base_time is None:
+            base_time = next((float(calendar.timegm(tuple(int(part) for part in found.groups())))
+                              for found in map(GLOG_HEADER.match, head) if found), stat.st_mtime)
+        log_format = detect_format(head)
+        if log_format is None:
+            LOGGER.warning("%s does not look like a known log format, skipping", path)
+            result.skipped = True
+            return result
+        result.format = log_format.name
+
+        self.conn.execute("BEGIN")
+        try:
+            if known is not None:
+                self._delete_file(known[0])
+            file_id = self.conn.execute(
+                "INSERT INTO log_file(test_key, path, format, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                (test_key, str(path), log_format.name, stat.st_size, stat.st_mtime)).lastrowid
+            first_line_id = (self.conn.execute("SELECT max(line_id) FROM log_line").fetchone()[0] or 0) + 1
+            with open_log(path) as fp:
+                records = parse_log(fp, log_format, base_time)
+                batch, levels = [], set()
+                for record in records:
+                    batch.append((test_key, file_id) + record)
+                    levels.add(record[2])
+                    if len(batch) >= self.batch_size:
+                        self._insert(batch)
+                        result.records += len(batch)
+                        batch = []
+                self._insert(batch)
+                result.records += len(batch)
+            last_line_id = first_line_id + result.records - 1
+            self.conn.executemany("INSERT OR IGNORE INTO log_level VALUES (?, ?)",
+                                  [(test_key, level) for level in levels if level is not None])
+            self.conn.execute("INSERT INTO log_fts(rowid, message) SELECT line_id, message FROM log_line "
+                              "WHERE line_id BETWEEN ? AND ?", (first_line_id, last_line_id))
+            self.conn.execute("UPDATE log_file SET records=?, first_line_id=?, last_line_id=? WHERE file_id=?",
+                              (result.records, first_line_id, last_line_id, file_id))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        result.elapsed_secs = round(time.perf_counter() - start, 3)
+        LOGGER.info("Indexed %d record(s) of %s (%s) in %.2fs", result.records, path, log_format.name,
+                    result.elapsed_secs)
+        return result
+
+    def ingest_dir(self, test_id: str, directory: Path, patterns: Iterable[str] = ("*.log", "*.log.gz"),
+                   base_time: Optional[float] = None) -> List[IngestedFile]:
+        """Index the log files under ``directory``, e.g. the attachments of a test from reportplus.download."""
+        paths = sorted({path for pattern in patterns for path in Path(directory).rglob(pattern)})
+        return [self.ingest_file(test_id, path, base_time) for path in paths]
+
+    def _insert(self, batch: List[Tuple[Any, ...]]):
+        self.conn.executemany(
+            "INSERT INTO log_line(test_key, file_id, line_no, ts, level, source, message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            batch)
+
+    def _delete_file(self, file_id: int):
+        lines = "SELECT first_line_id, last_line_id FROM log_file WHERE file_id=?"
+        first, last = self.conn.execute(lines, (file_id,)).fetchone()
+        if first is not None:
+            # external content table, the index is told which rows go away with their old content
+            self.conn.execute("INSERT INTO log_fts(log_fts, rowid, message) SELECT 'delete', line_id, message "
+                              "FROM log_line WHERE line_id BETWEEN ? AND ?", (first, last))
+            self.conn.execute("DELETE FROM log_line WHERE line_id BETWEEN ? AND ?", (first, last))
+        self.conn.execute("DELETE FROM log_file WHERE file_id=?", (file_id,))
+
+    def query(self, test_id: str, levels: Optional[Iterable[str]] = None, start: Optional[float] = None,
+              end: Optional[float] = None, text: Optional[str] = None, limit: Optional[int] = None
+              ) -> List[Dict[str, Any]]:
+        """Records of a test in time order, by level, time range (inclusive) and FTS5 match expression.
+
+        For example all errors of a test between two times: ``query(test_id, ["ERROR"], t1, t2)``.
+        """
+        row = self.conn.execute("SELECT test_key FROM log_test WHERE test_id=?", (test_id,)).fetchone()
+        if row is None:
+            return []
+        clauses = ["l.test_key = ?"]
+        params: List[Any] = [row[0]]
+        if levels is None and (start is not None or end is not None):
+            # the levels of the test, so the time range is read from the (test, level, time) index per level
+            levels = [level for level, in self.conn.execute("SELECT level FROM log_level WHERE test_key=?", (row[0],))]
+        if levels is not None:
+            levels = list(levels)
+            clauses.append(f"l.level IN ({', '.join('?' * len(levels))})")
+            params.extend(levels)
+        if start is not None:
+            clauses.append("l.ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("l.ts <= ?")
+            params.append(end)
+        if text is not None:
+            clauses.append("l.line_id IN (SELECT rowid FROM log_fts WHERE log_fts MATCH ?)")
+            params.append(text)
+        sql = (f"SELECT f.path, l.line_no, l.ts, l.level, l.source, l.message FROM log_line l "
+               f"JOIN log_file f ON f.file_id = l.file_id WHERE {' AND '.join(clauses)} ORDER BY l.ts, l.line_id")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        columns = ("path", "line_no", "ts", "level", "source", "message")
+        return [dict(zip(columns, row)) for row in self.conn.execute(sql, params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=Path("logs.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest")
+    ingest.add_argument("test_id")
+    ingest.add_argument("directory", type=Path)
+    ingest.add_argument("--base-time", type=float, help="epoch secs for dates missing from the lines")
+    query = commands.add_parser("query")
+    query.add_argument("test_id")
+    query.add_argument("--level", action="append")
+    query.add_argument("--start", type=float)
+    query.add_argument("--end", type=float)
+    query.add_argument("--text")
+    query.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = LogIndex(args.db)
+    try:
+        if args.command == "ingest":
+            for ingested in index.ingest_dir(args.test_id, args.directory, base_time=args.base_time):
+                print(f"{ingested.path}: {ingested.format} {ingested.records} record(s)"
+                      f"{' (skipped)' if ingested.skipped else ''}")
+        else:
+            for record in index.query(args.test_id, args.level, args.start, args.end, args.text, args.limit):
+                print(json.dumps(record))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Local SQLite cache of report tests and attachment trees.
+
+Tests are synced per suite from a high-water mark: a sync only asks the server for tests started after the
+previous sync, minus ``overlap_secs`` for tests that were still running then. Attachment trees are keyed by
+``test_id`` and fetched again once older than ``ttl_secs`` or after an explicit ``invalidate``.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS test (
+    test_id TEXT PRIMARY KEY,
+    suite_name TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS test_suite_start_idx ON test(suite_name, start_time);
+
+CREATE TABLE IF NOT EXISTS attachment_tree (
+    test_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    suite_name TEXT PRIMARY KEY,
+    high_water REAL NOT NULL
+);
+"""
+
+
+class MetadataCache:
+
+    def __init__(self, db_file: Path, ttl_secs: float = 7 * 24 * 3600, overlap_secs: float = 24 * 3600):
+        self.db_file = Path(db_file)
+        self.ttl_secs = ttl_secs
+        self.overlap_secs = overlap_secs
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(DDL)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_tests(self, suite_name: str, start: float, end: float,
+                  fetch: Callable[[float, float], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Tests of the suite started in ``[start, end]``, ``fetch(start, end)`` asks the server for the rest."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water FROM sync_state WHERE suite_name=?", (suite_name,)).fetchone()
+        fetch_start = start if row is None else max(start, row[0] - self.overlap_secs)
+        tests = fetch(fetch_start, end)
+        LOGGER.info("Fetched %d test(s) of %s since %s", len(tests), suite_name, time.ctime(fetch_start))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO test(test_id, suite_name, start_time, data) VALUES (?, ?, ?, ?)",
+                    [(test["test_id"], suite_name, self._start_time(test, end), json.dumps(test)) for test in tests])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state(suite_name, high_water) VALUES (?, ?)",
+                    (suite_name, max(end, row[0] if row else end)))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            rows = self._conn.execute(
+                "SELECT data FROM test WHERE suite_name=? AND start_time BETWEEN ? AND ? ORDER BY start_time",
+                (suite_name, start, end)).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    @staticmethod
+    def _start_time(test: Dict[str, Any], default: float) -> float:
+        value = test.get("start_time")
+        return float(value) if isinstance(value, (int, float)) else default
+
+    def get_attachments(self, test_id: str,
+                        fetch: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM attachment_tree WHERE test_id=? AND synced_at>=?",
+                (test_id, time.time() - self.ttl_secs)).fetchone()
+            if row is not None:
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+
+        attachments = fetch()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO attachment_tree(test_id, data, synced_at) VALUES (?, ?, ?)",
+                (test_id, json.dumps(attachments), time.time()))
+        return attachments
+
+    def invalidate(self, test_ids: Optional[Iterable[str]] = None, suite_name: Optional[str] = None):
+        """Drop cached attachment trees of the tests, with ``suite_name`` the tests of the suite, else everything."""
+        with self._lock:
+            if test_ids is not None:
+                self._conn.executemany("DELETE FROM attachment_tree WHERE test_id=?",
+                                       [(test_id,) for test_id in test_ids])
+            if suite_name is not None:
+                self._conn.execute("DELETE FROM test WHERE suite_name=?", (suite_name,))
+                self._conn.execute("DELETE FROM sync_state WHERE suite_name=?", (suite_name,))
+            if test_ids is None and suite_name is None:
+                self._conn.execute("DELETE FROM test")
+                self._conn.execute("DELETE FROM attachment_tree")
+                self._conn.execute("DELETE FROM sync_state")
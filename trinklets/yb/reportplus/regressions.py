@@ -0,0 +1,221 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Cross-build regression detection over ingested report result tables (see reportplus.ingest).
+
+Per query durations are loaded into a builds x queries array ordered by the page ``order`` of each build,
+missing runs are NaN. Every statistic is computed for all builds and queries at once:
+
+* baseline: mean and standard deviation of the previous ``window`` builds with a value
+* percent change and z-score of each build against its baseline
+* change point: per query the build splitting its history into the two most different halves
+
+A build regresses a query when its duration is ``threshold_pct`` above the baseline and ``z_threshold``
+standard deviations away from it.
+
+Run with ``python -m main.reportplus.regressions --db report_results.db --report "Parallel Query"``.
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class DurationMatrix:
+
+    builds: List[str]
+    orders: np.ndarray
+    queries: List[str]
+    # builds x queries, NaN where the build has no run of the query
+    values: np.ndarray
+
+
+@dataclass
+class RegressionReport:
+
+    matrix: DurationMatrix
+    baseline: np.ndarray
+    pct_change: np.ndarray
+    z_score: np.ndarray
+    regressed: np.ndarray
+    # per query index of the first build after the change point, -1 when there is none
+    change_point: np.ndarray
+    change_score: np.ndarray
+
+    def by_build(self) -> Dict[str, List[str]]:
+        """Regressed queries of every build with at least one."""
+        result: Dict[str, List[str]] = {}
+        for build_index, query_index in zip(*np.nonzero(self.regressed)):
+            result.setdefault(self.matrix.builds[build_index], []).append(self.matrix.queries[query_index])
+        return result
+
+    def change_points(self) -> Dict[str, str]:
+        return {self.matrix.queries[query_index]: self.matrix.builds[build_index]
+                for query_index, build_index in enumerate(self.change_point) if build_index >= 0}
+
+
+def load_durations(conn: sqlite3.Connection, report_name: str, column_name: str = "With Parallel Workers",
+                   result_name: str = "Compare Average Duration%") -> DurationMatrix:
+    """Durations of one result column, averaged over the tests of a build."""
+    rows = conn.execute("""
+        SELECT page_order, page, row_key, value_num FROM result_cell_by_page
+        WHERE report_name=? AND column_name=? AND result_name LIKE ? AND value_num IS NOT NULL
+    """, (report_name, column_name, result_name)).fetchall()
+    if not rows:
+        return DurationMatrix([], np.empty(0), [], np.empty((0, 0)))
+
+    orders, pages, queries, values = zip(*rows)
+    order_values, build_index = np.unique(np.asarray(orders, dtype=np.int64), return_inverse=True)
+    query_names, query_index = np.unique(np.asarray(queries, dtype=object), return_inverse=True)
+    page_of_order = dict(zip(orders, pages))
+
+    sums = np.zeros((len(order_values), len(query_names)))
+    counts = np.zeros_like(sums)
+    np.add.at(sums, (build_index, query_index), np.asarray(values, dtype=float))
+    np.add.at(counts, (build_index, query_index), 1)
+    with np.errstate(invalid="ignore"):
+        means = sums / counts
+    return DurationMatrix(
+        builds=[page_of_order[order] for order in order_values.tolist()],
+        orders=order_values,
+        queries=[str(name) for name in query_names],
+        values=means
+    )
+
+
+@dataclass
+class _Cumulative:
+    """Running number of runs, sum and sum of squares of every query, row ``i`` covers builds before ``i``."""
+
+    count: np.ndarray
+    total: np.ndarray
+    squares: np.ndarray
+
+    @classmethod
+    def of(cls, values: np.ndarray) -> "_Cumulative":
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        arrays = [np.zeros((values.shape[0] + 1, values.shape[1])) for _ in range(3)]
+        np.cumsum(present, axis=0, out=arrays[0][1:])
+        np.cumsum(filled, axis=0, out=arrays[1][1:])
+        np.cumsum(np.square(filled, out=filled), axis=0, out=arrays[2][1:])
+        return cls(*arrays)
+
+    def window(self, cumulative: np.ndarray, window: int) -> np.ndarray:
+        """Per build sums over the ``window`` previous builds, the build itself excluded."""
+        sums = cumulative[:-1].copy()
+        if window < len(sums):
+            sums[window:] -= cumulative[:len(sums) - window]
+        return sums
+
+
+def rolling_baseline(values: np.ndarray, window: int, cumulative: Optional[_Cumulative] = None):
+    """Mean, standard deviation and number of runs over the previous ``window`` builds of every query."""
+    cumulative = cumulative if cumulative is not None else _Cumulative.of(values)
+    count = cumulative.window(cumulative.count, window)
+    mean = cumulative.window(cumulative.total, window)
+    var = cumulative.window(cumulative.squares, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean /= count
+        # sample variance from the sums: (squares - count * mean^2) / (count - 1)
+        var -= count * mean * mean
+        var /= np.maximum(count - 1, 1)
+    np.maximum(var, 0.0, out=var)
+    return mean, np.sqrt(var, out=var), count
+
+
+def change_points(values: np.ndarray, min_size: int = 3, cumulative: Optional[_Cumulative] = None):
+    """Best single split of each query history, by the two sample t statistic between both sides.
+
+    Returns per query the index of the first build after the split and its statistic. Splits leaving less
+    than ``min_size`` runs on either side are not considered.
+    """
+    cumulative = cumulative if cumulative is not None else _Cumulative.of(values)
+    # split k puts builds [0, k) on the left, for k in 1..builds-1
+    left_n, left_sum, left_sq = (array[1:-1] for array in
+                                 (cumulative.count, cumulative.total, cumulative.squares))
+    all_n, all_sum, all_sq = cumulative.count[-1], cumulative.total[-1], cumulative.squares[-1]
+    if left_n.shape[0] == 0:
+        return np.full(values.shape[1], -1), np.zeros(values.shape[1])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        right_n = all_n - left_n
+        right_sum = all_sum - left_sum
+        left_mean = left_sum / left_n
+        right_mean = right_sum / right_n
+        # pooled variance: squares left after removing each side's mean, over n - 2 degrees of freedom
+        pooled = all_sq - left_sum * left_mean - right_sum * right_mean
+        pooled /= np.maximum(all_n - 2, 1)
+        np.maximum(pooled, 1e-12, out=pooled)
+        pooled *= 1 / left_n + 1 / right_n
+        t_stat = np.abs(left_mean - right_mean, out=left_mean)
+        t_stat /= np.sqrt(pooled, out=pooled)
+    t_stat[(left_n < min_size) | (right_n < min_size) | np.isnan(t_stat)] = 0
+
+    best = np.argmax(t_stat, axis=0)
+    score = t_stat[best, np.arange(values.shape[1])]
+    return np.where(score > 0, best + 1, -1), score
+
+
+def detect_regressions(matrix: DurationMatrix, window: int = 10, threshold_pct: float = 15.0,
+                       z_threshold: float = 2.0, min_baseline_runs: int = 3,
+                       change_threshold: Optional[float] = 8.0) -> RegressionReport:
+    """Regressions of every build against its rolling baseline, change points scoring below
+    ``change_threshold`` are dropped."""
+    values = matrix.values
+    cumulative = _Cumulative.of(values)
+    baseline, spread, runs = rolling_baseline(values, window, cumulative)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct_change = (values - baseline) / baseline * 100
+        # a flat baseline still needs the percent threshold, do not let a zero spread flag everything
+        z_score = (values - baseline) / np.maximum(spread, np.abs(baseline) * 1e-3)
+        regressed = (runs >= min_baseline_runs) & (pct_change > threshold_pct) & (z_score > z_threshold)
+    change_point, change_score = change_points(values, cumulative=cumulative)
+    if change_threshold is not None:
+        change_point = np.where(change_score >= change_threshold, change_point, -1)
+    report = RegressionReport(matrix, baseline, pct_change, z_score, regressed, change_point, change_score)
+    LOGGER.info("%d regression(s) over %d builds x %d queries", int(regressed.sum()), *values.shape)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", type=Path, default=Path("report_results.db"))
+    parser.add_argument("--report", required=True)
+    parser.add_argument("--column", default="With Parallel Workers")
+    parser.add_argument("--window", type=int, default=10)
+    parser.add_argument("--threshold-pct", type=float, default=15.0)
+    parser.add_argument("--z-threshold", type=float, default=2.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    conn = sqlite3.connect(str(args.db))
+    try:
+        matrix = load_durations(conn, args.report, column_name=args.column)
+    finally:
+        conn.close()
+    report = detect_regressions(matrix, window=args.window, threshold_pct=args.threshold_pct,
+                                z_threshold=args.z_threshold)
+    print(json.dumps({"regressions": report.by_build(), "change_points": report.change_points()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Memoized responses of the read endpoints of the report server.
+
+Responses are keyed by endpoint and canonical json payload. They are kept in an in-memory LRU bounded by
+entries and bytes, optionally backed by a directory of json files shared between runs, and expire after a
+per endpoint TTL. Only endpoints with a TTL are cached.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTLS = {
+    "get_reports": 60.0,
+    "get_report_pages": 60.0,
+    "get_report_tests": 300.0,
+    "get_test_info": 300.0,
+    # results of a test do not change once it is finished
+    "get_test_results": 3600.0,
+}
+
+
+def cache_key(endpoint: str, payload: Optional[Dict[str, Any]]) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{endpoint}:{canonical}".encode()).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 << 20, ttls: Optional[Dict[str, float]] = None,
+                 disk_dir: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        # key -> (endpoint, expires_at, serialized response)
+        self._entries: "OrderedDict[str, Tuple[str, float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Counter] = {}
+
+    def cacheable(self, endpoint: str) -> bool:
+        return endpoint in self.ttls
+
+    def _count(self, endpoint: str, event: str):
+        self.counters.setdefault(endpoint, Counter())[event] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "endpoints": {endpoint: dict(counter) for endpoint, counter in self.counters.items()},
+            }
+
+    def get(self, endpoint: str, payload: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Cached response, a fresh copy the caller may change, or None."""
+        key = cache_key(endpoint, payload)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._count(endpoint, "hits")
+                    return json.loads(entry[2])
+                self._drop(key)
+                self._count(endpoint, "expired")
+
+        data = self._read_disk(key, now)
+        with self._lock:
+            if data is None:
+                self._count(endpoint, "misses")
+                return None
+            self._count(endpoint, "disk_hits")
+            self._store(key, endpoint, data[0], data[1])
+        return json.loads(data[1])
+
+    def put(self, endpoint: str, payload: Optional[Dict[str, Any]], response: Dict[str, Any]):
+        key = cache_key(endpoint, payload)
+        expires_at = time.time() + self.ttls[endpoint]
+        serialized = json.dumps(response, separators=(",", ":")).encode()
+        with self._lock:
+            self._store(key, endpoint, expires_at, serialized)
+        self._write_disk(key, endpoint, expires_at, serialized)
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """Forget the responses of the endpoint, or all of them, in memory and on disk."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if endpoint is None or entry[0] == endpoint]:
+                self._drop(key)
+            if self.disk_dir is None:
+                return
+            for path in self.disk_dir.glob("*/*.json"):
+                if endpoint is None or path.read_bytes().startswith(self._disk_header(endpoint)):
+                    path.unlink(missing_ok=True)
+
+    def _store(self, key: str, endpoint: str, expires_at: float, serialized: bytes):
+        if len(serialized) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (endpoint, expires_at, serialized)
+        self._bytes += len(serialized)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._count(self._entries[oldest][0], "evictions")
+            self._drop(oldest)
+
+    def _drop(self, key: str):
+        _, _, serialized = self._entries.pop(key)
+        self._bytes -= len(serialized)
+
+    # disk files are "<endpoint> <expires_at>\n<response json>"
+
+    @staticmethod
+    def _disk_header(endpoint: str) -> bytes:
+        return f"{endpoint} ".encode()
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+        if self.disk_dir is None:
+            return None
+        try:
+            header, serialized = self._path(key).read_bytes().split(b"\n", 1)
+        except (FileNotFoundError, ValueError):
+            return None
+        expires_at = float(header.split(b" ")[1])
+        if expires_at <= now:
+            return None
+        return expires_at, serialized
+
+    def _write_disk(self, key: str, endpoint: str, expires_at: float, serialized: bytes):
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(self._disk_header(endpoint) + f"{expires_at}\n".encode() + serialized)
+        # readers never see a partly written file
+        os.replace(tmp_path, path)
@@ -0,0 +1,304 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Local stand-in of the report server /back/* and /files/get endpoints, for trying the clients without a real
+server.
+
+Serves synthetic tests with nested attachment trees, with a configurable latency and share of 503 responses.
+Files added with ``StandInState.add_file`` are served by /files/get, including single range requests:
+
+    python -m main.reportplus.standin --tests 500 --latency-secs 0.05 --failure-rate 0.05
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+LOGGER = logging.getLogger(__name__)
+
+DAY_SECS = 24 * 3600
+
+
+class StandInState:
+    """Synthetic report server data, built from a seed so runs are repeatable."""
+
+    def __init__(self, tests: int = 200, latency_secs: float = 0.0, failure_rate: float = 0.0, seed: int = 0,
+                 builds: int = 20, queries: int = 22):
+        self.latency_secs = latency_secs
+        self.failure_rate = failure_rate
+        # share of attachments a delete leaves in place, reported back under "failed"
+        self.delete_failure_rate = 0.0
+        # attachment ids that make the whole delete request fail with a 400
+        self.poisoned: set = set()
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.random = random.Random(seed)
+        now = time.time()
+        self.tests = [
+            {
+                "test_id": str(uuid.UUID(int=self.random.getrandbits(128))),
+                "config": {"suite_name": "ParallelQuerySuite"},
+                "start_time": now - self.random.uniform(0, 100) * DAY_SECS,
+                "status": self.random.choice(["passed", "failed"]),
+            }
+            for _ in range(tests)
+        ]
+        self.attachments = {test["test_id"]: self._tree(test["start_time"]) for test in self.tests}
+        self.deleted: set = set()
+        # contents served by /files/get by name
+        self.files: Dict[str, bytes] = {}
+        # share of file responses cut off half way, to try resuming downloads
+        self.file_drop_rate = 0.0
+        self._build_reports(builds, queries, now)
+
+    def _build_reports(self, builds: int, queries: int, now: float):
+        """A "Parallel Query" report with one page per build and "Compare Average Duration" result tables."""
+        self.report_name = "Parallel Query"
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.page_tests: Dict[str, List[Dict[str, Any]]] = {}
+        self.results: Dict[str, List[Dict[str, Any]]] = {}
+        # (page, query) pairs made 50% slower than the baseline of the query
+        self.regressions: set = set()
+        baselines = {f"{query}.sql": self.random.uniform(1, 60) for query in range(1, queries + 1)}
+        for build in range(builds):
+            page = f"2.23.0.0-b{build + 1}"
+            tests = []
+            for _ in range(self.random.randint(1, 2)):
+                test_id = str(uuid.UUID(int=self.random.getrandbits(128)))
+                start_time = now - (builds - build) * 3600
+                tests.append({"test_id": test_id, "config": {"build": page}, "start_time": start_time,
+                              "end_time": start_time + 1800, "status": "passed"})
+                rows = [["Query Name", "Without Parallel", "With Parallel Workers", "Better", "Verify Records"]]
+                for query, baseline in baselines.items():
+                    regressed = build >= builds // 2 and self.random.random() < 0.02
+                    if regressed:
+                        self.regressions.add((page, query))
+                    with_parallel = baseline * self.random.gauss(1.0, 0.03) * (1.5 if regressed else 1.0)
+                    without = baseline * self.random.gauss(1.6, 0.05)
+                    better = (without - with_parallel) / without * 100
+                    rows.append([query, {"value": f"{without:.2f}", "status": "passed"},
+                                 {"value": f"{with_parallel:.2f}", "status": "passed"},
+                                 {"value": str(better), "status": "passed" if better > 0 else "failed"},
+                                 {"value": "EQ", "status": "passed"}])
+                self.results[test_id] = [{
+                    "result_id": str(uuid.UUID(int=self.random.getrandbits(128))), "data": rows,
+                    "name": "Compare Average Duration - Without Nemesis", "test_id": test_id, "type": "table"}]
+            self.page_tests[page] = tests
+            self.pages[page] = {"order": 3000 + build, "passed": len(tests), "failed": 0}
+        self.update_pages = now
+
+    def get_reports(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        pages = {page: {"order": info["order"], "statuses": {"passed": info["passed"]}}
+                 for page, info in self.pages.items()}
+        return {"reports": [{
+            "report_id": "a98c3f0a-88c3-44d9-bf35-055a54803db5", "name": self.report_name,
+            "config": {"tag": "parallel_query", "pages": pages, "update_pages": self.update_pages},
+            "creation_time": self.update_pages - 100 * DAY_SECS}]}
+
+    def get_report_pages(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"pages": self.pages if payload.get("name") == self.report_name else {}}
+
+    def get_report_tests(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"tests": self.page_tests.get(payload.get("page"), [])}
+
+    def get_test_info(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        for tests in self.page_tests.values():
+            for test in tests:
+                if test["test_id"] == payload["test_id"]:
+                    return {"test_info": test, "status": True}
+        return {"test_info": None, "status": False}
+
+    def get_test_results(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"results": self.results.get(payload["test_id"], []), "status": True}
+
+    def _tree(self, start_time: float) -> List[Dict[str, Any]]:
+        def node(name: str, children: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+            return {
+                "attachment_id": str(uuid.UUID(int=self.random.getrandbits(128))),
+                "name": name,
+                "time": start_time + self.random.uniform(0, 3600),
+                "size": 0 if children else self.random.randint(1 << 10, 1 << 30),
+                "children": children or [],
+            }
+
+        return [
+            node("Framework logs", [node("app_debug.log"), node("reports", [node("example.html")])]),
+            node("Data", [node("tpch_data.gz"), node("schema.sql")]),
+            node(f"{uuid.UUID(int=self.random.getrandbits(128))}-client-server-a10983.log"),
+        ]
+
+    def add_file(self, name: str, data: bytes):
+        with self.lock:
+            self.files[name] = data
+
+    def file_range(self, name: str, range_header: Optional[str]) -> Tuple[int, bytes, Optional[str]]:
+        """Status, body and Content-Range of a /files/get request, only ``bytes=start-[end]`` is supported."""
+        data = self.files.get(name)
+        if data is None:
+            return 404, b"", None
+        if not range_header or not range_header.startswith("bytes="):
+            return 200, data, None
+        start_text, _, end_text = range_header[len("bytes="):].partition("-")
+        start = int(start_text)
+        end = min(int(end_text), len(data) - 1) if end_text else len(data) - 1
+        if start >= len(data) or start > end:
+            return 416, b"", f"bytes */{len(data)}"
+        return 206, data[start:end + 1], f"bytes {start}-{end}/{len(data)}"
+
+    def count(self, endpoint: str):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def get_tests(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        start, end = payload.get("start", 0), payload.get("end", float("inf"))
+        return {"tests": [test for test in self.tests if start <= test["start_time"] <= end]}
+
+    def get_attachments(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        def alive(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            return [dict(node, children=alive(node["children"])) for node in nodes
+                    if node["attachment_id"] not in self.deleted]
+
+        with self.lock:
+            return {"attachments": alive(self.attachments.get(payload["test_id"], []))}
+
+    def delete_attachments(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        ids = [attachment["attachment_id"] for attachment in payload["attachments"]]
+        if self.poisoned.intersection(ids):
+            raise ValueError("poisoned attachment in request")
+        with self.lock:
+            failed = [attachment_id for attachment_id in ids if self.random.random() < self.delete_failure_rate]
+            self.deleted.update(set(ids).difference(failed))
+        return {"status": not failed, "failed": failed} if failed else {"status": True}
+
+    def endpoints(self) -> Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]:
+        return {
+            "get_tests": self.get_tests,
+            "get_attachments": self.get_attachments,
+            "delete_attachments": self.delete_attachments,
+            "get_reports": self.get_reports,
+            "get_report_pages": self.get_report_pages,
+            "get_report_tests": self.get_report_tests,
+            "get_test_info": self.get_test_info,
+            "get_test_results": self.get_test_results,
+        }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, avoid the delayed ack stall on keep-alive connections
+    disable_nagle_algorithm = True
+    state: StandInState
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        endpoint = self.path.rsplit("/", 1)[-1]
+        handler = self.state.endpoints().get(endpoint) if self.path.startswith("/back/") else None
+        self.state.count(endpoint)
+        time.sleep(self.state.latency_secs)
+        if handler is None:
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+        elif self.state.random.random() < self.state.failure_rate:
+            self._reply(503, {"error": "injected failure"})
+        else:
+            try:
+                self._reply(200, handler(json.loads(body or b"{}")))
+            except ValueError as exc:
+                # rejected request, e.g. a poisoned attachment
+                self._reply(400, {"error": str(exc)})
+            except Exception as exc:
+                self._reply(500, {"error": str(exc)})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.state.count(url.path)
+        time.sleep(self.state.latency_secs)
+        if url.path != "/files/get":
+            self._reply(404, {"error": f"unknown path {url.path}"})
+            return
+        if self.state.random.random() < self.state.failure_rate:
+            self._reply(503, {"error": "injected failure"})
+            return
+        name = parse_qs(url.query).get("name", [""])[0]
+        status, body, content_range = self.state.file_range(name, self.headers.get("Range"))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        if content_range is not None:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+        if body and self.state.random.random() < self.state.file_drop_rate:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def _reply(self, status: int, content: Dict[str, Any]):
+        data = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        LOGGER.debug(format, *args)
+
+
+class StandInServer:
+    """Serves the state on a free local port in a background thread, use as a context manager."""
+
+    def __init__(self, state: Optional[StandInState] = None, port: int = 0):
+        self.state = state if state is not None else StandInState()
+        handler = type("RequestHandler", (_RequestHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="standin", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--latency-secs", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    state = StandInState(tests=args.tests, latency_secs=args.latency_secs, failure_rate=args.failure_rate)
+    with StandInServer(state, port=args.port) as server:
+        LOGGER.info("Serving %d tests on %s", args.tests, server.url)
+        server.thread.join()
+
+
+if __name__ == "__main__":
+    main()
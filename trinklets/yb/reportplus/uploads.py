@@ -0,0 +1,297 @@
+# Copyright (c) YugaByte, Inc.
+# 
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License.  You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.  See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""Content addressed uploads of local attachment files.
+
+``DedupUploader.add_local_attachment_file`` stands in for ``Report.add_local_attachment_file``. The file is
+read once: every chunk is hashed (sha256) and, for uncompressed text files (logs, sql, csv, ...), gzipped to a
+temporary file in the same pass. The digest is looked up in a local SQLite index of the contents already
+uploaded:
+
+* content already attached to the current test under the same name is not sent again
+* content uploaded before elsewhere is linked instead of uploaded: by default a small ``<name>.link.json``
+  pointer attachment names the digest and the attachment holding the content, a ``link`` callable can
+  replace that with a server side reference. Every link is recorded in the index, pruning keeps the content
+  that recent links still refer to (see ContentIndex.referenced)
+* content uploaded longer than ``link_max_age_secs`` ago is uploaded again instead of linked, so new links
+  do not refer to attachments about to be pruned
+* anything else is uploaded, compressed when it was gzipped above, and recorded in the index
+
+Digests are those of the original bytes, so a log dedupes whether or not it was compressed for upload. The
+digest of a local file is kept with its size and mtime, an unchanged file seen before is not read at all.
+"""
+
+import contextlib
+import gzip
+import hashlib
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Set, Tuple
+
+from main.report import Report
+
+LOGGER = logging.getLogger(__name__)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS content (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    -- attachment the content was first uploaded as
+    name TEXT NOT NULL,
+    test_id TEXT,
+    uploaded_at REAL NOT NULL,
+    -- what the upload returned, as json
+    upload TEXT
+);
+CREATE INDEX IF NOT EXISTS content_test_idx ON content(test_id, name);
+
+-- attachments linked to content uploaded before, e.g. as a .link.json pointer
+CREATE TABLE IF NOT EXISTS link (
+    test_id TEXT,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    -- attachment holding the content
+    target_test_id TEXT,
+    target_name TEXT NOT NULL,
+    linked_at REAL NOT NULL,
+    PRIMARY KEY (test_id, name)
+);
+CREATE INDEX IF NOT EXISTS link_target_idx ON link(target_test_id, target_name);
+
+CREATE TABLE IF NOT EXISTS local_file (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+POINTER_SUFFIX = ".link.json"
+COMPRESS_SUFFIXES = (".log", ".txt", ".out", ".err", ".sql", ".csv", ".json", ".html", ".xml", ".conf")
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass
+class StoredContent:
+
+    digest: str
+    size: int
+    name: str
+    test_id: Optional[str]
+    uploaded_at: float
+    upload: Any = None
+
+
+@dataclass
+class UploadResult:
+
+    name: str
+    digest: str
+    size: int
+    # one of uploaded, linked or skipped
+    action: str
+    uploaded_bytes: int = 0
+    compressed: bool = False
+
+
+def hash_file(source: Path, gzip_to: Optional[Path] = None, chunk_size: int = 1 << 20, level: int = 6) -> str:
+    """sha256 of ``source``, also written gzipped to ``gzip_to`` in the same read when given.
+
+    The gzip header has a fixed mtime so the compressed output is reproducible.
+    """
+    digest = hashlib.sha256()
+    with contextlib.ExitStack() as stack:
+        src = stack.enter_context(open(source, "rb"))
+        out = None
+        if gzip_to is not None:
+            raw = stack.enter_context(open(gzip_to, "wb"))
+            out = stack.enter_context(
+                gzip.GzipFile(filename=source.name, mode="wb", compresslevel=level, fileobj=raw, mtime=0))
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            digest.update(chunk)
+            if out is not None:
+                out.write(chunk)
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """Digests of what was uploaded to the report server and of local files already hashed."""
+
+    def __init__(self, db_file: Path):
+        self.db_file = Path(db_file)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(DDL)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def cached_digest(self, path: Path) -> Optional[str]:
+        """Digest of a local file hashed before, None when it is new or its size or mtime changed."""
+        stat = path.stat()
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime, digest FROM local_file WHERE path=?",
+                                     (str(path.resolve()),)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime):
+            return row[2]
+        return None
+
+    def remember_digest(self, path: Path, digest: str):
+        stat = path.stat()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO local_file(path, size, mtime, digest) VALUES (?, ?, ?, ?)",
+                               (str(path.resolve()), stat.st_size, stat.st_mtime, digest))
+
+    def get(self, digest: str) -> Optional[StoredContent]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, size, name, test_id, uploaded_at, upload FROM content WHERE digest=?",
+                (digest,)).fetchone()
+        if row is None:
+            return None
+        return StoredContent(*row[:5], upload=json.loads(row[5]) if row[5] is not None else None)
+
+    def put(self, content: StoredContent):
+        try:
+            upload = json.dumps(content.upload) if content.upload is not None else None
+        except TypeError:
+            upload = None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO content(digest, size, name, test_id, uploaded_at, upload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content.digest, content.size, content.name, content.test_id, content.uploaded_at, upload))
+
+    def add_link(self, test_id: Optional[str], name: str, stored: StoredContent):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO link(test_id, name, digest, target_test_id, target_name, linked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (test_id, name, stored.digest, stored.test_id, stored.name, time.time()))
+
+    def referenced(self, attachments: Iterable[Tuple[str, str]], since: float) -> Set[Tuple[str, str]]:
+        """The ``(test_id, name)`` attachments that links made at or after ``since`` still refer to.
+
+        ``name`` is matched like in forget.
+        """
+        with self._lock:
+            return {
+                (test_id, name) for test_id, name in attachments
+                if self._conn.execute(
+                    "SELECT 1 FROM link WHERE target_test_id=:test_id AND linked_at>=:since "
+                    "AND (target_name=:name OR substr(target_name, -length(:name) - 1)='/' || :name) LIMIT 1",
+                    {"test_id": test_id, "name": name, "since": since}).fetchone() is not None
+            }
+
+    def forget(self, attachments: Iterable[Tuple[str, str]]):
+        """Drop the contents uploaded as the given ``(test_id, name)`` attachments, e.g. after pruning them.
+
+        ``name`` is matched against the whole attachment path and its last part, as listed in attachment trees.
+        """
+        with self._lock:
+            cur = self._conn.executemany(
+                "DELETE FROM content WHERE test_id=:test_id "
+                "AND (name=:name OR substr(name, -length(:name) - 1)='/' || :name)",
+                [{"test_id": test_id, "name": name} for test_id, name in attachments])
+        LOGGER.info("Forgot %d uploaded content(s)", cur.rowcount)
+
+
+class DedupUploader:
+
+    def __init__(self, reporter: Report, index: ContentIndex,
+                 link: Optional[Callable[[str, StoredContent], Any]] = None,
+                 compress_suffixes: Tuple[str, ...] = COMPRESS_SUFFIXES, compress_min_bytes: int = 64 << 10,
+                 chunk_size: int = 1 << 20, work_dir: Optional[Path] = None,
+                 link_max_age_secs: Optional[float] = 7 * 24 * 3600):
+        self.reporter = reporter
+        self.index = index
+        # attaches ``name`` to the current test by referring to content uploaded before
+        self.link = link if link is not None else self.attach_pointer
+        self.compress_suffixes = compress_suffixes
+        self.compress_min_bytes = compress_min_bytes
+        self.chunk_size = chunk_size
+        self.work_dir = work_dir
+        # well within the retention of pruned attachments, older content is uploaded again, None to always link
+        self.link_max_age_secs = link_max_age_secs
+
+    def attach_pointer(self, name: str, stored: StoredContent):
+        """Attach ``<name>.link.json`` naming the digest and the attachment that holds the content."""
+        pointer = {
+            "digest": stored.digest,
+            "size": stored.size,
+            "name": stored.name,
+            "test_id": stored.test_id,
+            "upload": stored.upload,
+        }
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as tmp_dir:
+            pointer_path = Path(tmp_dir, f"{Path(name).name}{POINTER_SUFFIX}")
+            pointer_path.write_text(json.dumps(pointer, indent=2), encoding="utf-8")
+            return self.reporter.add_local_attachment_file(f"{name}{POINTER_SUFFIX}", pointer_path)
+
+    def _compressible(self, local_path: Path, size: int) -> bool:
+        if local_path.suffix.lower() not in self.compress_suffixes or size < self.compress_min_bytes:
+            return False
+        with open(local_path, "rb") as fp:
+            return fp.read(2) != GZIP_MAGIC
+
+    def _reusable(self, stored: Optional[StoredContent]) -> bool:
+        if stored is None:
+            return False
+        return self.link_max_age_secs is None or time.time() - stored.uploaded_at < self.link_max_age_secs
+
+    def _reuse(self, name: str, local_path: Path, size: int, stored: StoredContent,
+               test_id: Optional[str]) -> UploadResult:
+        if stored.test_id == test_id and stored.name in (name, f"{name}.gz"):
+            LOGGER.info("%s is already attached to the test as %s", local_path, stored.name)
+            return UploadResult(name, stored.digest, size, "skipped")
+        self.link(name, stored)
+        self.index.add_link(test_id, name, stored)
+        LOGGER.info("Linked %s to the content of %s uploaded before", name, stored.name)
+        return UploadResult(name, stored.digest, size, "linked")
+
+    def add_local_attachment_file(self, name: str, local_path: Path) -> UploadResult:
+        local_path = Path(local_path)
+        size = local_path.stat().st_size
+        test_id = getattr(self.reporter, "latest_test_id", None)
+        digest = self.index.cached_digest(local_path)
+        stored = self.index.get(digest) if digest is not None else None
+        if self._reusable(stored):
+            return self._reuse(name, local_path, size, stored, test_id)
+
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as tmp_dir:
+            compressed = Path(tmp_dir, f"{local_path.name}.gz") if self._compressible(local_path, size) else None
+            digest = hash_file(local_path, compressed, self.chunk_size)
+            self.index.remember_digest(local_path, digest)
+            stored = self.index.get(digest)
+            if self._reusable(stored):
+                return self._reuse(name, local_path, size, stored, test_id)
+
+            if compressed is None:
+                upload = self.reporter.add_local_attachment_file(name, local_path)
+                result = UploadResult(name, digest, size, "uploaded", uploaded_bytes=size)
+            else:
+                name = f"{name}.gz"
+                upload = self.reporter.add_local_attachment_file(name, compressed)
+                result = UploadResult(name, digest, size, "uploaded", uploaded_bytes=compressed.stat().st_size,
+                                      compressed=True)
+        self.index.put(StoredContent(digest, size, name, test_id, time.time(), upload))
+        LOGGER.info("Uploaded %s as %s, %d of %d bytes", local_path, name, result.uploaded_bytes, size)
+        return result